@@ -0,0 +1,234 @@
+import hashlib
+import marshal
+import os
+
+from Lexer import Position, Token
+from Parser import NumberNode, StringNode, ListNode, VarAccessNode, VarAssignNode, BinOpNode, UnaryOpNode, IfNode, \
+    ForNode, WhileNode, FuncDefNode, CallNode, ReturnNode, ContinueNode, BreakNode
+
+CACHE_DIR = '__sdwcache__'
+# Bump whenever the parser or the node classes change shape, so older cache files are parsed again
+CACHE_VERSION = 2
+
+
+def cache_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, name + '.ast')
+
+
+def cache_key(path, text):
+    stat = os.stat(path)
+    return CACHE_VERSION, stat.st_mtime_ns, stat.st_size, hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def load_program(path, text):
+    try:
+        key = cache_key(path, text)
+        with open(cache_path(path), 'rb') as f:
+            if marshal.load(f) != key: return None
+            data = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    try:
+        return TreeDecoder(path, text).decode(data)
+    except RecursionError:
+        return None
+
+
+def save_program(path, text, node):
+    # Caching is only ever an optimisation: a tree too deep to marshal or a directory we cannot write to
+    # just means the program is parsed again next time
+    target = cache_path(path)
+    temp = f'{target}.{os.getpid()}.tmp'
+
+    try:
+        key = cache_key(path, text)
+        data = marshal.dumps(TreeEncoder().encode(node))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(temp, 'wb') as f:
+            marshal.dump(key, f)
+            f.write(data)
+        os.replace(temp, target)
+    except (OSError, ValueError, RecursionError):
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+
+# Tree encoder class
+#
+# Flattens a parsed program into tuples of plain values marshal can store. The source text is not stored:
+# positions keep only their offsets and are pointed back at the text when the tree is loaded
+class TreeEncoder:
+    def encode(self, node):
+        method_name = f'encode_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_encode_method)
+        return method(node)
+
+    def no_encode_method(self, node):
+        raise Exception(f'No encode_{type(node).__name__} method defined')
+
+    def encode_optional(self, node):
+        return self.encode(node) if node else None
+
+    def encode_pos(self, pos):
+        return pos.idx if pos.line_idx == pos.idx else (pos.idx, pos.line_idx)
+
+    def encode_tok(self, tok):
+        if tok is None: return None
+        return tok.type, tok.value, self.encode_pos(tok.pos_start), self.encode_pos(tok.pos_end)
+
+    ###################################
+
+    def encode_NumberNode(self, node):
+        return 'NumberNode', self.encode_tok(node.tok)
+
+    def encode_StringNode(self, node):
+        return 'StringNode', self.encode_tok(node.tok)
+
+    def encode_ListNode(self, node):
+        return 'ListNode', tuple(self.encode(element_node) for element_node in node.element_nodes), \
+            self.encode_pos(node.pos_start), self.encode_pos(node.pos_end)
+
+    def encode_VarAccessNode(self, node):
+        return 'VarAccessNode', self.encode_tok(node.var_name_tok)
+
+    def encode_VarAssignNode(self, node):
+        return 'VarAssignNode', self.encode_tok(node.var_name_tok), self.encode(node.value_node)
+
+    def encode_BinOpNode(self, node):
+        # A chain like a + b + c + ... is stored flat, as its leftmost operand followed by each operation and
+        # its right operand, so a long one is neither deep to encode nor too deeply nested to marshal
+        links = []
+        while isinstance(node, BinOpNode):
+            links.append((self.encode_tok(node.op_tok), self.encode(node.right_node)))
+            node = node.left_node
+        return ('BinOpNode', self.encode(node)) + tuple(reversed(links))
+
+    def encode_UnaryOpNode(self, node):
+        return 'UnaryOpNode', self.encode_tok(node.op_tok), self.encode(node.node)
+
+    def encode_IfNode(self, node):
+        cases = tuple(
+            (self.encode(condition), self.encode(expr), should_return_null)
+            for condition, expr, should_return_null in node.cases
+        )
+        else_case = (self.encode(node.else_case[0]), node.else_case[1]) if node.else_case else None
+        return 'IfNode', cases, else_case
+
+    def encode_ForNode(self, node):
+        return 'ForNode', self.encode_tok(node.var_name_tok), self.encode(node.start_value_node), \
+            self.encode(node.end_value_node), self.encode_optional(node.step_value_node), \
+            self.encode(node.body_node), node.should_return_null
+
+    def encode_WhileNode(self, node):
+        return 'WhileNode', self.encode(node.condition_node), self.encode(node.body_node), node.should_return_null
+
+    def encode_FuncDefNode(self, node):
+        return 'FuncDefNode', self.encode_tok(node.var_name_tok), \
+            tuple(self.encode_tok(arg_name) for arg_name in node.arg_name_toks), self.encode(node.body_node), \
+            node.should_auto_return
+
+    def encode_CallNode(self, node):
+        return 'CallNode', self.encode(node.node_to_call), tuple(self.encode(arg_node) for arg_node in node.arg_nodes)
+
+    def encode_ReturnNode(self, node):
+        return 'ReturnNode', self.encode_optional(node.node_to_return), self.encode_pos(node.pos_start), \
+            self.encode_pos(node.pos_end)
+
+    def encode_ContinueNode(self, node):
+        return 'ContinueNode', self.encode_pos(node.pos_start), self.encode_pos(node.pos_end)
+
+    def encode_BreakNode(self, node):
+        return 'BreakNode', self.encode_pos(node.pos_start), self.encode_pos(node.pos_end)
+
+
+# Tree decoder class
+#
+# Rebuilds the nodes from what TreeEncoder stored, with positions into the text the program was read from
+class TreeDecoder:
+    def __init__(self, fn, text):
+        self.fn = fn
+        self.text = text
+
+    def decode(self, data):
+        method_name = f'decode_{data[0]}'
+        method = getattr(self, method_name, self.no_decode_method)
+        return method(*data[1:])
+
+    def no_decode_method(self, *data):
+        raise Exception('No decode method defined')
+
+    def decode_optional(self, data):
+        return self.decode(data) if data else None
+
+    def decode_pos(self, data):
+        if type(data) is int:
+            return Position(data, None, None, self.fn, self.text)
+        return Position(data[0], None, None, self.fn, self.text, data[1])
+
+    def decode_tok(self, data):
+        if data is None: return None
+        tok_type, value, pos_start, pos_end = data
+        return Token(tok_type, value, self.decode_pos(pos_start), self.decode_pos(pos_end))
+
+    ###################################
+
+    def decode_NumberNode(self, tok):
+        return NumberNode(self.decode_tok(tok))
+
+    def decode_StringNode(self, tok):
+        return StringNode(self.decode_tok(tok))
+
+    def decode_ListNode(self, element_nodes, pos_start, pos_end):
+        return ListNode([self.decode(element_node) for element_node in element_nodes], self.decode_pos(pos_start),
+                        self.decode_pos(pos_end))
+
+    def decode_VarAccessNode(self, var_name_tok):
+        return VarAccessNode(self.decode_tok(var_name_tok))
+
+    def decode_VarAssignNode(self, var_name_tok, value_node):
+        return VarAssignNode(self.decode_tok(var_name_tok), self.decode(value_node))
+
+    def decode_BinOpNode(self, left_node, *links):
+        node = self.decode(left_node)
+        for op_tok, right_node in links:
+            node = BinOpNode(node, self.decode_tok(op_tok), self.decode(right_node))
+        return node
+
+    def decode_UnaryOpNode(self, op_tok, node):
+        return UnaryOpNode(self.decode_tok(op_tok), self.decode(node))
+
+    def decode_IfNode(self, cases, else_case):
+        cases = [
+            (self.decode(condition), self.decode(expr), should_return_null)
+            for condition, expr, should_return_null in cases
+        ]
+        else_case = (self.decode(else_case[0]), else_case[1]) if else_case else None
+        return IfNode(cases, else_case)
+
+    def decode_ForNode(self, var_name_tok, start_value_node, end_value_node, step_value_node, body_node,
+                       should_return_null):
+        return ForNode(self.decode_tok(var_name_tok), self.decode(start_value_node), self.decode(end_value_node),
+                       self.decode_optional(step_value_node), self.decode(body_node), should_return_null)
+
+    def decode_WhileNode(self, condition_node, body_node, should_return_null):
+        return WhileNode(self.decode(condition_node), self.decode(body_node), should_return_null)
+
+    def decode_FuncDefNode(self, var_name_tok, arg_name_toks, body_node, should_auto_return):
+        return FuncDefNode(self.decode_tok(var_name_tok), [self.decode_tok(arg_name) for arg_name in arg_name_toks],
+                           self.decode(body_node), should_auto_return)
+
+    def decode_CallNode(self, node_to_call, arg_nodes):
+        return CallNode(self.decode(node_to_call), [self.decode(arg_node) for arg_node in arg_nodes])
+
+    def decode_ReturnNode(self, node_to_return, pos_start, pos_end):
+        return ReturnNode(self.decode_optional(node_to_return), self.decode_pos(pos_start), self.decode_pos(pos_end))
+
+    def decode_ContinueNode(self, pos_start, pos_end):
+        return ContinueNode(self.decode_pos(pos_start), self.decode_pos(pos_end))
+
+    def decode_BreakNode(self, pos_start, pos_end):
+        return BreakNode(self.decode_pos(pos_start), self.decode_pos(pos_end))
@@ -0,0 +1,354 @@
+from Lexer import TT_MINUS, TT_KEYWORD, RTError
+from Parser import ListNode, BinOpNode
+from Resolver import GLOBAL_DEPTH, function_names
+from interpreter import Number, make_number, String, List, Function, global_symbol_table, operation_name, \
+    operation_error, RTErrorSignal, ReturnSignal, BreakSignal, ContinueSignal
+
+
+class ClosureFunction(Function):
+    __slots__ = ('body',)
+
+    def __init__(self, name, body_node, arg_names, should_auto_return, layout=None, body=None):
+        super().__init__(name, body_node, arg_names, should_auto_return, layout)
+        self.body = body
+
+    def execute(self, args, context, pos_start, pos_end):
+        self.check_args(self.arg_names, args, context, pos_start, pos_end)
+        exec_ctx = self.generate_new_context(context, pos_start)
+        self.populate_args(self.arg_names, args, exec_ctx)
+
+        try:
+            value = self.body(exec_ctx)
+        except ReturnSignal as signal:
+            return signal.value
+
+        return (value if self.should_auto_return else None) or Number.null
+
+    def copy(self):
+        copy = ClosureFunction(self.name, self.body_node, self.arg_names, self.should_auto_return, self.layout,
+                               self.body)
+        copy.set_context(self.context)
+        copy.set_pos(self.pos_start, self.pos_end)
+        return copy
+
+
+# Closure compiler class
+#
+# Turns every node into a Python closure taking the context and returning the node's value,
+# so evaluation no longer dispatches on node and operator types
+class ClosureCompiler:
+    def compile(self, node):
+        method_name = f'compile_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_compile_method)
+        return method(node)
+
+    def compile_discarded(self, node):
+        # Statement blocks whose value is thrown away never build their list
+        if not isinstance(node, ListNode):
+            return self.compile(node)
+
+        statements = [self.compile_discarded(element_node) for element_node in node.element_nodes]
+
+        def block(context):
+            for statement in statements:
+                statement(context)
+
+        return block
+
+    def no_compile_method(self, node):
+        raise Exception(f'No compile_{type(node).__name__} method defined')
+
+    def run(self, node, context):
+        program = self.compile(node)
+        return program(context)
+
+    ###################################
+
+    def compile_NumberNode(self, node):
+        value = make_number(node.tok.value)
+        return lambda context: value
+
+    def compile_StringNode(self, node):
+        value = String(node.tok.value)
+        return lambda context: value
+
+    def compile_ListNode(self, node):
+        elements = [self.compile(element_node) for element_node in node.element_nodes]
+        return lambda context: List([element(context) for element in elements])
+
+    def compile_VarAccessNode(self, node):
+        var_name = node.var_name_tok.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def undefined(context):
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
+                f"'{var_name}' is not defined",
+                context
+            ))
+
+        if node.depth == 0:
+            slot = node.slot
+
+            def load_local(context):
+                symbol_table = context.symbol_table
+                value = symbol_table.slots[slot]
+                if value is None:
+                    value = symbol_table.parent.get(var_name) if symbol_table.parent else None
+                    if value is None: undefined(context)
+                return value
+
+            return load_local
+
+        if node.depth == GLOBAL_DEPTH:
+            global_symbols = global_symbol_table.symbols
+
+            def load_global(context):
+                # Since compiling, a function somewhere may have come to bind the name and be calling this code
+                if var_name in function_names:
+                    value = context.symbol_table.get(var_name)
+                else:
+                    value = global_symbols.get(var_name)
+                if value is None: undefined(context)
+                return value
+
+            return load_global
+
+        def load_name(context):
+            value = context.symbol_table.get(var_name)
+            if value is None: undefined(context)
+            return value
+
+        return load_name
+
+    def compile_VarAssignNode(self, node):
+        var_name = node.var_name_tok.value
+        value_node = self.compile(node.value_node)
+
+        if node.depth == 0:
+            slot = node.slot
+
+            def store_local(context):
+                value = context.symbol_table.slots[slot] = value_node(context)
+                return value
+
+            return store_local
+
+        def store_name(context):
+            value = value_node(context)
+            context.symbol_table.set(var_name, value)
+            return value
+
+        return store_name
+
+    def compile_BinOpNode(self, node):
+        if isinstance(node.left_node, BinOpNode):
+            return self.compile_chain(node)
+
+        method_name = operation_name(node.op_tok)
+        left_node = self.compile(node.left_node)
+        right_node = self.compile(node.right_node)
+        span = (node.left_node.pos_start, node.left_node.pos_end, node.right_node.pos_start, node.right_node.pos_end)
+
+        def bin_op(context):
+            left = left_node(context)
+            right = right_node(context)
+            result, error = getattr(left, method_name)(right)
+            if error:
+                raise RTErrorSignal(operation_error(method_name, left, right, span, context))
+            return result
+
+        return bin_op
+
+    def compile_chain(self, node):
+        # A chain like a + b + c + ... nests down its left operands. It becomes one closure running its
+        # operations in a loop, so neither compiling nor running a chain of any length recurses per operation
+        chain = []
+        while isinstance(node, BinOpNode):
+            chain.append(node)
+            node = node.left_node
+
+        first_node = self.compile(node)
+        links = []
+        for node in reversed(chain):
+            span = (node.left_node.pos_start, node.left_node.pos_end, node.right_node.pos_start, node.right_node.pos_end)
+            links.append((operation_name(node.op_tok), self.compile(node.right_node), span))
+
+        def bin_op_chain(context):
+            left = first_node(context)
+            for method_name, right_node, span in links:
+                right = right_node(context)
+                result, error = getattr(left, method_name)(right)
+                if error:
+                    raise RTErrorSignal(operation_error(method_name, left, right, span, context))
+                left = result
+            return left
+
+        return bin_op_chain
+
+    def compile_UnaryOpNode(self, node):
+        operand = self.compile(node.node)
+        pos_start, pos_end = node.node.pos_start, node.node.pos_end
+
+        if node.op_tok.type == TT_MINUS:
+            minus_one = make_number(-1)
+
+            def negate(context):
+                number, error = operand(context).multed_by(minus_one)
+                if error:
+                    raise RTErrorSignal(RTError(pos_start, pos_end, error.details, context))
+                return number
+
+            return negate
+
+        if node.op_tok.type == TT_KEYWORD:
+            return lambda context: operand(context).notted()[0]
+
+        return operand
+
+    def compile_IfNode(self, node):
+        cases = [
+            (self.compile(condition), self.compile_branch(expr, should_return_null))
+            for condition, expr, should_return_null in node.cases
+        ]
+        else_case = self.compile_branch(*node.else_case) if node.else_case else None
+
+        def if_expr(context):
+            for condition, expr in cases:
+                if condition(context).is_true():
+                    return expr(context)
+            if else_case:
+                return else_case(context)
+            return Number.null
+
+        return if_expr
+
+    def compile_branch(self, node, should_return_null):
+        if not should_return_null:
+            return self.compile(node)
+
+        body = self.compile_discarded(node)
+
+        def branch(context):
+            body(context)
+            return Number.null
+
+        return branch
+
+    def compile_ForNode(self, node):
+        var_name = node.var_name_tok.value
+        slot = node.slot if node.depth == 0 else None
+        hoisted = [self.compile(hoisted_node) for hoisted_node in node.hoisted_nodes]
+        start_value_node = self.compile(node.start_value_node)
+        end_value_node = self.compile(node.end_value_node)
+        step_value_node = self.compile(node.step_value_node) if node.step_value_node else None
+        should_return_null = node.should_return_null
+        body = self.compile_discarded(node.body_node) if should_return_null else self.compile(node.body_node)
+
+        def for_expr(context):
+            elements = []
+            symbol_table = context.symbol_table
+            for assign in hoisted:
+                assign(context)
+            i = start_value_node(context).value
+            end_value = end_value_node(context).value
+            step_value = step_value_node(context).value if step_value_node else 1
+
+            while i < end_value if step_value >= 0 else i > end_value:
+                if slot is None:
+                    symbol_table.set(var_name, make_number(i))
+                else:
+                    symbol_table.slots[slot] = make_number(i)
+                i += step_value
+
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+
+                if not should_return_null:
+                    elements.append(value)
+
+            return Number.null if should_return_null else List(elements)
+
+        return for_expr
+
+    def compile_WhileNode(self, node):
+        hoisted = [self.compile(hoisted_node) for hoisted_node in node.hoisted_nodes]
+        condition = self.compile(node.condition_node)
+        should_return_null = node.should_return_null
+        body = self.compile_discarded(node.body_node) if should_return_null else self.compile(node.body_node)
+
+        def while_expr(context):
+            elements = []
+            for assign in hoisted:
+                assign(context)
+
+            while condition(context).is_true():
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+
+                if not should_return_null:
+                    elements.append(value)
+
+            return Number.null if should_return_null else List(elements)
+
+        return while_expr
+
+    def compile_FuncDefNode(self, node):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        slot = node.slot if node.depth == 0 else None
+
+        # Compiled once here, and shared by every Function created from this node
+        body = self.compile(node.body_node) if node.should_auto_return else self.compile_discarded(node.body_node)
+
+        def func_def(context):
+            func_value = ClosureFunction(func_name, node.body_node, arg_names, node.should_auto_return, node.layout,
+                                         body)
+
+            if slot is not None:
+                context.symbol_table.slots[slot] = func_value
+            elif func_name:
+                context.symbol_table.set(func_name, func_value)
+
+            return func_value
+
+        return func_def
+
+    def compile_CallNode(self, node):
+        node_to_call = self.compile(node.node_to_call)
+        arg_nodes = [self.compile(arg_node) for arg_node in node.arg_nodes]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def call(context):
+            value_to_call = node_to_call(context)
+            return value_to_call.execute([arg_node(context) for arg_node in arg_nodes], context, pos_start, pos_end)
+
+        return call
+
+    def compile_ReturnNode(self, node):
+        node_to_return = self.compile(node.node_to_return) if node.node_to_return else None
+
+        def return_statement(context):
+            raise ReturnSignal(node_to_return(context) if node_to_return else Number.null)
+
+        return return_statement
+
+    def compile_ContinueNode(self, node):
+        def continue_statement(context):
+            raise ContinueSignal()
+
+        return continue_statement
+
+    def compile_BreakNode(self, node):
+        def break_statement(context):
+            raise BreakSignal()
+
+        return break_statement
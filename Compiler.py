@@ -0,0 +1,571 @@
+from Lexer import TT_MINUS, TT_KEYWORD, RTError
+from Parser import ListNode, BinOpNode, run_steps
+from Resolver import GLOBAL_DEPTH, function_names
+from interpreter import RTErrorSignal, Number, make_number, String, List, BaseFunction, Context, SymbolTable, \
+    global_symbol_table, operation_name, operation_error
+
+
+# Opcodes
+OP_LOAD_CONST = 0
+OP_LOAD_NAME = 1
+OP_STORE_NAME = 2
+OP_POP = 3
+OP_BINARY = 4
+OP_NEGATE = 5
+OP_NOT = 6
+OP_BUILD_LIST = 7
+OP_JUMP = 8
+OP_JUMP_IF_FALSE = 9
+OP_CALL = 10
+OP_RETURN = 11
+OP_MAKE_FUNCTION = 12
+OP_FOR_PREP = 13
+OP_FOR_ITER = 14
+OP_LOOP_PREP = 15
+OP_LOOP_APPEND = 16
+OP_LOOP_END = 17
+OP_UNWIND = 18
+OP_LOAD_LOCAL = 19
+OP_STORE_LOCAL = 20
+OP_LOAD_GLOBAL = 21
+OP_TAIL_CALL = 22
+
+OP_NAMES = {value: name for name, value in globals().items() if name.startswith('OP_')}
+
+
+class CompileError(Exception):
+    pass
+
+
+# Chunk of bytecode
+class Chunk:
+    def __init__(self, name, layout=None):
+        self.name = name
+        self.code = []
+        self.consts = []
+        self.spans = {}
+        self.local_names = list(layout or ())
+
+    def disassemble(self):
+        lines = []
+        for pc in range(0, len(self.code), 2):
+            op, arg = self.code[pc], self.code[pc + 1]
+            lines.append(f'{pc:>5} {OP_NAMES[op]:<18} {arg}')
+        return '\n'.join(lines)
+
+
+class FunctionProto:
+    def __init__(self, name, arg_names, chunk, layout):
+        self.name = name
+        self.arg_names = arg_names
+        self.chunk = chunk
+        self.layout = layout
+
+
+class CompiledFunction(BaseFunction):
+    __slots__ = ('chunk', 'arg_names')
+
+    def __init__(self, name, chunk, arg_names, layout=None):
+        super().__init__(name)
+        self.chunk = chunk
+        self.arg_names = arg_names
+        self.layout = layout
+
+    def execute(self, args, context, pos_start, pos_end):
+        return VM().run(self.chunk, self.enter(args, context, pos_start, pos_end))
+
+    def enter(self, args, context, pos_start, pos_end):
+        self.check_args(self.arg_names, args, context, pos_start, pos_end)
+        exec_ctx = self.generate_new_context(context, pos_start)
+        self.populate_args(self.arg_names, args, exec_ctx)
+        return exec_ctx
+
+    def enter_tail(self, args, context, pos_start, pos_end):
+        # Called from the tail of the function running in context, whose frame is dropped: the new frame
+        # takes its place under the same caller, and sees its variables through a TailScope
+        self.check_args(self.arg_names, args, context, pos_start, pos_end)
+        exec_ctx = Context(self.name, context.parent, context.parent_entry_pos)
+        exec_ctx.symbol_table = SymbolTable(TailScope.fold(context.symbol_table), self.layout)
+        self.populate_args(self.arg_names, args, exec_ctx)
+        return exec_ctx
+
+    def copy(self):
+        copy = CompiledFunction(self.name, self.chunk, self.arg_names, self.layout)
+        copy.set_context(self.context)
+        copy.set_pos(self.pos_start, self.pos_end)
+        return copy
+
+    def __repr__(self):
+        return f"<function {self.name}>"
+
+
+class TailScope(SymbolTable):
+    # The variables of the frames a run of tail calls has dropped, newest first, in one table. Functions see their
+    # callers' variables, so a dropped frame still has to be found behind the one replacing it; folding it in
+    # here keeps the chain of tables the same length however many tail calls are made
+    @staticmethod
+    def fold(symbol_table):
+        scope = symbol_table.parent
+        if type(scope) is not TailScope:
+            scope = TailScope(scope)
+
+        # Nothing else can reach the dropped frame, or a scope behind it, so the scope is updated in place
+        if symbol_table.layout:
+            for name, slot in symbol_table.layout.items():
+                if symbol_table.slots[slot] is not None:
+                    scope.symbols[name] = symbol_table.slots[slot]
+        scope.symbols.update(symbol_table.symbols)
+        return scope
+
+
+# Compiler class
+class Compiler:
+    def __init__(self, name='<program>', is_function=False, layout=None):
+        self.chunk = Chunk(name, layout)
+        self.is_function = is_function
+        self.depth = 0
+        self.loops = []
+
+    def compile_program(self, node):
+        run_steps(self.compile(node))
+        self.emit(OP_RETURN)
+        return self.chunk
+
+    def compile_function(self, node):
+        if node.should_auto_return:
+            yield self.compile(node.body_node)
+        else:
+            yield self.compile_discarded(node.body_node)
+            self.emit_const(Number.null)
+        self.emit(OP_RETURN)
+        self.mark_tail_calls()
+        return self.chunk
+
+    def mark_tail_calls(self):
+        # A call whose result goes straight to RETURN (through any jumps) is in tail position
+        code = self.chunk.code
+        for pc in range(0, len(code), 2):
+            if code[pc] != OP_CALL:
+                continue
+
+            target = pc + 2
+            while code[target] == OP_JUMP and code[target + 1] != target:
+                target = code[target + 1]
+            if code[target] == OP_RETURN:
+                code[pc] = OP_TAIL_CALL
+
+    ###################################
+
+    def emit(self, op, arg=0, span=None, effect=0):
+        pc = len(self.chunk.code)
+        self.chunk.code.append(op)
+        self.chunk.code.append(arg)
+        if span: self.chunk.spans[pc] = span
+        self.depth += effect
+        return pc
+
+    def emit_const(self, value):
+        self.chunk.consts.append(value)
+        return self.emit(OP_LOAD_CONST, len(self.chunk.consts) - 1, effect=1)
+
+    def add_const(self, value):
+        self.chunk.consts.append(value)
+        return len(self.chunk.consts) - 1
+
+    def patch(self, pc, target=None):
+        self.chunk.code[pc + 1] = len(self.chunk.code) if target is None else target
+
+    def here(self):
+        return len(self.chunk.code)
+
+    def emit_store(self, node, name):
+        if node.depth == 0:
+            self.emit(OP_STORE_LOCAL, node.slot)
+        else:
+            self.emit(OP_STORE_NAME, self.add_const(name))
+
+    # A compile_X method for a node with nodes under it is a generator that yields their compiles (see run_steps),
+    # so a program nested deeper than Python's recursion limit still compiles
+    def compile(self, node):
+        method_name = f'compile_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_compile_method)
+        return method(node)
+
+    def compile_discarded(self, node):
+        # Statement blocks whose value is thrown away never build their list
+        if isinstance(node, ListNode):
+            for element_node in node.element_nodes:
+                yield self.compile_discarded(element_node)
+        else:
+            yield self.compile(node)
+            self.emit(OP_POP, effect=-1)
+
+    def no_compile_method(self, node):
+        raise CompileError(f'No compile_{type(node).__name__} method defined')
+
+    ###################################
+
+    def compile_NumberNode(self, node):
+        self.emit_const(make_number(node.tok.value))
+
+    def compile_StringNode(self, node):
+        self.emit_const(String(node.tok.value))
+
+    def compile_ListNode(self, node):
+        for element_node in node.element_nodes:
+            yield self.compile(element_node)
+        self.emit(OP_BUILD_LIST, len(node.element_nodes), effect=1 - len(node.element_nodes))
+
+    def compile_VarAccessNode(self, node):
+        span = (node.pos_start, node.pos_end)
+
+        if node.depth == 0:
+            self.emit(OP_LOAD_LOCAL, node.slot, span, effect=1)
+        elif node.depth == GLOBAL_DEPTH:
+            self.emit(OP_LOAD_GLOBAL, self.add_const(node.var_name_tok.value), span, effect=1)
+        else:
+            self.emit(OP_LOAD_NAME, self.add_const(node.var_name_tok.value), span, effect=1)
+
+    def compile_VarAssignNode(self, node):
+        yield self.compile(node.value_node)
+        self.emit_store(node, node.var_name_tok.value)
+
+    def compile_BinOpNode(self, node):
+        # A chain like a + b + c + ... is compiled down its left operands in a loop, so one of any length compiles
+        chain = []
+        while isinstance(node, BinOpNode):
+            method_name = operation_name(node.op_tok)
+            if method_name is None:
+                raise CompileError(f'Unknown binary operator {node.op_tok}')
+            chain.append((node, method_name))
+            node = node.left_node
+
+        yield self.compile(node)
+        for node, method_name in reversed(chain):
+            yield self.compile(node.right_node)
+            span = (node.left_node.pos_start, node.left_node.pos_end, node.right_node.pos_start, node.right_node.pos_end)
+            self.emit(OP_BINARY, self.add_const(method_name), span, effect=-1)
+
+    def compile_UnaryOpNode(self, node):
+        yield self.compile(node.node)
+
+        if node.op_tok.type == TT_MINUS:
+            self.emit(OP_NEGATE, 0, (node.node.pos_start, node.node.pos_end))
+        elif node.op_tok.type == TT_KEYWORD:
+            self.emit(OP_NOT)
+
+    def compile_IfNode(self, node):
+        end_jumps = []
+        base = self.depth
+
+        for condition, expr, should_return_null in node.cases:
+            yield self.compile(condition)
+            next_case = self.emit(OP_JUMP_IF_FALSE, effect=-1)
+            yield self.compile_branch(expr, should_return_null)
+            end_jumps.append(self.emit(OP_JUMP))
+            self.depth = base
+            self.patch(next_case)
+
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            yield self.compile_branch(expr, should_return_null)
+        else:
+            self.emit_const(Number.null)
+
+        for pc in end_jumps:
+            self.patch(pc)
+
+    def compile_branch(self, node, should_return_null):
+        if should_return_null:
+            yield self.compile_discarded(node)
+            self.emit_const(Number.null)
+        else:
+            yield self.compile(node)
+
+    def compile_ForNode(self, node):
+        for hoisted_node in node.hoisted_nodes:
+            yield self.compile_discarded(hoisted_node)
+
+        yield self.compile(node.start_value_node)
+        yield self.compile(node.end_value_node)
+        if node.step_value_node:
+            yield self.compile(node.step_value_node)
+        else:
+            self.emit_const(make_number(1))
+
+        loop_var = (node.var_name_tok.value, node.slot if node.depth == 0 else None)
+        self.emit(OP_FOR_PREP, self.add_const(loop_var), effect=-2)
+        loop_start = self.here()
+        exit_jump = self.emit(OP_FOR_ITER)
+        yield self.compile_loop_body(node, loop_start, exit_jump)
+
+    def compile_WhileNode(self, node):
+        for hoisted_node in node.hoisted_nodes:
+            yield self.compile_discarded(hoisted_node)
+
+        self.emit(OP_LOOP_PREP, effect=1)
+        loop_start = self.here()
+        yield self.compile(node.condition_node)
+        exit_jump = self.emit(OP_JUMP_IF_FALSE, effect=-1)
+        yield self.compile_loop_body(node, loop_start, exit_jump)
+
+    def compile_loop_body(self, node, loop_start, exit_jump):
+        loop = {'depth': self.depth, 'start': loop_start, 'breaks': []}
+        self.loops.append(loop)
+
+        if node.should_return_null:
+            yield self.compile_discarded(node.body_node)
+        else:
+            yield self.compile(node.body_node)
+            self.emit(OP_LOOP_APPEND, effect=-1)
+        self.emit(OP_JUMP, loop_start)
+
+        self.loops.pop()
+        self.patch(exit_jump)
+        for pc in loop['breaks']:
+            self.patch(pc)
+
+        self.emit(OP_LOOP_END, int(not node.should_return_null))
+
+    def compile_FuncDefNode(self, node):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        chunk = yield Compiler(func_name or '<anonymous>', True, node.layout).compile_function(node)
+
+        proto = self.add_const(FunctionProto(func_name, arg_names, chunk, node.layout))
+        self.emit(OP_MAKE_FUNCTION, proto, effect=1)
+
+        if func_name:
+            self.emit_store(node, func_name)
+
+    def compile_CallNode(self, node):
+        yield self.compile(node.node_to_call)
+        for arg_node in node.arg_nodes:
+            yield self.compile(arg_node)
+        self.emit(OP_CALL, len(node.arg_nodes), (node.pos_start, node.pos_end), effect=-len(node.arg_nodes))
+
+    def compile_ReturnNode(self, node):
+        if node.node_to_return:
+            yield self.compile(node.node_to_return)
+        else:
+            self.emit_const(Number.null)
+
+        if not self.is_function:
+            # A top level return ends the program without a result
+            self.emit(OP_POP, effect=-1)
+            self.emit_const(None)
+        self.emit(OP_RETURN)
+
+    def compile_ContinueNode(self, node):
+        loop = self.jump_out_of_loop(node)
+        if loop: self.emit(OP_JUMP, loop['start'])
+        self.depth += 1
+
+    def compile_BreakNode(self, node):
+        loop = self.jump_out_of_loop(node)
+        if loop: loop['breaks'].append(self.emit(OP_JUMP))
+        self.depth += 1
+
+    def jump_out_of_loop(self, node):
+        if not self.loops:
+            if self.is_function:
+                # The tree walker lets these escape into the caller's loop, which a chunk cannot express
+                raise CompileError(f'{type(node).__name__} outside of a loop')
+            self.emit_const(None)
+            self.emit(OP_RETURN, effect=-1)
+            return None
+
+        loop = self.loops[-1]
+        if self.depth > loop['depth']:
+            self.emit(OP_UNWIND, loop['depth'])
+        return loop
+
+
+# Virtual machine
+#
+# Calls between compiled functions push a frame on an explicit stack instead of recursing
+# into another VM, and tail calls replace the current frame
+class VM:
+    def run(self, chunk, context):
+        code = chunk.code
+        consts = chunk.consts
+        symbol_table = context.symbol_table
+        slots = symbol_table.slots
+        global_symbols = global_symbol_table.symbols
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        frames = []
+
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == OP_LOAD_LOCAL:
+                value = slots[arg]
+                if value is None:
+                    # Not assigned yet in this frame, so the name still resolves through the callers
+                    value = symbol_table.parent.get(chunk.local_names[arg]) if symbol_table.parent else None
+                    if value is None:
+                        raise RTErrorSignal(self.undefined_error(chunk, pc - 2, chunk.local_names[arg], context))
+                push(value)
+
+            elif op == OP_LOAD_GLOBAL:
+                # Since compiling, a function somewhere may have come to bind the name and be calling this code
+                name = consts[arg]
+                value = global_symbols.get(name) if name not in function_names else symbol_table.get(name)
+                if value is None:
+                    raise RTErrorSignal(self.undefined_error(chunk, pc - 2, name, context))
+                push(value)
+
+            elif op == OP_LOAD_NAME:
+                value = symbol_table.get(consts[arg])
+                if value is None:
+                    raise RTErrorSignal(self.undefined_error(chunk, pc - 2, consts[arg], context))
+                push(value)
+
+            elif op == OP_LOAD_CONST:
+                push(consts[arg])
+
+            elif op == OP_BINARY:
+                right = pop()
+                left = pop()
+                result, error = getattr(left, consts[arg])(right)
+                if error:
+                    raise RTErrorSignal(
+                        operation_error(consts[arg], left, right, chunk.spans[pc - 2], context))
+                push(result)
+
+            elif op == OP_JUMP_IF_FALSE:
+                if not pop().is_true():
+                    pc = arg
+
+            elif op == OP_JUMP:
+                pc = arg
+
+            elif op == OP_FOR_ITER:
+                state = stack[-1]
+                i = state[1]
+                if i < state[2] if state[3] >= 0 else i > state[2]:
+                    name, slot = state[4]
+                    if slot is None:
+                        symbol_table.set(name, make_number(i))
+                    else:
+                        slots[slot] = make_number(i)
+                    state[1] = i + state[3]
+                else:
+                    pc = arg
+
+            elif op == OP_STORE_LOCAL:
+                slots[arg] = stack[-1]
+
+            elif op == OP_STORE_NAME:
+                symbol_table.set(consts[arg], stack[-1])
+
+            elif op == OP_POP:
+                pop()
+
+            elif op == OP_CALL:
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                pos_start, pos_end = chunk.spans[pc - 2]
+                function = pop()
+
+                if type(function) is CompiledFunction:
+                    exec_ctx = function.enter(args, context, pos_start, pos_end)
+                    frames.append((chunk, pc, stack, context))
+                    chunk, pc, stack, context = function.chunk, 0, [], exec_ctx
+                    code, consts, push, pop = chunk.code, chunk.consts, stack.append, stack.pop
+                    symbol_table = context.symbol_table
+                    slots = symbol_table.slots
+                else:
+                    push(function.execute(args, context, pos_start, pos_end))
+
+            elif op == OP_TAIL_CALL:
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                pos_start, pos_end = chunk.spans[pc - 2]
+                function = pop()
+
+                if type(function) is CompiledFunction:
+                    # The frame is reused, and the context replaced, so neither grows with the number of tail
+                    # calls. A traceback shows the function called last where the first one was called
+                    context = function.enter_tail(args, context, pos_start, pos_end)
+                    chunk, pc, stack = function.chunk, 0, []
+                    code, consts, push, pop = chunk.code, chunk.consts, stack.append, stack.pop
+                    symbol_table = context.symbol_table
+                    slots = symbol_table.slots
+                else:
+                    value = function.execute(args, context, pos_start, pos_end)
+                    if not frames:
+                        return value
+
+                    chunk, pc, stack, context = frames.pop()
+                    code, consts, push, pop = chunk.code, chunk.consts, stack.append, stack.pop
+                    symbol_table = context.symbol_table
+                    slots = symbol_table.slots
+                    push(value)
+
+            elif op == OP_LOOP_APPEND:
+                value = pop()
+                stack[-1][0].append(value)
+
+            elif op == OP_BUILD_LIST:
+                elements = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(List(elements))
+
+            elif op == OP_RETURN:
+                value = pop()
+                if not frames:
+                    return value
+
+                chunk, pc, stack, context = frames.pop()
+                code, consts, push, pop = chunk.code, chunk.consts, stack.append, stack.pop
+                symbol_table = context.symbol_table
+                slots = symbol_table.slots
+                push(value)
+
+            elif op == OP_FOR_PREP:
+                step_value = pop()
+                end_value = pop()
+                start_value = pop()
+                push([[], start_value.value, end_value.value, step_value.value, consts[arg]])
+
+            elif op == OP_LOOP_PREP:
+                push([[]])
+
+            elif op == OP_LOOP_END:
+                state = pop()
+                push(List(state[0]) if arg else Number.null)
+
+            elif op == OP_UNWIND:
+                del stack[arg:]
+
+            elif op == OP_NEGATE:
+                number, error = pop().multed_by(make_number(-1))
+                if error:
+                    pos_start, pos_end = chunk.spans[pc - 2]
+                    raise RTErrorSignal(RTError(pos_start, pos_end, error.details, context))
+                push(number)
+
+            elif op == OP_NOT:
+                number, error = pop().notted()
+                push(number)
+
+            elif op == OP_MAKE_FUNCTION:
+                proto = consts[arg]
+                push(CompiledFunction(proto.name, proto.chunk, proto.arg_names, proto.layout))
+
+            else:
+                raise Exception(f'Unknown opcode {op}')
+
+    def undefined_error(self, chunk, pc, var_name, context):
+        pos_start, pos_end = chunk.spans[pc]
+        return RTError(
+            pos_start, pos_end,
+            f"'{var_name}' is not defined",
+            context
+        )
@@ -0,0 +1,240 @@
+from Lexer import Lexer, Position, Token, InvalidSyntaxError, TT_NEWLINE, TT_EOF
+from Parser import Parser, ParseResult, ListNode, run_steps
+
+
+# Segment
+#
+# A stretch of the document parsed in one go: one top level statement, or whatever follows the last one.
+# Positions made while parsing it are relative to its start, so moving it after an edit is one update
+class Segment:
+    __slots__ = ('document', 'start', 'stop', 'reach', 'node')
+
+    def __init__(self, document, start):
+        self.document = document
+        self.start = start
+        self.stop = start
+        self.reach = start
+        self.node = None
+
+    def shift(self, delta):
+        self.start += delta
+        self.stop += delta
+        self.reach += delta
+
+
+class SegmentPosition(Position):
+    __slots__ = ('segment', 'rel', 'line_rel')
+
+    def __init__(self, segment, rel, line_rel=None):
+        self.segment = segment
+        self.rel = rel
+        self.line_rel = rel if line_rel is None else line_rel
+        self.fn = segment.document.fn
+
+    @property
+    def idx(self):
+        return self.segment.start + self.rel
+
+    @property
+    def line_idx(self):
+        return self.segment.start + self.line_rel
+
+    @property
+    def ftxt(self):
+        return self.segment.document.text
+
+    # Not cached, since an edit before the segment moves its lines
+    @property
+    def ln(self):
+        return self.ftxt.count('\n', 0, self.line_idx)
+
+    @property
+    def col(self):
+        return self.idx - (self.ftxt.rfind('\n', 0, self.line_idx) + 1)
+
+    def advance(self, current_char=None):
+        self.rel += 1
+        if current_char == '\n': self.line_rel = self.rel
+        return self
+
+    def copy(self):
+        return SegmentPosition(self.segment, self.rel, self.line_rel)
+
+
+# Segment tokens
+#
+# Lexes on demand from a token boundary and hands the parser tokens positioned relative to the segment
+# being parsed, remembering the furthest token it looked at
+class SegmentTokens:
+    def __init__(self, scan):
+        self.scan = scan
+        self.tokens = []
+        self.done = False
+        self.segment = None
+        self.reach = 0
+
+    def __len__(self):
+        return len(self.tokens) + (0 if self.done else 1)
+
+    def __getitem__(self, i):
+        while i >= len(self.tokens):
+            token = next(self.scan)
+            self.tokens.append(token)
+            if token[0] == TT_EOF: self.done = True
+
+        if i > self.reach: self.reach = i
+        tok_type, value, start, end = self.tokens[i]
+        segment = self.segment
+        rel = start - segment.start
+        # A newline token ends one column after it starts, still on its own line
+        pos_end = SegmentPosition(segment, end - segment.start, rel if tok_type == TT_NEWLINE else None)
+        return Token(tok_type, value, SegmentPosition(segment, rel), pos_end)
+
+    def start(self, i):
+        self[i]
+        return self.tokens[i][2]
+
+    def end(self, i):
+        self[i]
+        return self.tokens[i][3]
+
+
+# Document class
+#
+# Keeps a program's top level statements together with the stretch of text each one was parsed from.
+# An edit re-lexes and re-parses from the first statement that looked at the edited text, and picks old
+# statements up again as soon as parsing reaches the start of one that lies after the edit. The result
+# is the same as parsing the new text from scratch.
+#
+# Statements a parse did not get to (after a syntax error, say) are kept as spare chains, each with the
+# ending it was parsed with, so fixing the error can pick them up again too
+class Document:
+    def __init__(self, fn, text=''):
+        self.fn = fn
+        self.text = text
+        self.head = Segment(self, 0)
+        self.pos_start = None
+        self.segments = []
+        self.tail = None
+        self.spare = []
+        self.result = self.parse(0, [])
+
+    def edit(self, start, end, new_text):
+        self.text = self.text[:start] + new_text + self.text[end:]
+
+        # Statements that never looked as far as the edit are kept where they are
+        keep = 0
+        while keep < len(self.segments) and self.segments[keep].reach < start:
+            keep += 1
+        prefix = self.segments[:keep]
+
+        # Statements starting after it may be picked up again once they have been moved along
+        delta = len(new_text) - (end - start)
+        chains = self.spare + ([(self.segments[keep:], self.tail)] if self.tail else [])
+        self.spare = []
+        for segments, tail in chains:
+            moved = [segment for segment in segments if segment.start >= end]
+            if not moved: continue
+
+            for segment in moved + [tail[0]]:
+                segment.shift(delta)
+            self.spare.append((moved, tail))
+
+        self.result = self.parse(prefix[-1].stop if prefix else 0, prefix)
+        return self.result
+
+    ###################################
+
+    def parse(self, lex_start, prefix):
+        resume = {}
+        for segments, tail in self.spare:
+            for i, segment in enumerate(segments):
+                resume[segment.start] = (segments, i, tail)
+
+        # Until this parse gets past them, only the kept statements are known to be right
+        self.segments = prefix
+        self.tail = None
+
+        # A lexer error anywhere wins over a syntax error, as it does with Lexer.make_tokens. Lexing from
+        # the start of a kept statement goes exactly as it did before, so checking stops there
+        lexer = Lexer(self.fn, self.text)
+        for _, _, start, _ in lexer.scan(lex_start):
+            if start in resume: break
+        if lexer.error:
+            return ParseResult().failure(lexer.error)
+
+        tokens = SegmentTokens(lexer.scan(lex_start))
+        tokens.segment = self.head
+        parser = Parser(tokens)
+        res = ParseResult()
+        segments = list(prefix)
+
+        if not prefix:
+            self.pos_start = parser.current_tok.pos_start.copy()
+
+            while parser.current_tok.type == TT_NEWLINE:
+                res.register_advancement()
+                parser.advance()
+
+            if tokens.start(parser.tok_idx) in resume:
+                return self.resume(segments, *resume[tokens.start(parser.tok_idx)])
+
+            segment = self.begin_segment(parser, tokens)
+            segment.node = res.register(run_steps(parser.statement()))
+            if res.error: return res
+            self.end_segment(segment, parser, tokens)
+            segments.append(segment)
+
+        while True:
+            newline_count = 0
+            while parser.current_tok.type == TT_NEWLINE:
+                res.register_advancement()
+                parser.advance()
+                newline_count += 1
+            if newline_count == 0 or not parser.starts_statement(): break
+
+            if tokens.start(parser.tok_idx) in resume:
+                return self.resume(segments, *resume[tokens.start(parser.tok_idx)])
+
+            segment = self.begin_segment(parser, tokens)
+            segment.node = res.register(run_steps(parser.statement()))
+            if res.error:
+                # The statements before the error stay valid for the next edit to build on
+                self.segments = segments
+                return res
+            self.end_segment(segment, parser, tokens)
+            segments.append(segment)
+
+        # Whatever follows the last statement decides where the program ends and whether it is an error
+        tail = self.begin_segment(parser, tokens)
+        error = None
+        if parser.current_tok.type != TT_EOF:
+            error = InvalidSyntaxError(
+                parser.current_tok.pos_start, parser.current_tok.pos_end,
+                "Token cannot appear after previous tokens"
+            )
+        return self.finish(segments, (tail, parser.current_tok.pos_end.copy(), error))
+
+    def begin_segment(self, parser, tokens):
+        segment = Segment(self, tokens.start(parser.tok_idx))
+        tokens.segment = segment
+        tokens.reach = parser.tok_idx
+        parser.update_current_tok()
+        return segment
+
+    def end_segment(self, segment, parser, tokens):
+        segment.stop = tokens.end(parser.tok_idx - 1)
+        segment.reach = tokens.end(tokens.reach)
+
+    def resume(self, segments, chain, i, tail):
+        self.spare = []
+        return self.finish(segments + chain[i:], tail)
+
+    def finish(self, segments, tail):
+        self.segments = segments
+        self.tail = tail
+        _, pos_end, error = tail
+
+        res = ParseResult().success(ListNode([segment.node for segment in segments], self.pos_start, pos_end))
+        if error: res.failure(error)
+        return res
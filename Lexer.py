@@ -1,6 +1,12 @@
+import codecs
+import re
 import string
+import sys
+from array import array
 
 DIGITS = '0123456789'
+STREAM_CHUNK_SIZE = 1 << 16
+STREAM_LOOKBEHIND = 4096
 LETTERS = string.ascii_letters
 LETTERS_DIGITS = LETTERS + DIGITS
 
@@ -60,26 +66,52 @@ class RTError(Error):
 
 
 # Position
+#
+# Line and column are only worked out from the offset when something asks for them, which normally
+# means an error is being shown. line_idx is the offset the line is counted up to; it only differs
+# from idx where a position was stepped past a newline without moving to the next line
 class Position:
-    def __init__(self, idx, ln, col, fn, ftxt):
+    __slots__ = ('idx', '_ln', '_col', 'fn', 'ftxt', 'line_idx')
+
+    def __init__(self, idx, ln, col, fn, ftxt, line_idx=None):
         self.idx = idx
-        self.ln = ln
-        self.col = col
+        self._ln = ln
+        self._col = col
         self.fn = fn
         self.ftxt = ftxt
+        self.line_idx = idx if line_idx is None else line_idx
+
+    @property
+    def ln(self):
+        if self._ln is None: self.locate()
+        return self._ln
+
+    @property
+    def col(self):
+        if self._col is None: self.locate()
+        return self._col
+
+    def locate(self):
+        self._ln = self.ftxt.count('\n', 0, self.line_idx)
+        self._col = self.idx - (self.ftxt.rfind('\n', 0, self.line_idx) + 1)
 
     def advance(self, current_char=None):
         self.idx += 1
-        self.col += 1
+
+        if self._ln is None:
+            if current_char == '\n': self.line_idx = self.idx
+            return self
+
+        self._col += 1
 
         if current_char == '\n':
-            self.ln += 1
-            self.col = 0
+            self._ln += 1
+            self._col = 0
 
         return self
 
     def copy(self):
-        return Position(self.idx, self.ln, self.col, self.fn, self.ftxt)
+        return Position(self.idx, self._ln, self._col, self.fn, self.ftxt, self.line_idx)
 
 
 TT_INT = "INT"
@@ -108,7 +140,14 @@ TT_LSQUARE = "LSQUARE"
 TT_RSQUARE = "RSQUARE"
 TT_NEWLINE = "NEWLINE"
 
-KEYWORDS = [
+TOKEN_TYPES = (
+    TT_INT, TT_FLOAT, TT_PLUS, TT_MINUS, TT_MUL, TT_DIV, TT_LPAREN, TT_RPAREN, TT_EOF, TT_POW, TT_IDENTIFIER,
+    TT_KEYWORD, TT_EQ, TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE, TT_COMMA, TT_ARROW, TT_STRING, TT_LSQUARE,
+    TT_RSQUARE, TT_NEWLINE
+)
+TOKEN_TYPE_IDS = {tok_type: type_id for type_id, tok_type in enumerate(TOKEN_TYPES)}
+
+KEYWORDS = {
     'var',
     '&&',
     '||',
@@ -126,22 +165,21 @@ KEYWORDS = [
     'chaos_control',
     'chaos_blast',
     'chaos_warp'
-]
+}
 
 
 # Token class
 class Token:
+    __slots__ = ('type', 'value', 'pos_start', 'pos_end')
+
     def __init__(self, type_, value=None, pos_start=None, pos_end=None):
         self.type = type_
         self.value = value
 
+        # Positions are never moved once they are made, so tokens keep them as they are
         if pos_start:
-            self.pos_start = pos_start.copy()
-            self.pos_end = pos_start.copy()
-            self.pos_end.advance()
-
-        if pos_end:
-            self.pos_end = pos_end.copy()
+            self.pos_start = pos_start
+            self.pos_end = pos_end or pos_start.copy().advance()
 
     def matches(self, type_, value):
         return self.type == type_ and self.value == value
@@ -151,198 +189,283 @@ class Token:
         return f'{self.type}'
 
 
+# Token buffer
+#
+# Keeps the token stream as parallel columns of type ids, offsets and ids into a table of distinct
+# values. A Token and its positions are only made when the parser looks at one
+class TokenBuffer:
+    def __init__(self, fn, text):
+        self.fn = fn
+        self.text = text
+        self.type_ids = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.value_ids = array('i')
+        self.values = [None]
+        self.value_index = {}
+
+    def add(self, type_, value, start, end):
+        type_id = TOKEN_TYPE_IDS[type_]
+        self.type_ids.append(type_id)
+        self.starts.append(start)
+        self.ends.append(end)
+
+        if value is None:
+            self.value_ids.append(0)
+            return
+
+        # Keyed by type as well, so that 1 and 1.0 keep their own entries
+        value_id = self.value_index.get((type_id, value))
+        if value_id is None:
+            value_id = self.value_index[(type_id, value)] = len(self.values)
+            self.values.append(value)
+        self.value_ids.append(value_id)
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    def __getitem__(self, i):
+        type_ = TOKEN_TYPES[self.type_ids[i]]
+        start, end = self.starts[i], self.ends[i]
+        pos_start = Position(start, None, None, self.fn, self.text)
+        # A newline token ends one column after it starts, still on its own line
+        pos_end = Position(end, None, None, self.fn, self.text, start if type_ == TT_NEWLINE else None)
+        return Token(type_, self.values[self.value_ids[i]], pos_start, pos_end)
+
+
+# Token stream
+#
+# Gives the parser the same indexed view over tokens pulled one at a time from a generator, keeping
+# only the most recent ones around for it to step back over
+class TokenStream:
+    def __init__(self, tokens, lookbehind=STREAM_LOOKBEHIND):
+        self.tokens = iter(tokens)
+        self.lookbehind = lookbehind
+        self.buffer = []
+        self.offset = 0
+        self.done = False
+
+    def __len__(self):
+        # Until EOF has been read there is always at least one more token to come
+        return self.offset + len(self.buffer) + (0 if self.done else 1)
+
+    def __getitem__(self, i):
+        while i >= self.offset + len(self.buffer):
+            self.pull()
+
+        if i < self.offset:
+            raise Exception(f'Token {i} is no longer buffered, only the last {self.lookbehind} are kept')
+        return self.buffer[i - self.offset]
+
+    def pull(self):
+        token = next(self.tokens)
+        self.buffer.append(token)
+        if token.type == TT_EOF: self.done = True
+
+        if len(self.buffer) > 2 * self.lookbehind:
+            del self.buffer[:self.lookbehind]
+            self.offset += self.lookbehind
+
+
 # Lexer class
+#
+# A single master pattern scans each lexeme in one match; the name of the group that matched picks
+# the handler for it
+TOKEN_PATTERN = re.compile(r'''
+    (?P<skip>[ \t]+)
+  | (?P<comment>\#[^\n]*\n?)
+  | (?P<newline>[;\n])
+  | (?P<number>[0-9]+(?:\.[0-9]*)?)
+  | (?P<identifier>[A-Za-z][A-Za-z0-9_]*)
+  | (?P<string>"[^"]*"?)
+  | (?P<operator>->|==|<=|>=|!=|[-+*/^()\[\]=<>,])
+  | (?P<not_equals>!)
+  | (?P<illegal>.)
+''', re.VERBOSE | re.DOTALL)
+
+OPERATORS = {
+    '+': TT_PLUS,
+    '-': TT_MINUS,
+    '*': TT_MUL,
+    '/': TT_DIV,
+    '^': TT_POW,
+    '(': TT_LPAREN,
+    ')': TT_RPAREN,
+    '[': TT_LSQUARE,
+    ']': TT_RSQUARE,
+    '=': TT_EQ,
+    '<': TT_LT,
+    '>': TT_GT,
+    ',': TT_COMMA,
+    '->': TT_ARROW,
+    '==': TT_EE,
+    '<=': TT_LTE,
+    '>=': TT_GTE,
+    '!=': TT_NE
+}
+
+
 class Lexer:
     def __init__(self, fn, text):
         self.fn = fn
         self.text = text
-        self.pos = Position(-1, 0, -1, fn, text)
-        self.current_char = None
-        self.advance()
+        self.error = None
 
-    def advance(self):
-        self.pos.advance(self.current_char)
-        self.current_char = self.text[self.pos.idx] if self.pos.idx < len(self.text) else None
+    def position(self, idx):
+        return Position(idx, None, None, self.fn, self.text)
 
     def make_tokens(self):
-        tokens = []
-
-        while self.current_char != None:
-            if self.current_char in ' \t':
-                self.advance()
-            elif self.current_char == '#':
-                self.skip_comment()
-            elif self.current_char in ';\n':
-                tokens.append(Token(TT_NEWLINE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char in DIGITS:
-                tokens.append(self.make_number())
-            elif self.current_char in LETTERS:
-                tokens.append(self.make_identifier())
-            elif self.current_char == '"':
-                tokens.append(self.make_string())
-            elif self.current_char == '+':
-                tokens.append(Token(TT_PLUS, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '-':
-                tokens.append(self.make_minus_or_arrow())
-            elif self.current_char == '*':
-                tokens.append(Token(TT_MUL, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '/':
-                tokens.append(Token(TT_DIV, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '^':
-                tokens.append(Token(TT_POW, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '(':
-                tokens.append(Token(TT_LPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ')':
-                tokens.append(Token(TT_RPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '[':
-                tokens.append(Token(TT_LSQUARE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ']':
-                tokens.append(Token(TT_RSQUARE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '!':
-                token, error = self.make_not_equals()
-                if error: return [], error
-                tokens.append(token)
-            elif self.current_char == '=':
-                tokens.append(self.make_equals())
-            elif self.current_char == '<':
-                tokens.append(self.make_less_than())
-            elif self.current_char == '>':
-                tokens.append(self.make_greater_than())
-            elif self.current_char == ',':
-                tokens.append(Token(TT_COMMA, pos_start=self.pos))
-                self.advance()
-            else:
-                pos_start = self.pos.copy()
-                char = self.current_char
-                self.advance()
-                return [], IllegalCharError(pos_start, self.pos, "'" + char + "'")
+        tokens = TokenBuffer(self.fn, self.text)
+        add = tokens.add
+
+        for tok_type, value, start, end in self.scan():
+            add(tok_type, value, start, end)
 
-        tokens.append(Token(TT_EOF, pos_start=self.pos))
+        if self.error: return [], self.error
         return tokens, None
 
-    def make_number(self):
-        num_str = ''
-        dot_count = 0
-        pos_start = self.pos.copy()
+    def scan(self, idx=0):
+        # Yields (type, value, start, end) for every token from idx on, ending with EOF. Lexing needs no
+        # state beyond the offset, so it can pick up at any token boundary; an error stops it in self.error
+        text = self.text
+
+        while idx < len(text):
+            match = TOKEN_PATTERN.match(text, idx)
+            kind = match.lastgroup
+            start, idx = match.span()
+
+            if kind == 'skip' or kind == 'comment':
+                continue
+            elif kind == 'newline':
+                yield TT_NEWLINE, None, start, idx
+            elif kind == 'operator':
+                yield OPERATORS[match.group()], None, start, idx
+            elif kind == 'number':
+                yield *self.make_number(match.group()), start, idx
+            elif kind == 'identifier':
+                yield *self.make_identifier(match.group()), start, idx
+            elif kind == 'string':
+                string, idx = self.make_string(match)
+                yield TT_STRING, string, start, idx
+            elif kind == 'not_equals':
+                self.error = ExpectedCharError(self.position(start), self.position(idx + 1), "'=' (after '!')")
+                return
+            else:
+                self.error = IllegalCharError(self.position(start), self.position(idx), "'" + match.group() + "'")
+                return
 
-        while self.current_char != None and self.current_char in DIGITS + '.':
-            if self.current_char == '.':
-                if dot_count == 1: break
-                dot_count += 1
-            num_str += self.current_char
-            self.advance()
+        yield TT_EOF, None, idx, idx + 1
 
-        if dot_count == 0:
-            return Token(TT_INT, int(num_str), pos_start, self.pos)
+    def make_number(self, num_str):
+        if '.' not in num_str:
+            return TT_INT, int(num_str)
         else:
-            return Token(TT_FLOAT, float(num_str), pos_start, self.pos)
-
-    def make_string(self):
-        string = ''
-        pos_start = self.pos.copy()
-        escape_character = False
-        self.advance()
-
-        escape_characters = {
-            'n': '\n',
-            't': '\t'
-        }
-
-        while self.current_char != None and (self.current_char != '"' or escape_character):
-            if escape_character:
-                string += escape_characters.get(self.current_char, self.current_char)
-            else:
-                if self.current_char == '\\':
-                    escape_character = True
-                else:
-                    string += self.current_char
-            self.advance()
-            escape_character = False
+            return TT_FLOAT, float(num_str)
 
-        self.advance()
-        return Token(TT_STRING, string, pos_start, self.pos)
+    def make_string(self, match):
+        lexeme = match.group()
+        closed = len(lexeme) > 1 and lexeme.endswith('"')
 
-    def make_identifier(self):
-        id_str = ''
-        pos_start = self.pos.copy()
+        # A backslash is dropped and the character after it is kept as written
+        string = (lexeme[1:-1] if closed else lexeme[1:]).replace('\\', '')
 
-        while self.current_char != None and self.current_char in LETTERS_DIGITS + '_':
-            id_str += self.current_char
-            self.advance()
+        # An unterminated string steps past the end of the text, and EOF follows it there
+        return string, match.end() if closed else match.end() + 1
 
+    def make_identifier(self, id_str):
+        # Names are interned, so every later lookup of the same name hashes and compares one string object
         tok_type = TT_KEYWORD if id_str in KEYWORDS else TT_IDENTIFIER
-        return Token(tok_type, id_str, pos_start, self.pos)
-
-    def make_minus_or_arrow(self):
-        tok_type = TT_MINUS
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == '>':
-            self.advance()
-            tok_type = TT_ARROW
-
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_not_equals(self):
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == '=':
-            self.advance()
-            return Token(TT_NE, pos_start=pos_start, pos_end=self.pos), None
-
-        self.advance()
-        return None, ExpectedCharError(pos_start, self.pos, "'=' (after '!')")
-
-    def make_equals(self):
-        tok_type = TT_EQ
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == '=':
-            self.advance()
-            tok_type = TT_EE
-
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_less_than(self):
-        tok_type = TT_LT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == '=':
-            self.advance()
-            tok_type = TT_LTE
-
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_greater_than(self):
-        tok_type = TT_GT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == '=':
-            self.advance()
-            tok_type = TT_GTE
-
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def skip_comment(self):
-        self.advance()
-
-        while self.current_char != '\n':
-            self.advance()
-        self.advance()
+        return tok_type, sys.intern(id_str)
+
+
+# Stream lexer class
+#
+# Reads the program from a file object (or anything with read(), such as an mmap) a chunk at a time
+# and yields tokens as the parser asks for them. Only whole lines are lexed, so each token's positions
+# can point into the window of lines it was read from, and a lexeme ending on a line that has not
+# been read in full is left for the next round
+class StreamLexer(Lexer):
+    def __init__(self, fn, source, chunk_size=STREAM_CHUNK_SIZE):
+        super().__init__(fn, '')
+        self.source = source
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.ln = 0
+        self.line_start = 0
+
+    def read(self):
+        # Reading at least as much as is already held keeps a lexeme spanning many chunks linear
+        chunk = self.source.read(max(self.chunk_size, len(self.text)))
+        if isinstance(chunk, bytes):
+            return self.decoder.decode(chunk, final=not chunk), bool(chunk)
+        return chunk, bool(chunk)
+
+    def position(self, idx):
+        # Positions are asked for in order, so only the newlines since the last one are counted
+        text = self.text
+        newlines = text.count('\n', self.line_start, idx)
+        if newlines:
+            self.ln += newlines
+            self.line_start = text.rfind('\n', 0, idx) + 1
+        return Position(idx, self.ln, idx - self.line_start, self.fn, text)
+
+    def generate_tokens(self):
+        idx = 0
+        more = True
+
+        while more:
+            chunk, more = self.read()
+            text = self.text + chunk
+            self.text = text
+            limit = text.rfind('\n') + 1 if more else len(text)
+
+            while idx < limit:
+                match = TOKEN_PATTERN.match(text, idx)
+                kind = match.lastgroup
+
+                # Wait until the line the lexeme (or the '!' error) ends on has been read in full
+                if more and match.end() + (kind == 'not_equals') >= limit:
+                    break
+
+                start, idx = match.span()
+
+                if kind == 'skip' or kind == 'comment':
+                    continue
+                elif kind == 'newline':
+                    yield Token(TT_NEWLINE, pos_start=self.position(start))
+                elif kind == 'string':
+                    string, idx = self.make_string(match)
+                    yield Token(TT_STRING, string, self.position(start), self.position(idx))
+                elif kind == 'not_equals' or kind == 'illegal':
+                    self.error = self.make_error(kind, match)
+                    yield Token(TT_EOF, pos_start=self.position(start))
+                    return
+                else:
+                    if kind == 'operator':
+                        tok_type, value = OPERATORS[match.group()], None
+                    elif kind == 'number':
+                        tok_type, value = self.make_number(match.group())
+                    else:
+                        tok_type, value = self.make_identifier(match.group())
+                    yield Token(tok_type, value, self.position(start), self.position(idx))
+
+            if more:
+                # Keep from the newline before the line lexing stopped on, which error arrows also show
+                cut = max(text.rfind('\n', 0, idx), 0)
+                self.position(idx)
+                self.text = text[cut:]
+                self.line_start -= cut
+                idx -= cut
+
+        yield Token(TT_EOF, pos_start=self.position(idx))
+
+    def make_error(self, kind, match):
+        start, end = match.span()
+        pos_start = self.position(start)
+
+        if kind == 'not_equals':
+            return ExpectedCharError(pos_start, self.position(end + 1), "'=' (after '!')")
+        return IllegalCharError(pos_start, self.position(end), "'" + match.group() + "'")
 
 
 # Error Finder
@@ -0,0 +1,616 @@
+import math
+from types import GeneratorType
+
+from Lexer import Token, TT_INT, TT_FLOAT, TT_STRING, TT_IDENTIFIER, TT_PLUS, TT_MINUS, TT_MUL, TT_DIV, TT_POW, \
+    TT_KEYWORD, TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE
+from Parser import NumberNode, StringNode, ListNode, VarAccessNode, VarAssignNode, BinOpNode, UnaryOpNode, IfNode, \
+    ForNode, WhileNode, FuncDefNode, CallNode, ReturnNode, ContinueNode, BreakNode, run_steps
+from Resolver import Resolver
+from interpreter import Number, String, BuiltInFunction, make_number, operation_name, global_symbol_table
+
+# Folded values past these sizes stay as the expressions that make them, so folding never blows up a program
+MAX_FOLDED_BITS = 4096
+MAX_FOLDED_STRING = 4096
+
+COMPARISON_TYPES = (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE)
+
+# Operations that can never fail on numbers, so they can be worked out before a loop that might not reach them
+HOISTABLE_TYPES = (TT_PLUS, TT_MINUS, TT_MUL, TT_KEYWORD) + COMPARISON_TYPES
+
+# Builtins by their BuiltInFunction name, as (pure, gives a number). A pure call has no effects and gives the
+# same value whenever it is passed the same numbers. len is not pure: the list it measures can change
+BUILTIN_PURITY = {
+    'print': (False, False),
+    'print_ret': (True, False),
+    'input': (False, False),
+    'input_int': (False, True),
+    'clear': (False, False),
+    'is_number': (True, True),
+    'is_string': (True, True),
+    'is_list': (True, True),
+    'is_function': (True, True),
+    'append': (False, False),
+    'pop': (False, False),
+    'extend': (False, False),
+    'run': (False, False),
+    'reload': (False, False),
+    'len': (False, True),
+}
+# Builtins that run another script against the globals, which can rebind any of them
+SCRIPT_BUILTINS = ('run', 'reload')
+
+# Hidden variables holding hoisted values. Identifiers start with a letter, so no program can name one
+HOISTED_PREFIX = '_licm'
+
+
+# The binary operations down the left operands of node, starting with node itself
+def left_chain(node):
+    chain = []
+    while isinstance(node, BinOpNode):
+        chain.append(node)
+        node = node.left_node
+    return chain
+
+
+# Optimizer class
+#
+# Builds an optimized copy of a parsed program, to be resolved and run. Every node in it is new, so the parsed
+# program is left exactly as the parser made it, however often it is run. The copy differs from it in that:
+#   - operations on literals are worked out once, with the same value methods the engines use, and
+#     replaced by a literal spanning the whole expression. Operations that would fail are kept, so the
+#     error still comes up, at the same place, when the program runs
+#   - if-branches behind a constant condition are dropped, and so is everything after one that is always taken
+#   - x * 1, 1 * x, x - 0 and x ^ 1 become x when x is known to be a number. Not as an operand, though,
+#     since an operation that fails there shows the span of the whole expression
+#   - calculations inside a loop that give the same number on every iteration are done once before it
+#     (see LoopHoister)
+class Optimizer:
+    def optimize_program(self, node):
+        node = self.optimize(node)
+        LoopHoister().hoist(node)
+        return node
+
+    # An optimize_X method returns the copy of a node, or is a generator that yields the visits of the nodes
+    # under it and is sent back their copies (see run_steps)
+    def optimize(self, node):
+        return run_steps(self.visit(node))
+
+    def visit(self, node):
+        method_name = f'optimize_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_optimize_method)
+        return method(node)
+
+    def no_optimize_method(self, node):
+        raise Exception(f'No optimize_{type(node).__name__} method defined')
+
+    # The copy of a node that is a value of its own rather than an operand, where x * 1 and the like can be x
+    def optimize_value(self, node):
+        copy = self.visit(node)
+        # A leaf is copied straight away, and cannot be simplified further
+        return self.without_identities(copy) if isinstance(copy, GeneratorType) else copy
+
+    def without_identities(self, copy):
+        node = yield copy
+        while isinstance(node, BinOpNode):
+            operand = self.identity_operand(node)
+            if operand is None: break
+            node = operand
+        return node
+
+    ###################################
+
+    def optimize_NumberNode(self, node):
+        return NumberNode(node.tok)
+
+    def optimize_StringNode(self, node):
+        return StringNode(node.tok)
+
+    def optimize_ListNode(self, node):
+        element_nodes = []
+        for element_node in node.element_nodes:
+            element_nodes.append((yield self.optimize_value(element_node)))
+        return ListNode(element_nodes, node.pos_start, node.pos_end)
+
+    def optimize_VarAccessNode(self, node):
+        return VarAccessNode(node.var_name_tok)
+
+    def optimize_VarAssignNode(self, node):
+        return self.spanning(VarAssignNode(node.var_name_tok, (yield self.optimize_value(node.value_node))), node)
+
+    def optimize_BinOpNode(self, node):
+        # A chain like a + b + c + ... nests down its left operands, which are gone through in a loop so a
+        # generated chain of any length can be optimized
+        chain = left_chain(node)
+        node = yield self.visit(chain[-1].left_node)
+
+        for link in reversed(chain):
+            left_node, right_node = node, (yield self.visit(link.right_node))
+            node = self.spanning(BinOpNode(left_node, link.op_tok, right_node), link)
+
+            left, right = self.constant(left_node), self.constant(right_node)
+            if left is not None and right is not None:
+                value = self.fold(operation_name(link.op_tok), left, right)
+                if value is not None: node = self.literal(value, link)
+        return node
+
+    def optimize_UnaryOpNode(self, node):
+        node = self.spanning(UnaryOpNode(node.op_tok, (yield self.optimize_value(node.node))), node)
+        operand = self.constant(node.node)
+        if not isinstance(operand, Number): return node
+
+        if node.op_tok.type == TT_MINUS:
+            value = self.fold('multed_by', operand, make_number(-1))
+        elif node.op_tok.type == TT_KEYWORD:
+            value = operand.notted()[0]
+        else:
+            value = operand
+
+        return self.literal(value, node) if value is not None else node
+
+    def optimize_IfNode(self, node):
+        cases = []
+        for condition, expr, should_return_null in node.cases:
+            condition, expr = (yield self.optimize_value(condition)), (yield self.optimize_value(expr))
+            cases.append((condition, expr, should_return_null))
+        folded_else = ((yield self.optimize_value(node.else_case[0])), node.else_case[1]) if node.else_case else None
+
+        kept, else_case = [], folded_else
+        for case in cases:
+            value = self.constant(case[0])
+            if value is None:
+                kept.append(case)
+            elif value.is_true():
+                # Nothing after a branch that is always taken can run
+                kept.append(case)
+                else_case = None
+                break
+
+        # The if-expression stays, spanning the same code, so an operation it is an operand of still shows the
+        # same span. When every test is false, one is kept in front of the else case
+        if not kept:
+            kept = cases[:1]
+
+        return self.spanning(IfNode(kept, else_case), node)
+
+    def optimize_ForNode(self, node):
+        return self.spanning(ForNode(
+            node.var_name_tok,
+            (yield self.optimize_value(node.start_value_node)),
+            (yield self.optimize_value(node.end_value_node)),
+            (yield self.optimize_value(node.step_value_node)) if node.step_value_node else None,
+            (yield self.optimize_value(node.body_node)),
+            node.should_return_null
+        ), node)
+
+    def optimize_WhileNode(self, node):
+        return self.spanning(WhileNode(
+            (yield self.optimize_value(node.condition_node)),
+            (yield self.optimize_value(node.body_node)),
+            node.should_return_null
+        ), node)
+
+    def optimize_FuncDefNode(self, node):
+        return self.spanning(FuncDefNode(
+            node.var_name_tok,
+            node.arg_name_toks,
+            (yield self.optimize_value(node.body_node)),
+            node.should_auto_return
+        ), node)
+
+    def optimize_CallNode(self, node):
+        node_to_call = yield self.visit(node.node_to_call)
+        arg_nodes = []
+        for arg_node in node.arg_nodes:
+            arg_nodes.append((yield self.optimize_value(arg_node)))
+        return self.spanning(CallNode(node_to_call, arg_nodes), node)
+
+    def optimize_ReturnNode(self, node):
+        node_to_return = (yield self.optimize_value(node.node_to_return)) if node.node_to_return else None
+        return ReturnNode(node_to_return, node.pos_start, node.pos_end)
+
+    def optimize_ContinueNode(self, node):
+        return ContinueNode(node.pos_start, node.pos_end)
+
+    def optimize_BreakNode(self, node):
+        return BreakNode(node.pos_start, node.pos_end)
+
+    ###################################
+
+    def constant(self, node):
+        if isinstance(node, NumberNode):
+            return make_number(node.tok.value)
+        if isinstance(node, StringNode):
+            return String(node.tok.value)
+        return None
+
+    def fold(self, method_name, left, right):
+        if method_name is None or not self.is_small(method_name, left, right): return None
+
+        try:
+            value, error = getattr(left, method_name)(right)
+        except Exception:
+            # Left for the program to run into, the way it always has
+            return None
+
+        if error: return None
+        if isinstance(value, String):
+            return value if len(value.value) <= MAX_FOLDED_STRING else None
+        if type(value.value) is int:
+            return value if value.value.bit_length() <= MAX_FOLDED_BITS else None
+        if type(value.value) is float:
+            return value if math.isfinite(value.value) else None
+        return None
+
+    def is_small(self, method_name, left, right):
+        # Catch results too big to be worth building before working them out
+        if not isinstance(right, Number) or type(right.value) is not int:
+            return True
+        if method_name == 'multed_by' and isinstance(left, String):
+            return len(left.value) * right.value <= MAX_FOLDED_STRING
+        if method_name == 'powed_by' and isinstance(left, Number) and type(left.value) is int:
+            return abs(left.value).bit_length() * right.value <= MAX_FOLDED_BITS
+        return True
+
+    def spanning(self, new_node, node):
+        # A simplified operand can be shorter than the one it replaces, but the node around it still spans the
+        # code it was parsed from
+        new_node.pos_start, new_node.pos_end = node.pos_start, node.pos_end
+        return new_node
+
+    def literal(self, value, node):
+        if isinstance(value, String):
+            return StringNode(Token(TT_STRING, value.value, node.pos_start, node.pos_end))
+        tok_type = TT_INT if type(value.value) is int else TT_FLOAT
+        return NumberNode(Token(tok_type, value.value, node.pos_start, node.pos_end))
+
+    def identity_operand(self, node):
+        # The simplifications only hold for numbers: "ab" * 1 is fine, but [1] * 1 is an error
+        op_type, left_node, right_node = node.op_tok.type, node.left_node, node.right_node
+        if op_type in (TT_MUL, TT_MINUS, TT_POW) and self.is_int(right_node, 0 if op_type == TT_MINUS else 1):
+            return left_node if self.is_number(left_node) else None
+        if op_type == TT_MUL and self.is_int(left_node, 1):
+            return right_node if self.is_number(right_node) else None
+        return None
+
+    def is_int(self, node, value):
+        return isinstance(node, NumberNode) and node.tok.type == TT_INT and node.tok.value == value
+
+    def is_number(self, node):
+        # The operands still to check are kept on a list, since generated code can nest them deeply
+        operands = [node]
+        while operands:
+            node = operands.pop()
+            if isinstance(node, BinOpNode):
+                # Comparisons and logic only ever give numbers; arithmetic does when both sides are numbers
+                if node.op_tok.type not in COMPARISON_TYPES and node.op_tok.type != TT_KEYWORD:
+                    operands += (node.left_node, node.right_node)
+            elif isinstance(node, UnaryOpNode):
+                if node.op_tok.type != TT_KEYWORD: operands.append(node.node)
+            elif not isinstance(node, NumberNode):
+                return False
+        return True
+
+
+# Loop hoister class
+#
+# Works on the optimizer's copy of a program, which it is free to change, since the parser's nodes are never in
+# it: what holds a number depends on the code around a loop, and that can change between runs of the same loop.
+#
+# Moves calculations whose value cannot change while a loop runs out of the loop: each one is worked out
+# once into a hidden variable when the loop is entered, and the loop reads that variable instead.
+#
+# Only calculations that can never fail and have no effects are moved, since one inside a branch the loop
+# never takes is now worked out anyway: numbers combined with +, -, *, comparisons and logic, and pure
+# builtins called with numbers. Their variables must hold a number before the loop starts and must not be
+# assigned inside it. That is worked out per function, in the order statements run:
+#   - a variable holds a number once it has been assigned something that can only be a number. A function's
+#     arguments, and a name it has not assigned yet, could be anything from its caller
+#   - calls cannot change the caller's variables, except that a script started by run can rebind globals.
+#     At the top level, a call that could reach run forgets every variable and keeps loops from hoisting
+class LoopHoister:
+    def __init__(self):
+        self.children = Resolver().children
+        self.bound_names = set()
+        # Each if and loop: (the names it can bind, whether it makes a call that could reach run), and for a for
+        # loop also the names its body can bind
+        self.summaries = {}
+        self.temp_count = 0
+        self.top_level = True
+
+    def hoist(self, node):
+        self.collect(node)
+        self.summarize(node)
+        run_steps(self.walk(node, set()))
+        return node
+
+    def collect(self, node):
+        # Builtins are only recognised by names the program never binds, anywhere
+        for node in self.nodes(node):
+            if isinstance(node, (VarAssignNode, ForNode)):
+                self.bound_names.add(node.var_name_tok.value)
+            elif isinstance(node, FuncDefNode):
+                if node.var_name_tok:
+                    self.bound_names.add(node.var_name_tok.value)
+                self.bound_names.update(arg_name.value for arg_name in node.arg_name_toks)
+
+    def nodes(self, node):
+        # node and everything under it, from a stack of its own since generated code can nest deeper than
+        # Python's recursion limit
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(self.children(node)))
+
+    def summarize(self, node):
+        # In one pass from the innermost nodes out, so that ifs and loops nested in each other are not each
+        # gone through again. A frame is [node, its children left, names, calls run, names its body binds]
+        frames = [[node, iter(self.children(node)), set(), False, None]]
+        while frames:
+            frame = frames[-1]
+            child = next(frame[1], None)
+            if child is not None:
+                frames.append([child, iter(self.children(child)), set(), False, None])
+                continue
+
+            frames.pop()
+            node, _, names, runs_script, body_names = frame
+            if isinstance(node, (VarAssignNode, ForNode)) or isinstance(node, FuncDefNode) and node.var_name_tok:
+                names.add(node.var_name_tok.value)
+            elif isinstance(node, CallNode) and self.may_run_script(node):
+                runs_script = True
+
+            if isinstance(node, (IfNode, WhileNode)):
+                self.summaries[node] = (names, runs_script)
+            elif isinstance(node, ForNode):
+                self.summaries[node] = (names, runs_script, body_names)
+
+            if not frames: break
+            parent = frames[-1]
+            # What a function's body binds is its own, but a call in it could still be made in the loop
+            if not isinstance(parent[0], FuncDefNode):
+                parent[2] |= names
+            parent[3] = parent[3] or runs_script
+            if isinstance(parent[0], ForNode) and node is parent[0].body_node:
+                parent[4] = names
+
+    ###################################
+
+    # A walk_X method, and hoist_from, are generators that yield the walks they need the results of (see
+    # run_steps)
+    def walk(self, node, defined):
+        # Returns the variables known to hold a number after node has run, given those known before it
+        method = getattr(self, f'walk_{type(node).__name__}', self.walk_children)
+        return method(node, defined)
+
+    def walk_children(self, node, defined):
+        for child in self.children(node):
+            defined = yield self.walk(child, defined)
+        return defined
+
+    def walk_BinOpNode(self, node, defined):
+        chain = left_chain(node)
+        defined = yield self.walk(chain[-1].left_node, defined)
+        for link in reversed(chain):
+            defined = yield self.walk(link.right_node, defined)
+        return defined
+
+    def walk_VarAssignNode(self, node, defined):
+        name = node.var_name_tok.value
+        after = yield self.walk(node.value_node, defined)
+        return after | {name} if self.gives_number(node.value_node, defined) else after - {name}
+
+    def walk_IfNode(self, node, defined):
+        after = None
+        for condition, expr, _ in node.cases:
+            defined = yield self.walk(condition, defined)
+            if after is None: after = defined
+            yield self.walk(expr, defined)
+        if node.else_case:
+            yield self.walk(node.else_case[0], defined)
+        return after - self.summaries[node][0]
+
+    def walk_ForNode(self, node, defined):
+        assigned, runs_script, body_assigned = self.summaries[node]
+        if not self.top_level or not runs_script:
+            node.body_node = yield self.hoist_from(node, node.body_node, defined - assigned)
+
+        for child in (node.start_value_node, node.end_value_node, node.step_value_node):
+            if child: defined = yield self.walk(child, defined)
+
+        body_defined = defined - assigned | self.hoisted_names(node)
+        if node.var_name_tok.value not in body_assigned:
+            body_defined.add(node.var_name_tok.value)
+        yield self.walk(node.body_node, body_defined)
+        return defined - assigned
+
+    def walk_WhileNode(self, node, defined):
+        assigned, runs_script = self.summaries[node]
+        if not self.top_level or not runs_script:
+            node.condition_node = yield self.hoist_from(node, node.condition_node, defined - assigned)
+            node.body_node = yield self.hoist_from(node, node.body_node, defined - assigned)
+
+        body_defined = defined - assigned | self.hoisted_names(node)
+        body_defined = yield self.walk(node.condition_node, body_defined)
+        yield self.walk(node.body_node, body_defined)
+        return defined - assigned
+
+    def walk_FuncDefNode(self, node, defined):
+        top_level, self.top_level = self.top_level, False
+        yield self.walk(node.body_node, set())
+        self.top_level = top_level
+        return defined - {node.var_name_tok.value} if node.var_name_tok else defined
+
+    def walk_CallNode(self, node, defined):
+        for child in self.children(node):
+            defined = yield self.walk(child, defined)
+        return set() if self.top_level and self.may_run_script(node) else defined
+
+    ###################################
+
+    def hoist_from(self, loop, node, invariant):
+        # Replaces the largest calculations in node that only read invariant variables
+        if isinstance(node, BinOpNode):
+            return (yield from self.hoist_from_chain(loop, node, invariant))
+
+        if self.invariant_kind(node, invariant):
+            if isinstance(node, (BinOpNode, UnaryOpNode, CallNode)):
+                return self.hoisted_access(loop, node)
+            return node
+
+        if isinstance(node, ListNode):
+            for i, element_node in enumerate(node.element_nodes):
+                node.element_nodes[i] = yield self.hoist_from(loop, element_node, invariant)
+        elif isinstance(node, VarAssignNode):
+            node.value_node = yield self.hoist_from(loop, node.value_node, invariant)
+        elif isinstance(node, UnaryOpNode):
+            node.node = yield self.hoist_from(loop, node.node, invariant)
+        elif isinstance(node, IfNode):
+            for i, (condition, expr, should_return_null) in enumerate(node.cases):
+                condition = yield self.hoist_from(loop, condition, invariant)
+                node.cases[i] = (condition, (yield self.hoist_from(loop, expr, invariant)), should_return_null)
+            if node.else_case:
+                node.else_case = ((yield self.hoist_from(loop, node.else_case[0], invariant)), node.else_case[1])
+        elif isinstance(node, ForNode):
+            node.start_value_node = yield self.hoist_from(loop, node.start_value_node, invariant)
+            node.end_value_node = yield self.hoist_from(loop, node.end_value_node, invariant)
+            if node.step_value_node:
+                node.step_value_node = yield self.hoist_from(loop, node.step_value_node, invariant)
+            node.body_node = yield self.hoist_from(loop, node.body_node, invariant)
+        elif isinstance(node, WhileNode):
+            node.condition_node = yield self.hoist_from(loop, node.condition_node, invariant)
+            node.body_node = yield self.hoist_from(loop, node.body_node, invariant)
+        elif isinstance(node, CallNode):
+            for i, arg_node in enumerate(node.arg_nodes):
+                node.arg_nodes[i] = yield self.hoist_from(loop, arg_node, invariant)
+        elif isinstance(node, ReturnNode) and node.node_to_return:
+            node.node_to_return = yield self.hoist_from(loop, node.node_to_return, invariant)
+        # A function's body runs whenever it is called, not where it is defined, so it is left alone
+        return node
+
+    def hoist_from_chain(self, loop, node, invariant):
+        # Whether each link of a chain can be moved is worked out once, from the innermost one out: a link
+        # can be moved when everything under it can
+        chain = left_chain(node)
+        kind = self.invariant_kind(chain[-1].left_node, invariant)
+        movable = 0
+        while movable < len(chain) and kind == 'number' and self.invariant_link(chain[-1 - movable], invariant):
+            movable += 1
+
+        if movable:
+            node = self.hoisted_access(loop, chain[-movable])
+        else:
+            node = yield self.hoist_from(loop, chain[-1].left_node, invariant)
+
+        for link in reversed(chain[:len(chain) - movable]):
+            link.left_node = node
+            link.right_node = yield self.hoist_from(loop, link.right_node, invariant)
+            node = link
+        return node
+
+    def hoisted_access(self, loop, node):
+        # The same calculation twice in one loop shares its variable
+        key = self.key(node)
+        for hoisted_node in loop.hoisted_nodes:
+            if self.key(hoisted_node.value_node) == key:
+                name = hoisted_node.var_name_tok.value
+                break
+        else:
+            name = f'{HOISTED_PREFIX}{self.temp_count}'
+            self.temp_count += 1
+            loop.hoisted_nodes.append(VarAssignNode(Token(TT_IDENTIFIER, name, node.pos_start, node.pos_end), node))
+
+        # Spanning the calculation it stands for, so errors around it point at the same code
+        return VarAccessNode(Token(TT_IDENTIFIER, name, node.pos_start, node.pos_end))
+
+    def hoisted_names(self, loop):
+        return {hoisted_node.var_name_tok.value for hoisted_node in loop.hoisted_nodes}
+
+    def key(self, node):
+        # The nodes of a calculation in prefix order, which is flat, so neither making nor comparing it recurses
+        key = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, NumberNode):
+                key.append(('number', node.tok.type, node.tok.value))
+            elif isinstance(node, VarAccessNode):
+                key.append(('var', node.var_name_tok.value))
+            elif isinstance(node, BinOpNode):
+                key.append(('binop', node.op_tok.type, node.op_tok.value))
+                nodes += (node.right_node, node.left_node)
+            elif isinstance(node, UnaryOpNode):
+                key.append(('unary', node.op_tok.type, node.op_tok.value))
+                nodes.append(node.node)
+            else:
+                key.append(('call', len(node.arg_nodes)))
+                nodes += reversed([node.node_to_call] + node.arg_nodes)
+        return tuple(key)
+
+    ###################################
+
+    def invariant_kind(self, node, invariant):
+        # 'number' or 'value' for a calculation that can be done before the loop, None otherwise. Everything
+        # under it has to give a number; the parts still to check are kept on a list of their own
+        kind = 'number'
+        operands = [node]
+        while operands:
+            operand = operands.pop()
+            if isinstance(operand, NumberNode):
+                continue
+            if isinstance(operand, VarAccessNode):
+                if operand.var_name_tok.value not in invariant: return None
+            elif isinstance(operand, BinOpNode):
+                if operand.op_tok.type not in HOISTABLE_TYPES: return None
+                operands += (operand.left_node, operand.right_node)
+            elif isinstance(operand, UnaryOpNode):
+                operands.append(operand.node)
+            elif isinstance(operand, CallNode):
+                builtin = self.builtin(operand.node_to_call)
+                if builtin is None or not BUILTIN_PURITY[builtin.name][0]: return None
+                if len(operand.arg_nodes) != len(getattr(builtin, f'execute_{builtin.name}').arg_names): return None
+                if not BUILTIN_PURITY[builtin.name][1]:
+                    if operand is not node: return None
+                    kind = 'value'
+                operands += operand.arg_nodes
+            else:
+                return None
+        return kind
+
+    def invariant_link(self, node, invariant):
+        # Whether a binary operation can be moved, given that its left operand can
+        return node.op_tok.type in HOISTABLE_TYPES and self.invariant_kind(node.right_node, invariant) == 'number'
+
+    def gives_number(self, node, defined):
+        # True when node either gives a number or fails. The operands still to check are kept on a list
+        operands = [node]
+        while operands:
+            node = operands.pop()
+            if isinstance(node, BinOpNode):
+                op_type = node.op_tok.type
+                if op_type in COMPARISON_TYPES or op_type == TT_KEYWORD:
+                    continue
+                # A power can give a complex number, which cannot be compared
+                if op_type not in (TT_PLUS, TT_MINUS, TT_MUL, TT_DIV):
+                    return False
+                operands += (node.left_node, node.right_node)
+            elif isinstance(node, UnaryOpNode):
+                if node.op_tok.type != TT_KEYWORD: operands.append(node.node)
+            elif isinstance(node, CallNode):
+                builtin = self.builtin(node.node_to_call)
+                if builtin is None or not BUILTIN_PURITY[builtin.name][1]: return False
+            elif isinstance(node, VarAccessNode):
+                if node.var_name_tok.value not in defined: return False
+            elif not isinstance(node, NumberNode):
+                return False
+        return True
+
+    def builtin(self, node):
+        if not isinstance(node, VarAccessNode) or node.var_name_tok.value in self.bound_names:
+            return None
+        value = global_symbol_table.get(node.var_name_tok.value)
+        return value if isinstance(value, BuiltInFunction) and value.name in BUILTIN_PURITY else None
+
+    def may_run_script(self, node):
+        builtin = self.builtin(node.node_to_call)
+        return builtin is None or builtin.name in SCRIPT_BUILTINS
@@ -1,33 +1,113 @@
+from types import GeneratorType
+
 from Lexer import TT_INT, TT_FLOAT, TT_MUL, TT_DIV, TT_PLUS, TT_MINUS, InvalidSyntaxError, TT_EOF, TT_LPAREN, TT_RPAREN, \
     TT_POW, TT_KEYWORD, TT_IDENTIFIER, TT_EQ, TT_GTE, TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_COMMA, TT_ARROW, TT_STRING, \
     TT_LSQUARE, TT_RSQUARE, TT_NEWLINE
 
+# Binding powers
+#
+# How tightly each binary operator holds its operands; operators are keyed by token type, or by value for keywords
+LOGICAL_POWER = 1
+COMPARISON_POWER = 2
+ARITH_POWER = 3
+TERM_POWER = 4
+EXPONENT_POWER = 5
+
+BINDING_POWERS = {
+    '&&': LOGICAL_POWER,
+    '||': LOGICAL_POWER,
+    TT_EE: COMPARISON_POWER,
+    TT_NE: COMPARISON_POWER,
+    TT_LT: COMPARISON_POWER,
+    TT_GT: COMPARISON_POWER,
+    TT_LTE: COMPARISON_POWER,
+    TT_GTE: COMPARISON_POWER,
+    TT_PLUS: ARITH_POWER,
+    TT_MINUS: ARITH_POWER,
+    TT_MUL: TERM_POWER,
+    TT_DIV: TERM_POWER,
+    TT_POW: EXPONENT_POWER
+}
+
+# First tokens
+#
+# The tokens a statement or an expression can start with, by token type or by keyword
+EXPR_START_TYPES = {TT_INT, TT_FLOAT, TT_STRING, TT_IDENTIFIER, TT_PLUS, TT_MINUS, TT_LPAREN, TT_LSQUARE}
+EXPR_START_KEYWORDS = {'var', '!', 'if', 'for', 'while', 'create'}
+STATEMENT_START_KEYWORDS = EXPR_START_KEYWORDS | {'chaos_blast', 'chaos_warp', 'chaos_control'}
+
+
+# Steps
+#
+# The parser, and the passes over the trees it makes, are written as generators that yield what they need
+# worked out: the generator of a parse method or of a pass over a node under the current one. run_steps
+# runs it and sends the result back in, and anything else yielded is sent straight back. Those waiting on
+# a result are kept on a list instead of on Python's call stack, so a program can nest lists, calls, ifs,
+# loops and functions as deep as it likes
+
+def run_steps(steps):
+    if not isinstance(steps, GeneratorType): return steps
+    waiting = []
+    result = None
+
+    while True:
+        try:
+            needed = steps.send(result)
+        except StopIteration as stop:
+            if not waiting: return stop.value
+            steps, result = waiting.pop(), stop.value
+            continue
+
+        if isinstance(needed, GeneratorType):
+            waiting.append(steps)
+            steps, result = needed, None
+        else:
+            result = needed
+
 
 # Nodes
+#
+# Nodes made from a single token take their positions from it instead of keeping their own
 
 class NumberNode:
+    __slots__ = ('tok',)
+
     def __init__(self, tok):
         self.tok = tok
 
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+    @property
+    def pos_start(self):
+        return self.tok.pos_start
+
+    @property
+    def pos_end(self):
+        return self.tok.pos_end
 
     def __repr__(self):
         return f'{self.tok}'
 
 
 class StringNode:
+    __slots__ = ('tok',)
+
     def __init__(self, tok):
         self.tok = tok
 
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+    @property
+    def pos_start(self):
+        return self.tok.pos_start
+
+    @property
+    def pos_end(self):
+        return self.tok.pos_end
 
     def __repr__(self):
         return f'{self.tok}'
 
 
 class ListNode:
+    __slots__ = ('element_nodes', 'pos_start', 'pos_end')
+
     def __init__(self, element_nodes, pos_start, pos_end):
         self.element_nodes = element_nodes
 
@@ -36,23 +116,38 @@ class ListNode:
 
 
 class VarAccessNode:
+    __slots__ = ('var_name_tok', 'depth', 'slot')
+
     def __init__(self, var_name_tok):
         self.var_name_tok = var_name_tok
+        self.depth = None
+        self.slot = None
 
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.var_name_tok.pos_end
+    @property
+    def pos_start(self):
+        return self.var_name_tok.pos_start
+
+    @property
+    def pos_end(self):
+        return self.var_name_tok.pos_end
 
 
 class VarAssignNode:
+    __slots__ = ('var_name_tok', 'value_node', 'depth', 'slot', 'pos_start', 'pos_end')
+
     def __init__(self, var_name_tok, value_node):
         self.var_name_tok = var_name_tok
         self.value_node = value_node
+        self.depth = None
+        self.slot = None
 
         self.pos_start = self.var_name_tok.pos_start
         self.pos_end = self.value_node.pos_end
 
 
 class BinOpNode:
+    __slots__ = ('left_node', 'op_tok', 'right_node', 'pos_start', 'pos_end')
+
     def __init__(self, left_node, op_tok, right_node):
         self.left_node = left_node
         self.op_tok = op_tok
@@ -66,6 +161,8 @@ class BinOpNode:
 
 
 class UnaryOpNode:
+    __slots__ = ('op_tok', 'node', 'pos_start', 'pos_end')
+
     def __init__(self, op_tok, node):
         self.op_tok = op_tok
         self.node = node
@@ -78,15 +175,21 @@ class UnaryOpNode:
 
 
 class IfNode:
+    __slots__ = ('cases', 'else_case', 'pos_start', 'pos_end')
+
     def __init__(self, cases, else_case):
         self.cases = cases
         self.else_case = else_case
 
+        # From the first condition to the end of the last branch
         self.pos_start = self.cases[0][0].pos_start
-        self.pos_end = (self.else_case or self.cases[len(self.cases) - 1])[0].pos_end
+        self.pos_end = (self.else_case[0] if self.else_case else self.cases[len(self.cases) - 1][1]).pos_end
 
 
 class ForNode:
+    __slots__ = ('var_name_tok', 'start_value_node', 'end_value_node', 'step_value_node', 'body_node',
+                 'should_return_null', 'hoisted_nodes', 'depth', 'slot', 'pos_start', 'pos_end')
+
     def __init__(self, var_name_tok, start_value_node, end_value_node, step_value_node, body_node, should_return_null):
         self.var_name_tok = var_name_tok
         self.start_value_node = start_value_node
@@ -94,27 +197,39 @@ class ForNode:
         self.step_value_node = step_value_node
         self.body_node = body_node
         self.should_return_null = should_return_null
+        self.hoisted_nodes = []
+        self.depth = None
+        self.slot = None
 
         self.pos_start = self.var_name_tok.pos_start
         self.pos_end = self.body_node.pos_end
 
 
 class WhileNode:
+    __slots__ = ('condition_node', 'body_node', 'should_return_null', 'hoisted_nodes', 'pos_start', 'pos_end')
+
     def __init__(self, condition_node, body_node, should_return_null):
         self.condition_node = condition_node
         self.body_node = body_node
         self.should_return_null = should_return_null
+        self.hoisted_nodes = []
 
         self.pos_start = self.condition_node.pos_start
         self.pos_end = self.body_node.pos_end
 
 
 class FuncDefNode:
+    __slots__ = ('var_name_tok', 'arg_name_toks', 'body_node', 'should_auto_return', 'layout', 'depth', 'slot',
+                 'pos_start', 'pos_end')
+
     def __init__(self, var_name_tok, arg_name_toks, body_node, should_auto_return):
         self.var_name_tok = var_name_tok
         self.arg_name_toks = arg_name_toks
         self.body_node = body_node
         self.should_auto_return = should_auto_return
+        self.layout = None
+        self.depth = None
+        self.slot = None
 
         if self.var_name_tok:
             self.pos_start = self.var_name_tok.pos_start
@@ -127,6 +242,8 @@ class FuncDefNode:
 
 
 class CallNode:
+    __slots__ = ('node_to_call', 'arg_nodes', 'pos_start', 'pos_end')
+
     def __init__(self, node_to_call, arg_nodes):
         self.node_to_call = node_to_call
         self.arg_nodes = arg_nodes
@@ -140,6 +257,8 @@ class CallNode:
 
 
 class ReturnNode:
+    __slots__ = ('node_to_return', 'pos_start', 'pos_end')
+
     def __init__(self, node_to_return, pos_start, pos_end):
         self.node_to_return = node_to_return
 
@@ -148,16 +267,30 @@ class ReturnNode:
 
 
 class ContinueNode:
+    __slots__ = ('pos_start', 'pos_end')
+
     def __init__(self, pos_start, pos_end):
         self.pos_start = pos_start
         self.pos_end = pos_end
 
 
 class BreakNode:
+    __slots__ = ('pos_start', 'pos_end')
+
     def __init__(self, pos_start, pos_end):
         self.pos_start = pos_start
         self.pos_end = pos_end
 
+
+# The node each single-token operand makes, by token type
+OPERAND_NODES = {
+    TT_INT: NumberNode,
+    TT_FLOAT: NumberNode,
+    TT_STRING: StringNode,
+    TT_IDENTIFIER: VarAccessNode
+}
+
+
 # Parse Result
 class ParseResult:
     def __init__(self):
@@ -165,7 +298,6 @@ class ParseResult:
         self.node = None
         self.last_registered_advance_count = 0
         self.advance_count = 0
-        self.to_reverse_count = 0
 
     def register_advancement(self):
         self.last_registered_advance_count = 1
@@ -177,12 +309,6 @@ class ParseResult:
         if res.error: self.error = res.error
         return res.node
 
-    def try_register(self, res):
-        if res.error:
-            self.to_reverse_count = res.advance_count
-            return None
-        return self.register(res)
-
     def success(self, node):
         self.node = node
         return self
@@ -198,6 +324,8 @@ class Parser:
     def __init__(self, tokens):
         self.tokens = tokens
         self.tok_idx = -1
+        self.recover = False
+        self.errors = []
         self.advance()
 
     def advance(self):
@@ -205,23 +333,81 @@ class Parser:
         self.update_current_tok()
         return self.current_tok
 
-    def reverse(self, amount=1):
-        self.tok_idx -= amount
-        self.update_current_tok()
-        return self.current_tok
-
     def update_current_tok(self):
         if self.tok_idx >= 0 and self.tok_idx < len(self.tokens):
             self.current_tok = self.tokens[self.tok_idx]
 
-    def parse(self):
-        res = self.statements()
-        if not res.error and self.current_tok.type != TT_EOF:
-            return res.failure(InvalidSyntaxError(
+    def starts_expr(self):
+        tok = self.current_tok
+        return tok.type in EXPR_START_TYPES or (tok.type == TT_KEYWORD and tok.value in EXPR_START_KEYWORDS)
+
+    def starts_statement(self):
+        tok = self.current_tok
+        return tok.type in EXPR_START_TYPES or (tok.type == TT_KEYWORD and tok.value in STATEMENT_START_KEYWORDS)
+
+    def parse(self, recover=False):
+        # With recover, every syntax error is collected in self.errors and the first one is returned
+        self.recover = recover
+        res = run_steps(self.statements())
+        if not recover:
+            if not res.error and self.current_tok.type != TT_EOF:
+                return res.failure(InvalidSyntaxError(
+                    self.current_tok.pos_start, self.current_tok.pos_end,
+                    "Token cannot appear after previous tokens"
+                ))
+            return res
+
+        statements = res.node.element_nodes
+        while self.current_tok.type != TT_EOF:
+            self.errors.append(InvalidSyntaxError(
                 self.current_tok.pos_start, self.current_tok.pos_end,
                 "Token cannot appear after previous tokens"
             ))
-        return res
+            res.register_advancement()
+            self.advance()
+            self.synchronize(res)
+
+            while self.current_tok.type == TT_NEWLINE:
+                res.register_advancement()
+                self.advance()
+            if self.starts_statement():
+                statements.extend(res.register(run_steps(self.statements())).element_nodes)
+
+        res.node.pos_end = self.current_tok.pos_end.copy()
+        return res.failure(self.errors[0]) if self.errors else res
+
+    def synchronize(self, res):
+        # Panic mode: skip the rest of a broken statement, up to the end of its line or the end of its block
+        while self.current_tok.type not in (TT_NEWLINE, TT_EOF) and not self.current_tok.matches(TT_KEYWORD, 'end'):
+            res.register_advancement()
+            self.advance()
+
+    def recover_statement(self, res, start_idx):
+        # Records the error of the statement starting at start_idx and skips what is left of it. Returns how many
+        # blocks its skipped lines opened, whose 'end's the caller is left to take
+        self.errors.append(res.error)
+        res.error = None
+        self.synchronize(res)
+
+        opened, header, in_create = 0, None, False
+        for tok_idx in range(start_idx, self.tok_idx):
+            tok = self.tokens[tok_idx]
+            ends_line = self.tokens[tok_idx + 1].type == TT_NEWLINE
+            if tok.type == TT_RPAREN and in_create:
+                in_create = False
+                if ends_line: opened += 1
+            elif tok.type != TT_KEYWORD:
+                continue
+            elif tok.value in ('if', 'elif', 'for', 'while'):
+                header = tok.value
+            elif tok.value == 'create':
+                in_create = True
+            elif tok.value == 'then' and ends_line and header != 'elif':
+                # An elif or else line carries on the block its if opened
+                opened += 1
+            elif tok.value == 'end' and opened:
+                opened -= 1
+        return opened
 
     ###################################
 
@@ -234,11 +420,15 @@ class Parser:
             res.register_advancement()
             self.advance()
 
-        statement = res.register(self.statement())
-        if res.error: return res
-        statements.append(statement)
-
-        more_statements = True
+        unclosed = 0
+        start_idx = self.tok_idx
+        statement = res.register((yield self.statement()))
+        if not res.error:
+            statements.append(statement)
+        elif self.recover:
+            unclosed += self.recover_statement(res, start_idx)
+        else:
+            return res
 
         while True:
             newline_count = 0
@@ -246,16 +436,28 @@ class Parser:
                 res.register_advancement()
                 self.advance()
                 newline_count += 1
-            if newline_count == 0:
-                more_statements = False
-
-            if not more_statements: break
-            statement = res.try_register(self.statement())
-            if not statement:
-                self.reverse(res.to_reverse_count)
-                more_statements = False
+
+            # Lines left over from a skipped block header are parsed as part of this block, up to its 'end'
+            if unclosed and self.current_tok.matches(TT_KEYWORD, 'end'):
+                res.register_advancement()
+                self.advance()
+                unclosed -= 1
                 continue
-            statements.append(statement)
+            if unclosed and (self.current_tok.matches(TT_KEYWORD, 'elif') or
+                             self.current_tok.matches(TT_KEYWORD, 'else')):
+                self.synchronize(res)
+                continue
+
+            # Whatever cannot start a statement ends the block, and is left for the caller ('end', 'else', ...)
+            if newline_count == 0 or not self.starts_statement(): break
+            start_idx = self.tok_idx
+            statement = res.register((yield self.statement()))
+            if not res.error:
+                statements.append(statement)
+            elif self.recover:
+                unclosed += self.recover_statement(res, start_idx)
+            else:
+                return res
 
         return res.success(ListNode(
             statements,
@@ -271,9 +473,10 @@ class Parser:
             res.register_advancement()
             self.advance()
 
-            expr = res.try_register(self.expr())
-            if not expr:
-                self.reverse(res.to_reverse_count)
+            expr = None
+            if self.starts_expr():
+                expr = res.register((yield self.expr()))
+                if res.error: return res
             return res.success(ReturnNode(expr, pos_start, self.current_tok.pos_start.copy()))
 
         if self.current_tok.matches(TT_KEYWORD, 'chaos_warp'):
@@ -286,7 +489,7 @@ class Parser:
             self.advance()
             return res.success(BreakNode(pos_start, self.current_tok.pos_start.copy()))
 
-        expr = res.register(self.expr())
+        expr = res.register((yield self.expr()))
         if res.error:
             return res.failure(InvalidSyntaxError(
                 self.current_tok.pos_start, self.current_tok.pos_end,
@@ -319,11 +522,11 @@ class Parser:
 
             res.register_advancement()
             self.advance()
-            expr = res.register(self.expr())
+            expr = res.register((yield self.expr()))
             if res.error: return res
             return res.success(VarAssignNode(var_name, expr))
 
-        node = res.register(self.bin_op(self.comp_expr, ((TT_KEYWORD, '&&'), (TT_KEYWORD, 'OR'))))
+        node = res.register((yield self.bin_op(LOGICAL_POWER)))
 
         if res.error:
             return res.failure(InvalidSyntaxError(
@@ -333,55 +536,106 @@ class Parser:
 
         return res.success(node)
 
-    def comp_expr(self):
+    # Parses operators binding at least as tightly as min_power, climbing to tighter ones for right operands.
+    # '!' can only start an operand of a logical operator, and '+'/'-' in front of an operand take in only
+    # its powers, so -a ^ b is -(a ^ b) while -a * b is (-a) * b.
+    #
+    # Operators and brackets still waiting for their operand are kept in frames of bin_op's own, which are cheaper
+    # than a parse method each for run_steps. A bracket starting with 'var' is an assignment and is read by expr
+    def bin_op(self, min_power):
         res = ParseResult()
+        frames = []
 
-        if self.current_tok.matches(TT_KEYWORD, '!'):
-            op_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-
-            node = res.register(self.comp_expr())
-            if res.error: return res
-            return res.success(UnaryOpNode(op_tok, node))
-
-        node = res.register(self.bin_op(self.arith_expr, (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE)))
-
-        if res.error:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected int, float, identifier, '+', '-', '(', '[', 'NOT'"
-            ))
+        while True:
+            tok = self.current_tok
 
-        return res.success(node)
+            if tok.type in (TT_PLUS, TT_MINUS) or (min_power <= COMPARISON_POWER and tok.matches(TT_KEYWORD, '!')):
+                res.register_advancement()
+                self.advance()
+                frames.append(('unary', min_power, tok))
+                min_power = COMPARISON_POWER if tok.type == TT_KEYWORD else EXPONENT_POWER
+                continue
 
-    def arith_expr(self):
-        return self.bin_op(self.term, (TT_PLUS, TT_MINUS))
+            if tok.type == TT_LPAREN:
+                res.register_advancement()
+                self.advance()
 
-    def term(self):
-        return self.bin_op(self.factor, (TT_MUL, TT_DIV))
+                if not self.current_tok.matches(TT_KEYWORD, 'var'):
+                    frames.append(('group', min_power, self.tok_idx))
+                    min_power = LOGICAL_POWER
+                    continue
 
-    def factor(self):
-        res = ParseResult()
-        tok = self.current_tok
+                left = res.register((yield self.expr()))
+                if not res.error: left = (yield from self.group_end(res, left)).node
+            elif tok.type in OPERAND_NODES:
+                # Most operands are a single token, read here instead of through call and atom
+                res.register_advancement()
+                self.advance()
+                left = OPERAND_NODES[tok.type](tok)
+                if self.current_tok.type == TT_LPAREN:
+                    left = (yield from self.call_args(res, left)).node
+            else:
+                start_idx = self.tok_idx
+                left = res.register((yield self.call()))
+                if res.error and min_power <= COMPARISON_POWER and self.tok_idx == start_idx:
+                    res.error = InvalidSyntaxError(
+                        self.current_tok.pos_start, self.current_tok.pos_end,
+                        "Expected int, float, identifier, '+', '-', '(', '[', 'NOT'"
+                    )
+
+            # An operator after a finished operand either opens a frame for its right operand, or the frames
+            # waiting on the operand are closed until one can take it
+            while not res.error:
+                op_tok = self.current_tok
+                power = BINDING_POWERS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)
+                if power is not None and power >= min_power:
+                    res.register_advancement()
+                    self.advance()
+                    frames.append(('binary', min_power, left, op_tok))
+                    # Powers group to the right, everything else to the left
+                    min_power = power if power == EXPONENT_POWER else power + 1
+                    break
+
+                if not frames: return res.success(left)
+                frame = frames.pop()
+                min_power = frame[1]
+
+                if frame[0] == 'unary':
+                    left = UnaryOpNode(frame[2], left)
+                elif frame[0] == 'binary':
+                    left = BinOpNode(frame[2], frame[3], left)
+                else:
+                    left = (yield from self.group_end(res, left)).node
 
-        if tok.type in (TT_PLUS, TT_MINUS):
-            res.register_advancement()
-            self.advance()
-            factor = res.register(self.factor())
-            if res.error: return res
-            return res.success(UnaryOpNode(tok, factor))
+            if res.error:
+                # Brackets around nothing they could parse report what an expression can start with
+                if frames and frames[-1][0] == 'group' and frames[-1][2] == self.tok_idx:
+                    res.error = InvalidSyntaxError(
+                        self.current_tok.pos_start, self.current_tok.pos_end,
+                        "Expected 'var', 'if', 'for', 'while', 'create', int, float, identifier, '+', '-', '(', '[', 'chaos_blast', 'chaos_warp', 'chaos_control'"
+                    )
+                return res
 
-        return self.power()
+    # The end of a bracketed expression, which bin_op reads instead of atom
+    def group_end(self, res, node):
+        if self.current_tok.type != TT_RPAREN:
+            return res.failure(InvalidSyntaxError(
+                self.current_tok.pos_start, self.current_tok.pos_end,
+                "Expected ')'"
+            ))
 
-    def power(self):
-        return self.bin_op(self.call, (TT_POW,), self.factor)
+        res.register_advancement()
+        self.advance()
+        return (yield from self.call_args(res, node))
 
     def call(self):
         res = ParseResult()
-        atom = res.register(self.atom())
+        atom = res.register((yield self.atom()))
         if res.error: return res
+        return (yield from self.call_args(res, atom))
 
+    # The argument list after an atom or a bracketed expression, if there is one
+    def call_args(self, res, atom):
         if self.current_tok.type == TT_LPAREN:
             res.register_advancement()
             self.advance()
@@ -391,7 +645,7 @@ class Parser:
                 res.register_advancement()
                 self.advance()
             else:
-                arg_nodes.append(res.register(self.expr()))
+                arg_nodes.append(res.register((yield self.expr())))
                 if res.error:
                     return res.failure(InvalidSyntaxError(
                         self.current_tok.pos_start, self.current_tok.pos_end,
@@ -402,7 +656,7 @@ class Parser:
                     res.register_advancement()
                     self.advance()
 
-                    arg_nodes.append(res.register(self.expr()))
+                    arg_nodes.append(res.register((yield self.expr())))
                     if res.error: return res
 
                 if self.current_tok.type != TT_RPAREN:
@@ -435,43 +689,28 @@ class Parser:
             self.advance()
             return res.success(VarAccessNode(tok))
 
-        elif tok.type == TT_LPAREN:
-            res.register_advancement()
-            self.advance()
-            expr = res.register(self.expr())
-            if res.error: return res
-            if self.current_tok.type == TT_RPAREN:
-                res.register_advancement()
-                self.advance()
-                return res.success(expr)
-            else:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected ')'"
-                ))
-
         elif tok.type == TT_LSQUARE:
-            list_expr = res.register(self.list_expr())
+            list_expr = res.register((yield self.list_expr()))
             if res.error: return res
             return res.success(list_expr)
 
         elif tok.matches(TT_KEYWORD, 'if'):
-            if_expr = res.register(self.if_expr())
+            if_expr = res.register((yield self.if_expr()))
             if res.error: return res
             return res.success(if_expr)
 
         elif tok.matches(TT_KEYWORD, 'for'):
-            for_expr = res.register(self.for_expr())
+            for_expr = res.register((yield self.for_expr()))
             if res.error: return res
             return res.success(for_expr)
 
         elif tok.matches(TT_KEYWORD, 'while'):
-            while_expr = res.register(self.while_expr())
+            while_expr = res.register((yield self.while_expr()))
             if res.error: return res
             return res.success(while_expr)
 
         elif tok.matches(TT_KEYWORD, 'create'):
-            func_def = res.register(self.func_def())
+            func_def = res.register((yield self.func_def()))
             if res.error: return res
             return res.success(func_def)
 
@@ -498,7 +737,7 @@ class Parser:
             res.register_advancement()
             self.advance()
         else:
-            element_nodes.append(res.register(self.expr()))
+            element_nodes.append(res.register((yield self.expr())))
             if res.error:
                 return res.failure(InvalidSyntaxError(
                     self.current_tok.pos_start, self.current_tok.pos_end,
@@ -509,7 +748,7 @@ class Parser:
                 res.register_advancement()
                 self.advance()
 
-                element_nodes.append(res.register(self.expr()))
+                element_nodes.append(res.register((yield self.expr())))
                 if res.error: return res
 
             if self.current_tok.type != TT_RSQUARE:
@@ -529,14 +768,11 @@ class Parser:
 
     def if_expr(self):
         res = ParseResult()
-        all_cases = res.register(self.if_expr_cases('if'))
+        all_cases = res.register((yield self.if_expr_cases('if')))
         if res.error: return res
         cases, else_case = all_cases
         return res.success(IfNode(cases, else_case))
 
-    def if_expr_b(self):
-        return self.if_expr_cases('elif')
-
     def if_expr_c(self):
         res = ParseResult()
         else_case = None
@@ -549,7 +785,7 @@ class Parser:
                 res.register_advancement()
                 self.advance()
 
-                statements = res.register(self.statements())
+                statements = res.register((yield self.statements()))
                 if res.error: return res
                 else_case = (statements, True)
 
@@ -562,77 +798,62 @@ class Parser:
                         "Expected 'end'"
                     ))
             else:
-                expr = res.register(self.statement())
+                expr = res.register((yield self.statement()))
                 if res.error: return res
                 else_case = (expr, False)
 
         return res.success(else_case)
 
-    def if_expr_b_or_c(self):
-        res = ParseResult()
-        cases, else_case = [], None
-
-        if self.current_tok.matches(TT_KEYWORD, 'elif'):
-            all_cases = res.register(self.if_expr_b())
-            if res.error: return res
-            cases, else_case = all_cases
-        else:
-            else_case = res.register(self.if_expr_c())
-            if res.error: return res
-
-        return res.success((cases, else_case))
-
+    # The if case and every elif case after it, read in a loop so a long elif chain nests no deeper than an if
     def if_expr_cases(self, case_keyword):
         res = ParseResult()
         cases = []
         else_case = None
 
-        if not self.current_tok.matches(TT_KEYWORD, case_keyword):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                f"Expected '{case_keyword}'"
-            ))
-
-        res.register_advancement()
-        self.advance()
+        while True:
+            if not self.current_tok.matches(TT_KEYWORD, case_keyword):
+                return res.failure(InvalidSyntaxError(
+                    self.current_tok.pos_start, self.current_tok.pos_end,
+                    f"Expected '{case_keyword}'"
+                ))
 
-        condition = res.register(self.expr())
-        if res.error: return res
+            res.register_advancement()
+            self.advance()
 
-        if not self.current_tok.matches(TT_KEYWORD, 'then'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                f"Expected 'then'"
-            ))
+            condition = res.register((yield self.expr()))
+            if res.error: return res
 
-        res.register_advancement()
-        self.advance()
+            if not self.current_tok.matches(TT_KEYWORD, 'then'):
+                return res.failure(InvalidSyntaxError(
+                    self.current_tok.pos_start, self.current_tok.pos_end,
+                    f"Expected 'then'"
+                ))
 
-        if self.current_tok.type == TT_NEWLINE:
             res.register_advancement()
             self.advance()
 
-            statements = res.register(self.statements())
-            if res.error: return res
-            cases.append((condition, statements, True))
-
-            if self.current_tok.matches(TT_KEYWORD, 'end'):
+            if self.current_tok.type == TT_NEWLINE:
                 res.register_advancement()
                 self.advance()
+
+                statements = res.register((yield self.statements()))
+                if res.error: return res
+                cases.append((condition, statements, True))
+
+                if self.current_tok.matches(TT_KEYWORD, 'end'):
+                    res.register_advancement()
+                    self.advance()
+                    break
             else:
-                all_cases = res.register(self.if_expr_b_or_c())
+                expr = res.register((yield self.statement()))
                 if res.error: return res
-                new_cases, else_case = all_cases
-                cases.extend(new_cases)
-        else:
-            expr = res.register(self.statement())
-            if res.error: return res
-            cases.append((condition, expr, False))
+                cases.append((condition, expr, False))
 
-            all_cases = res.register(self.if_expr_b_or_c())
-            if res.error: return res
-            new_cases, else_case = all_cases
-            cases.extend(new_cases)
+            if not self.current_tok.matches(TT_KEYWORD, 'elif'):
+                else_case = res.register((yield self.if_expr_c()))
+                if res.error: return res
+                break
+            case_keyword = 'elif'
 
         return res.success((cases, else_case))
 
@@ -667,7 +888,7 @@ class Parser:
         res.register_advancement()
         self.advance()
 
-        start_value = res.register(self.expr())
+        start_value = res.register((yield self.expr()))
         if res.error: return res
 
         if not self.current_tok.matches(TT_KEYWORD, 'to'):
@@ -679,14 +900,14 @@ class Parser:
         res.register_advancement()
         self.advance()
 
-        end_value = res.register(self.expr())
+        end_value = res.register((yield self.expr()))
         if res.error: return res
 
         if self.current_tok.matches(TT_KEYWORD, 'step'):
             res.register_advancement()
             self.advance()
 
-            step_value = res.register(self.expr())
+            step_value = res.register((yield self.expr()))
             if res.error: return res
         else:
             step_value = None
@@ -704,7 +925,7 @@ class Parser:
             res.register_advancement()
             self.advance()
 
-            body = res.register(self.statements())
+            body = res.register((yield self.statements()))
             if res.error: return res
 
             if not self.current_tok.matches(TT_KEYWORD, 'end'):
@@ -718,7 +939,7 @@ class Parser:
 
             return res.success(ForNode(var_name, start_value, end_value, step_value, body, True))
 
-        body = res.register(self.statement())
+        body = res.register((yield self.statement()))
         if res.error: return res
 
         return res.success(ForNode(var_name, start_value, end_value, step_value, body, False))
@@ -735,7 +956,7 @@ class Parser:
         res.register_advancement()
         self.advance()
 
-        condition = res.register(self.expr())
+        condition = res.register((yield self.expr()))
         if res.error: return res
 
         if not self.current_tok.matches(TT_KEYWORD, 'then'):
@@ -751,7 +972,7 @@ class Parser:
             res.register_advancement()
             self.advance()
 
-            body = res.register(self.statements())
+            body = res.register((yield self.statements()))
             if res.error: return res
 
             if not self.current_tok.matches(TT_KEYWORD, 'end'):
@@ -765,7 +986,7 @@ class Parser:
 
             return res.success(WhileNode(condition, body, True))
 
-        body = res.register(self.statement())
+        body = res.register((yield self.statement()))
         if res.error: return res
 
         return res.success(WhileNode(condition, body, False))
@@ -841,7 +1062,7 @@ class Parser:
             res.register_advancement()
             self.advance()
 
-            body = res.register(self.expr())
+            body = res.register((yield self.expr()))
             if res.error: return res
 
             return res.success(FuncDefNode(
@@ -860,7 +1081,7 @@ class Parser:
         res.register_advancement()
         self.advance()
 
-        body = res.register(self.statements())
+        body = res.register((yield self.statements()))
         if res.error: return res
 
         if not self.current_tok.matches(TT_KEYWORD, 'end'):
@@ -878,23 +1099,3 @@ class Parser:
             body,
             False
         ))
-
-    ###################################
-
-    def bin_op(self, func_a, ops, func_b=None):
-        if func_b is None:
-            func_b = func_a
-
-        res = ParseResult()
-        left = res.register(func_a())
-        if res.error: return res
-
-        while self.current_tok.type in ops or (self.current_tok.type, self.current_tok.value) in ops:
-            op_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-            right = res.register(func_b())
-            if res.error: return res
-            left = BinOpNode(left, op_tok, right)
-
-        return res.success(left)
@@ -0,0 +1,191 @@
+import weakref
+
+from Parser import VarAccessNode, VarAssignNode, ForNode, FuncDefNode
+
+# Depth given to names that live in the global symbol table
+GLOBAL_DEPTH = -1
+
+
+# Name registry
+#
+# A set of names, each counted once for every owner that holds it. A name stays in it while one of its owners
+# is alive, and goes once the last of them has been garbage collected
+class NameRegistry:
+    def __init__(self):
+        self.counts = {}
+
+    def __contains__(self, name):
+        return name in self.counts
+
+    def isdisjoint(self, names):
+        return not any(name in self.counts for name in names)
+
+    def register(self, owner, names):
+        names = list(names)
+        for name in names:
+            self.counts[name] = self.counts.get(name, 0) + 1
+        weakref.finalize(owner, self.unregister, names)
+
+    def unregister(self, names):
+        for name in names:
+            self.counts[name] -= 1
+            if not self.counts[name]:
+                del self.counts[name]
+
+
+# Frame layout of a function, by name. Its own type so the names it binds can be dropped along with it
+class Layout(dict):
+    pass
+
+
+# Names bound inside a function that is still around, as a node or as a value. A function can be called from a
+# program run after the one that defined it, and then sees the variables of its callers there too
+function_names = NameRegistry()
+
+
+# Resolver class
+#
+# Gives every variable reference a (depth, slot) address:
+#   (0, index)              a slot in the frame of the function being executed
+#   (GLOBAL_DEPTH, name)    the global symbol table, reached without walking the scope chain, as long as
+#                           no function binds the name. Engines check function_names when reading one, since
+#                           a program run later can add a function that binds it and calls this code
+#   (None, None)            left to SymbolTable.get, because functions see their caller's variables
+#
+# It also marks loops whose value is never read, so no engine collects their results
+class Resolver:
+    def resolve(self, node):
+        self.collect(node, None)
+        self.visit(node, None)
+        # The program's own statement values are its result
+        self.mark_unused(node, True)
+        return node
+
+    ###################################
+
+    # The passes keep the nodes still to visit on a stack of their own rather than recursing, since generated
+    # expressions can nest deeper than Python's recursion limit. Children are pushed last first, so they are
+    # still visited in program order
+
+    def collect(self, node, layout):
+        # First pass: lay out the frame of every function and remember every name bound inside one
+        layouts = []
+        stack = [(node, layout)]
+        while stack:
+            node, layout = stack.pop()
+
+            if isinstance(node, FuncDefNode):
+                if node.var_name_tok and layout is not None:
+                    self.declare(layout, node.var_name_tok.value)
+
+                # A node kept from an earlier parse gets a fresh layout
+                node.layout = Layout()
+                layouts.append(node.layout)
+                for arg_name_tok in node.arg_name_toks:
+                    self.declare(node.layout, arg_name_tok.value)
+                stack.append((node.body_node, node.layout))
+                continue
+
+            if isinstance(node, (VarAssignNode, ForNode)) and layout is not None:
+                self.declare(layout, node.var_name_tok.value)
+
+            stack.extend((child, layout) for child in reversed(self.children(node)))
+
+        for layout in layouts:
+            function_names.register(layout, layout)
+
+    def declare(self, layout, name):
+        if name not in layout:
+            layout[name] = len(layout)
+
+    def children(self, node):
+        node_type = type(node).__name__
+
+        if node_type == 'ListNode':
+            return node.element_nodes
+        if node_type == 'VarAssignNode':
+            return [node.value_node]
+        if node_type == 'BinOpNode':
+            return [node.left_node, node.right_node]
+        if node_type == 'UnaryOpNode':
+            return [node.node]
+        if node_type == 'IfNode':
+            children = []
+            for condition, expr, _ in node.cases:
+                children.extend((condition, expr))
+            if node.else_case:
+                children.append(node.else_case[0])
+            return children
+        if node_type == 'ForNode':
+            return node.hoisted_nodes + [child for child in (node.start_value_node, node.end_value_node,
+                                                             node.step_value_node, node.body_node) if child]
+        if node_type == 'WhileNode':
+            return node.hoisted_nodes + [node.condition_node, node.body_node]
+        if node_type == 'FuncDefNode':
+            return [node.body_node]
+        if node_type == 'CallNode':
+            return [node.node_to_call] + node.arg_nodes
+        if node_type == 'ReturnNode':
+            return [node.node_to_return] if node.node_to_return else []
+        return []
+
+    ###################################
+
+    def visit(self, node, layout):
+        stack = [(node, layout)]
+        while stack:
+            node, layout = stack.pop()
+
+            if isinstance(node, VarAccessNode):
+                node.depth, node.slot = self.address(node.var_name_tok.value, layout, True)
+                continue
+
+            if isinstance(node, (VarAssignNode, ForNode)):
+                node.depth, node.slot = self.address(node.var_name_tok.value, layout, False)
+
+            if isinstance(node, FuncDefNode):
+                if node.var_name_tok:
+                    node.depth, node.slot = self.address(node.var_name_tok.value, layout, False)
+                stack.append((node.body_node, node.layout))
+                continue
+
+            stack.extend((child, layout) for child in reversed(self.children(node)))
+
+    def mark_unused(self, node, is_used):
+        # Third pass: a loop nobody reads can return null like a multi-line loop, without changing the program
+        stack = [(node, is_used)]
+        while stack:
+            node, is_used = stack.pop()
+            node_type = type(node).__name__
+
+            if node_type in ('ForNode', 'WhileNode'):
+                if not is_used:
+                    node.should_return_null = True
+                for child in reversed(self.children(node)):
+                    stack.append((child, child is not node.body_node or not node.should_return_null))
+
+            elif node_type == 'IfNode':
+                if node.else_case:
+                    expr, should_return_null = node.else_case
+                    stack.append((expr, is_used and not should_return_null))
+                for condition, expr, should_return_null in reversed(node.cases):
+                    stack.append((expr, is_used and not should_return_null))
+                    stack.append((condition, True))
+
+            elif node_type == 'FuncDefNode':
+                stack.append((node.body_node, node.should_auto_return))
+
+            elif node_type == 'ListNode':
+                stack.extend((element_node, is_used) for element_node in reversed(node.element_nodes))
+
+            else:
+                stack.extend((child, True) for child in reversed(self.children(node)))
+
+    def address(self, name, layout, is_read):
+        if layout is None:
+            return GLOBAL_DEPTH, name
+        if name in layout:
+            return 0, layout[name]
+        if is_read and name not in function_names:
+            return GLOBAL_DEPTH, name
+        return None, None
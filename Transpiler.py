@@ -0,0 +1,1097 @@
+import os
+import re
+import sys
+import weakref
+from types import FunctionType
+
+from Lexer import TT_MINUS, TT_KEYWORD, RTError
+from Parser import ListNode, NumberNode
+from Resolver import GLOBAL_DEPTH, NameRegistry, function_names
+from interpreter import Number, make_number, String, List, BaseFunction, Function, BuiltInFunction, Context, \
+    global_symbol_table, operation_name, RTErrorSignal
+
+
+class TranspileError(Exception):
+    pass
+
+
+# Runtime support for the generated Python code
+#
+# ShadowLang values are plain Python values there: int and float for Number, str for String and Python
+# functions for Function. A list is the elements list of a List itself, so it still holds interpreter values
+# and is shared with the other engines rather than copied; helpers convert what they put in or take out.
+# Functions of the other engines are left as they are. Every helper mirrors the matching Value method in
+# interpreter.py.
+class Failure(Exception):
+    def __init__(self, span, details, builtin=None, blame_right=False):
+        super().__init__(details)
+        self.span = span
+        self.details = details
+        self.builtin = builtin
+        self.blame_right = blame_right
+
+
+class Halt(Exception):
+    pass
+
+
+def is_number(value):
+    value_type = type(value)
+    return value_type is int or value_type is float
+
+
+def is_true(value):
+    value_type = type(value)
+    if value_type is int or value_type is float:
+        return value != 0
+    if value_type is str:
+        return len(value) > 0
+    return False
+
+
+def to_str(value):
+    value_type = type(value)
+    if value_type is str:
+        return value
+    if value_type is list:
+        return ", ".join([str(x) for x in value])
+    if value_type is int or value_type is float:
+        return str(value)
+    return to_repr(value)
+
+
+def to_repr(value):
+    value_type = type(value)
+    if value_type is FunctionType:
+        return f"<function {value.sl_name}>"
+    if value_type is NativeBuiltin:
+        return f"<built-in function {value.name}>"
+    return str(value)
+
+
+def illegal(span):
+    return Failure(span, 'Illegal operation')
+
+
+def op_add(left, right, span):
+    left_type = type(left)
+    if left_type is int or left_type is float:
+        if is_number(right): return left + right
+    elif left_type is str:
+        if type(right) is str: return left + right
+    elif left_type is list:
+        left.append(to_value(right))
+        return left
+    raise illegal(span)
+
+
+def op_sub(left, right, span):
+    left_type = type(left)
+    if left_type is int or left_type is float:
+        if is_number(right): return left - right
+    elif left_type is list and is_number(right):
+        try:
+            left.pop(right)
+            return left
+        except:
+            raise Failure(span, 'Element at this index could not be removed from list because index is out of bounds',
+                          blame_right=True)
+    raise illegal(span)
+
+
+def op_mul(left, right, span):
+    left_type = type(left)
+    if left_type is int or left_type is float or left_type is str:
+        if is_number(right): return left * right
+    elif left_type is list and type(right) is list:
+        left.extend(right)
+        return left
+    raise illegal(span)
+
+
+def op_div(left, right, span):
+    left_type = type(left)
+    if left_type is int or left_type is float:
+        if is_number(right):
+            if right == 0:
+                raise Failure(span, 'Division by zero', blame_right=True)
+            return left / right
+    elif left_type is list and is_number(right):
+        try:
+            return to_native(left[right])
+        except:
+            raise Failure(span, 'Element at this index could not be retrieved from list because index is out of bounds',
+                          blame_right=True)
+    raise illegal(span)
+
+
+def op_pow(left, right, span):
+    if is_number(left) and is_number(right): return left ** right
+    raise illegal(span)
+
+
+def op_eq(left, right, span):
+    if is_number(left) and is_number(right): return int(left == right)
+    raise illegal(span)
+
+
+def op_ne(left, right, span):
+    if is_number(left) and is_number(right): return int(left != right)
+    raise illegal(span)
+
+
+def op_lt(left, right, span):
+    if is_number(left) and is_number(right): return int(left < right)
+    raise illegal(span)
+
+
+def op_gt(left, right, span):
+    if is_number(left) and is_number(right): return int(left > right)
+    raise illegal(span)
+
+
+def op_lte(left, right, span):
+    if is_number(left) and is_number(right): return int(left <= right)
+    raise illegal(span)
+
+
+def op_gte(left, right, span):
+    if is_number(left) and is_number(right): return int(left >= right)
+    raise illegal(span)
+
+
+def op_and(left, right, span):
+    if is_number(left) and is_number(right): return int(left and right)
+    raise illegal(span)
+
+
+def op_or(left, right, span):
+    if is_number(left) and is_number(right): return int(left or right)
+    raise illegal(span)
+
+
+def op_not(value, span):
+    if is_number(value): return 1 if value == 0 else 0
+    raise illegal(span)
+
+
+OPERATION_HELPERS = {
+    'added_to': 'op_add',
+    'subbed_by': 'op_sub',
+    'multed_by': 'op_mul',
+    'dived_by': 'op_div',
+    'powed_by': 'op_pow',
+    'get_comparison_eq': 'op_eq',
+    'get_comparison_ne': 'op_ne',
+    'get_comparison_lt': 'op_lt',
+    'get_comparison_gt': 'op_gt',
+    'get_comparison_lte': 'op_lte',
+    'get_comparison_gte': 'op_gte',
+    'anded_by': 'op_and',
+    'ored_by': 'op_or'
+}
+
+# Helpers that always produce 0 or 1, so their result can be tested without is_true
+BOOLEAN_HELPERS = ('op_eq', 'op_ne', 'op_lt', 'op_gt', 'op_lte', 'op_gte', 'op_and', 'op_or')
+
+# Operations in a chain like a + b + c + ... between temporaries, since Python only parses so many nested calls
+MAX_NESTED_OPERATIONS = 50
+
+# Stands for a variable read in generated text until its line is placed. String literals are written with
+# repr, which never leaves a NUL character in them
+READ_MARK = re.compile('\0(\\d+)\0')
+
+
+def loop_range(start, end, step):
+    if type(start) is int and type(end) is int and type(step) is int and step != 0:
+        return range(start, end, step)
+    return loop_values(start, end, step)
+
+
+def loop_values(i, end, step):
+    if step >= 0:
+        while i < end:
+            yield i
+            i += step
+    else:
+        while i > end:
+            yield i
+            i += step
+
+
+def call_value(value, span, *args):
+    value_type = type(value)
+
+    if value_type is FunctionType:
+        code = value.__code__
+        if code not in global_sync.codes: global_sync.add_function(value)
+        check_arg_count(len(args), code.co_argcount, to_repr(value), span)
+        return value(*args)
+
+    if value_type is NativeBuiltin:
+        check_arg_count(len(args), value.arg_count, to_repr(value), span)
+        return value.function(*args, span)
+
+    if isinstance(value, BaseFunction):
+        return PythonProgram.call_foreign(value, sys._getframe(1), span, args)
+
+    raise illegal(span)
+
+
+def define(function, name):
+    # A function keeps the program it was transpiled in alive for as long as it is around itself
+    function.sl_name = name
+    function.sl_program = PythonProgram.programs[function.__code__.co_filename]
+
+
+def check_arg_count(given, expected, name, span):
+    if given > expected:
+        raise Failure(span, f"{given - expected} too many args passed into {name}")
+    if given < expected:
+        raise Failure(span, f"{expected - given} too few args passed into {name}")
+
+
+# Builtins
+class NativeBuiltin:
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+        self.arg_count = function.__code__.co_argcount - 1
+
+
+def builtin_print(value, span):
+    print(to_str(value))
+    return 0
+
+
+def builtin_print_ret(value, span):
+    return to_str(value)
+
+
+def builtin_input(span):
+    return input()
+
+
+def builtin_input_int(span):
+    while True:
+        text = input()
+        try:
+            return int(text)
+        except ValueError:
+            print(f"'{text}' must be an integer. Try again!")
+
+
+def builtin_clear(span):
+    os.system('cls' if os.name == 'nt' else 'cls')
+    return 0
+
+
+def builtin_is_number(value, span):
+    return 1 if is_number(value) else 0
+
+
+def builtin_is_string(value, span):
+    return 1 if type(value) is str else 0
+
+
+def builtin_is_list(value, span):
+    return 1 if type(value) is list else 0
+
+
+def builtin_is_function(value, span):
+    return 1 if type(value) is FunctionType or type(value) is NativeBuiltin or isinstance(value, BaseFunction) else 0
+
+
+def builtin_append(list_, value, span):
+    if type(list_) is not list:
+        raise Failure(span, "First argument must be list", 'append')
+    list_.append(to_value(value))
+    return 0
+
+
+def builtin_pop(list_, index, span):
+    if type(list_) is not list:
+        raise Failure(span, "First argument must be list", 'pop')
+    if not is_number(index):
+        raise Failure(span, "Second argument must be number", 'pop')
+    try:
+        return to_native(list_.pop(index))
+    except:
+        raise Failure(span, 'Element at this index could not be removed from list because index is out of bounds',
+                      'pop')
+
+
+def builtin_extend(list_a, list_b, span):
+    if type(list_a) is not list:
+        raise Failure(span, "First argument must be list", 'extend')
+    if type(list_b) is not list:
+        raise Failure(span, "Second argument must be list", 'extend')
+    list_a.extend(list_b)
+    return 0
+
+
+def builtin_len(list_, span):
+    if type(list_) is not list:
+        raise Failure(span, "Argument must be list", 'len')
+    return len(list_)
+
+
+NATIVE_BUILTINS = {
+    name: NativeBuiltin(name, function) for name, function in (
+        ('print', builtin_print),
+        ('print_ret', builtin_print_ret),
+        ('input', builtin_input),
+        ('input_int', builtin_input_int),
+        ('clear', builtin_clear),
+        ('is_number', builtin_is_number),
+        ('is_string', builtin_is_string),
+        ('is_list', builtin_is_list),
+        ('is_function', builtin_is_function),
+        ('append', builtin_append),
+        ('pop', builtin_pop),
+        ('extend', builtin_extend),
+        ('len', builtin_len)
+    )
+}
+
+
+# Conversions between interpreter values and native values. Neither copies a list
+def to_native(value):
+    if isinstance(value, (Number, String)):
+        return value.value
+    if isinstance(value, List):
+        return value.elements
+    if isinstance(value, TranspiledFunction):
+        return value.function
+    if isinstance(value, BuiltInFunction) and value.name in NATIVE_BUILTINS:
+        return NATIVE_BUILTINS[value.name]
+    return value
+
+
+def to_value(value):
+    value_type = type(value)
+    if value_type is int or value_type is float:
+        return make_number(value)
+    if value_type is str:
+        return String(value)
+    if value_type is list:
+        return List(value)
+    if value_type is FunctionType:
+        return TranspiledFunction(value)
+    if value_type is NativeBuiltin:
+        return getattr(BuiltInFunction, value.name)
+    return value
+
+
+RUNTIME = {name: value for name, value in globals().items() if name.startswith(('op_', 'builtin_'))}
+RUNTIME.update(is_true=is_true, loop_range=loop_range, call_value=call_value, define=define, to_value=to_value,
+               Halt=Halt)
+
+# Every transpiled program runs in this namespace, so functions keep seeing the current globals
+namespace = dict(RUNTIME)
+
+# Names functions of live transpiled programs read straight from the namespace. A function binding one of them
+# could be calling those functions, which would then have to see its variables instead
+free_names = NameRegistry()
+
+
+# Global sync
+#
+# The namespace holds a global only while native code that reads or assigns it is running. Entering native
+# code loads the globals it uses from the global symbol table, calling a function not seen since loads that
+# function's too, and leaving stores them all back. Whenever other code runs in between, through a call
+# either way, the globals go back before it and are loaded again after it. Once no native code is running, the
+# namespace holds nothing but the runtime again, so it keeps no program alive
+class GlobalSync:
+    def __init__(self):
+        self.names = set()
+        self.codes = set()
+        self.entries = []
+
+    def enter(self, names, context, entry_pos, code=None):
+        self.entries.append((context, entry_pos))
+        if code: self.codes.add(code)
+        self.names.update(names)
+        self.load(self.names)
+
+    def leave(self):
+        self.entries.pop()
+        self.store(self.names)
+        if not self.entries:
+            for name in [name for name in namespace if name not in RUNTIME]:
+                del namespace[name]
+            self.names = set()
+            self.codes = set()
+
+    def add_function(self, function):
+        code = function.__code__
+        self.codes.add(code)
+        names = function.sl_program.function_globals[code.co_name] - self.names
+        self.names.update(names)
+        self.load(names)
+
+    def load(self, names):
+        symbols = global_symbol_table.symbols
+        for name in names:
+            value = symbols.get(name)
+            if value is None:
+                namespace.pop('v_' + name, None)
+            else:
+                namespace['v_' + name] = to_native(value)
+
+    def store(self, names):
+        symbols = global_symbol_table.symbols
+        for name in names:
+            value = namespace.get('v_' + name)
+            if value is None: continue
+            # A List still holding the same elements stays, so every reference to it stays the same
+            current = symbols.get(name)
+            if type(value) is list and isinstance(current, List) and current.elements is value: continue
+            global_symbol_table.set(name, to_value(value))
+
+
+global_sync = GlobalSync()
+
+
+class TranspiledFunction(BaseFunction):
+    __slots__ = ('function', 'arg_names')
+
+    def __init__(self, function):
+        super().__init__(function.sl_name)
+        self.function = function
+        self.arg_names = [name[2:] for name in function.__code__.co_varnames[:function.__code__.co_argcount]]
+
+    def execute(self, args, context, pos_start, pos_end):
+        self.check_args(self.arg_names, args, context, pos_start, pos_end)
+        program = self.function.sl_program
+
+        # A program run since this one binds one of its free names inside a function, so its functions are
+        # walked instead, looking the name up through their callers
+        if not function_names.isdisjoint(program.free_names):
+            node = program.function_nodes[self.function.__name__]
+            arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+            function = Function(self.name, node.body_node, arg_names, node.should_auto_return, node.layout)
+            return function.execute(args, context, pos_start, pos_end)
+
+        return program.call(self.function, [to_native(arg) for arg in args], context, pos_start)
+
+    def copy(self):
+        copy = TranspiledFunction(self.function)
+        copy.set_context(self.context)
+        copy.set_pos(self.pos_start, self.pos_end)
+        return copy
+
+    def __repr__(self):
+        return f"<function {self.name}>"
+
+
+# Transpiled program
+class PythonProgram:
+    # Functions keep running after the program that defined them, so errors are traced per file name. Only
+    # programs with a function still around, or still running, are kept
+    programs = weakref.WeakValueDictionary()
+
+    def __init__(self, source, file_name, spans, line_positions, line_names, function_names, function_nodes,
+                 free_names, global_names, function_globals):
+        self.source = source
+        self.file_name = file_name
+        self.spans = spans
+        self.line_positions = line_positions
+        self.line_names = line_names
+        self.function_names = function_names
+        self.function_nodes = function_nodes
+        self.free_names = free_names
+        # Globals the top level uses, and those each function uses, by def name
+        self.global_names = global_names
+        self.function_globals = function_globals
+        self.code = compile(source, file_name, 'exec')
+        PythonProgram.programs[file_name] = self
+
+    def run(self, context):
+        global_sync.enter(self.global_names, context, None)
+        try:
+            exec(self.code, namespace)
+            return List([to_value(value) for value in namespace['t_result']])
+        except Halt:
+            return None
+        except (Failure, NameError) as exception:
+            raise RTErrorSignal(self.translate_error(exception, context, None))
+        finally:
+            # Keep the global symbol table in step, as the other engines would have
+            global_sync.leave()
+
+    def call(self, function, args, context, entry_pos):
+        code = function.__code__
+        global_sync.enter(self.function_globals[code.co_name], context, entry_pos, code)
+        try:
+            return to_value(function(*args))
+        except (Failure, NameError) as exception:
+            raise RTErrorSignal(self.translate_error(exception, context, entry_pos))
+        finally:
+            global_sync.leave()
+
+    @staticmethod
+    def call_foreign(function, frame, span, args):
+        # A function from another engine, called by native code. It works on the global symbol table, which
+        # is brought up to date first, and the namespace is loaded again once it returns
+        frames = []
+        while frame.f_code is not PythonProgram.run.__code__ and frame.f_code is not PythonProgram.call.__code__:
+            code = frame.f_code
+            if code.co_filename in PythonProgram.programs:
+                frames.append((PythonProgram.programs[code.co_filename], code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        frames.reverse()
+
+        context, entry_pos = global_sync.entries[-1]
+        context = PythonProgram.rebuild_context(frames, context, entry_pos)
+        pos_start, _, _, pos_end = frames[-1][0].spans[span]
+
+        global_sync.store(global_sync.names)
+        try:
+            value = function.execute([to_value(arg) for arg in args], context, pos_start, pos_end)
+        finally:
+            global_sync.load(global_sync.names)
+        return to_native(value)
+
+    @staticmethod
+    def instruction_col(code, lasti):
+        positions = getattr(code, 'co_positions', None)
+        if positions is None: return None
+        for i, (_, _, col, _) in enumerate(positions()):
+            if i == lasti // 2: return col
+        return None
+
+    @staticmethod
+    def rebuild_context(frames, context, entry_pos):
+        # The chain of contexts the tree walker would have had in the innermost of frames
+        parent_pos = entry_pos
+        for program, code_name, lineno in frames:
+            if code_name in program.function_names:
+                context = Context(program.function_names[code_name], context, parent_pos)
+            parent_pos = program.line_positions[lineno]
+        return context
+
+    def translate_error(self, exception, context, entry_pos):
+        frames = []
+        traceback = exception.__traceback__
+        while traceback:
+            code = traceback.tb_frame.f_code
+            if code.co_filename in PythonProgram.programs:
+                frames.append((PythonProgram.programs[code.co_filename], code.co_name, traceback.tb_lineno))
+                last = traceback
+            traceback = traceback.tb_next
+
+        if not frames:
+            raise exception
+
+        context = PythonProgram.rebuild_context(frames, context, entry_pos)
+        program, _, lineno = frames[-1]
+
+        if isinstance(exception, NameError):
+            if not (exception.name or '').startswith('v_'): raise exception
+            var_name = exception.name[2:]
+            reads = [read for read in program.line_names.get(lineno, []) if read[1] == var_name]
+            if not reads: raise exception
+
+            # The read that failed is the one starting at the column of the instruction that raised
+            col = self.instruction_col(last.tb_frame.f_code, last.tb_lasti)
+            _, _, pos_start, pos_end = next((read for read in reads if read[0] == col), reads[0])
+            return RTError(pos_start, pos_end, f"'{var_name}' is not defined", context)
+
+        left_start, left_end, right_start, right_end = program.spans[exception.span]
+        if exception.builtin:
+            context = Context(exception.builtin, context, left_start)
+            return RTError(left_start, right_end, exception.details, context)
+        if exception.blame_right:
+            return RTError(right_start, right_end, exception.details, context)
+        return RTError(left_start, right_end, exception.details, context)
+
+
+# Transpiler class
+#
+# Emits Python source for a resolved program. Anything the generated code could not reproduce faithfully
+# raises TranspileError, and run() falls back to the tree walker.
+class Transpiler:
+    program_count = 0
+
+    def __init__(self):
+        # Each program gets its own file name, so its frames can be told apart in a traceback
+        Transpiler.program_count += 1
+        self.file_name = f'<shadowlang-{Transpiler.program_count}>'
+        self.lines = []
+        self.line_positions = {}
+        self.line_names = {}
+        self.reads = []
+        self.indent = 0
+        self.pos = None
+        self.spans = []
+        self.temp_count = 0
+        self.function_names = {}
+        self.function_nodes = {}
+        self.global_names = set()
+        self.function_globals = {}
+        self.free_names = set()
+        self.assigned_globals = set()
+        self.function = None
+        self.loop_depth = 0
+
+    def transpile(self, node):
+        try:
+            self.scan(node, None, set(), self.global_names)
+            self.emit('t_result = []')
+            for statement in node.element_nodes if isinstance(node, ListNode) else [node]:
+                self.pos = statement.pos_start
+                self.emit(f't_result.append({self.expr(statement)})')
+
+            source = '\n'.join(text for text, _ in self.lines) + '\n'
+            line_positions = {lineno + 1: pos for lineno, (_, pos) in enumerate(self.lines)}
+            function_globals = {
+                def_name: self.function_globals[node] for def_name, node in self.function_nodes.items()
+            }
+            program = PythonProgram(source, self.file_name, self.spans, line_positions, self.line_names,
+                                    self.function_names, self.function_nodes, self.free_names, self.global_names,
+                                    function_globals)
+            free_names.register(program, self.free_names)
+            return program
+        except RecursionError:
+            # Nested deeper than translating it, or compiling the translation, can go
+            raise TranspileError('Program is nested too deeply to translate')
+        except SyntaxError as exception:
+            # Python's own limits on nested brackets and blocks
+            if not exception.msg.startswith('too many'): raise
+            raise TranspileError(exception.msg)
+
+    ###################################
+
+    def emit(self, text):
+        line, reads = self.place(text)
+        self.lines.append((line, self.pos))
+        if reads: self.line_names[len(self.lines)] = reads
+
+    def replace_line(self, index, text):
+        line, reads = self.place(text)
+        self.lines[index] = (line, self.pos)
+        if reads: self.line_names[index + 1] = reads
+
+    def place(self, text):
+        # The line for text at the current indent, with every read written out as its variable, and where each
+        # read lands on it, in the UTF-8 columns Python gives for code positions
+        line = '    ' * self.indent + text
+        parts, reads, last, col = [], [], 0, 0
+        for match in READ_MARK.finditer(line):
+            parts.append(line[last:match.start()])
+            col += len(parts[-1].encode('utf-8'))
+            name, pos_start, pos_end = self.reads[int(match.group(1))]
+            parts.append('v_' + name)
+            reads.append((col, name, pos_start, pos_end))
+            col += len(name) + 2
+            last = match.end()
+        parts.append(line[last:])
+        return ''.join(parts), reads
+
+    def truncate(self, mark):
+        del self.lines[mark:]
+        self.line_names = {lineno: names for lineno, names in self.line_names.items() if lineno <= mark}
+
+    def temp(self):
+        self.temp_count += 1
+        return f't_{self.temp_count}'
+
+    def span(self, left_node, right_node=None):
+        right_node = right_node or left_node
+        self.spans.append((left_node.pos_start, left_node.pos_end, right_node.pos_start, right_node.pos_end))
+        return len(self.spans) - 1
+
+    def block(self, emit_body):
+        mark = len(self.lines)
+        self.indent += 1
+        emit_body()
+        if len(self.lines) == mark:
+            self.emit('pass')
+        self.indent -= 1
+
+    def sequence(self, nodes):
+        # Evaluate nodes left to right; once a later node needs statements, spill the earlier results
+        values = []
+        for node in nodes:
+            mark = len(self.lines)
+            value = self.expr(node)
+            if len(self.lines) > mark:
+                for i, earlier in enumerate(values):
+                    if not self.is_literal(earlier):
+                        values[i] = self.spill(mark, earlier)
+                        mark += 1
+            values.append(value)
+        return values
+
+    def spill(self, mark, text):
+        # Works text out into a temporary just before the line at mark
+        temp = self.temp()
+        line, reads = self.place(f'{temp} = {text}')
+        self.lines.insert(mark, (line, self.pos))
+        self.shift_line_names(mark)
+        if reads: self.line_names[mark + 1] = reads
+        return temp
+
+    def shift_line_names(self, mark):
+        self.line_names = {
+            (lineno + 1 if lineno > mark else lineno): names for lineno, names in self.line_names.items()
+        }
+
+    def is_literal(self, text):
+        return text.startswith(("'", '"')) or text.replace('.', '', 1).isdigit() or text.startswith('t_')
+
+    def condition(self, node):
+        text = self.expr(node)
+        if isinstance(node, NumberNode) or text.startswith(BOOLEAN_HELPERS):
+            return text
+        return f'is_true({text})'
+
+    ###################################
+
+    def scan(self, node, layout, assigned, used):
+        # Checks that free names in functions do not rely on seeing the caller's variables, and collects the
+        # globals each function and the top level use into used
+        node_type = type(node).__name__
+
+        if node_type == 'VarAccessNode':
+            name = node.var_name_tok.value
+            if node.depth == GLOBAL_DEPTH:
+                used.add(name)
+                if layout is not None: self.free_names.add(name)
+            elif node.depth is None or name not in assigned:
+                raise TranspileError(f"'{name}' may be read from a caller's scope")
+            return assigned
+
+        if node_type in ('VarAssignNode', 'ForNode', 'FuncDefNode'):
+            if node_type == 'VarAssignNode':
+                assigned = self.scan(node.value_node, layout, assigned, used)
+            elif node_type == 'ForNode':
+                for child in node.hoisted_nodes + [node.start_value_node, node.end_value_node, node.step_value_node]:
+                    if child: assigned = self.scan(child, layout, assigned, used)
+            else:
+                if not free_names.isdisjoint(node.layout):
+                    raise TranspileError('A function binds a name transpiled functions read from the globals')
+                self.function_globals[node] = set()
+                self.scan(node.body_node, node.layout, {arg_name.value for arg_name in node.arg_name_toks},
+                          self.function_globals[node])
+                if not node.var_name_tok:
+                    return assigned
+
+            name = node.var_name_tok.value
+            if layout is None:
+                used.add(name)
+                self.assigned_globals.add(name)
+            if node_type == 'ForNode':
+                self.scan(node.body_node, layout, assigned | {name}, used)
+                return assigned
+            return assigned | {name}
+
+        if node_type == 'IfNode':
+            first = True
+            for condition, expr, _ in node.cases:
+                after_condition = self.scan(condition, layout, assigned, used)
+                if first:
+                    assigned, first = after_condition, False
+                self.scan(expr, layout, after_condition, used)
+            if node.else_case:
+                self.scan(node.else_case[0], layout, assigned, used)
+            return assigned
+
+        if node_type == 'WhileNode':
+            for hoisted_node in node.hoisted_nodes:
+                assigned = self.scan(hoisted_node, layout, assigned, used)
+            assigned = self.scan(node.condition_node, layout, assigned, used)
+            self.scan(node.body_node, layout, assigned, used)
+            return assigned
+
+        if node_type == 'ListNode':
+            children = node.element_nodes
+        elif node_type == 'BinOpNode':
+            # Down the left operands in a loop, so a long chain is no deeper to scan than one operation
+            chain = []
+            while type(node).__name__ == 'BinOpNode':
+                chain.append(node)
+                node = node.left_node
+            assigned = self.scan(node, layout, assigned, used)
+            children = [link.right_node for link in reversed(chain)]
+        elif node_type == 'UnaryOpNode':
+            children = [node.node]
+        elif node_type == 'CallNode':
+            children = [node.node_to_call] + node.arg_nodes
+        elif node_type == 'ReturnNode':
+            children = [node.node_to_return] if node.node_to_return else []
+        elif node_type in ('NumberNode', 'StringNode', 'ContinueNode', 'BreakNode'):
+            children = []
+        else:
+            raise TranspileError(f'No translation for {node_type}')
+
+        for child in children:
+            assigned = self.scan(child, layout, assigned, used)
+        return assigned
+
+    ###################################
+
+    def expr(self, node):
+        method_name = f'expr_{type(node).__name__}'
+        method = getattr(self, method_name, None)
+        if method is None:
+            raise TranspileError(f'No translation for {type(node).__name__}')
+        return method(node)
+
+    def stmt(self, node):
+        # Emit node for its effects only, which lets blocks and loops skip building their values
+        node_type = type(node).__name__
+
+        if node_type == 'ListNode':
+            pos = self.pos
+            for element_node in node.element_nodes:
+                self.pos = element_node.pos_start
+                self.stmt(element_node)
+            self.pos = pos
+        elif node_type == 'IfNode':
+            self.if_statement(node, None)
+        elif node_type == 'ForNode':
+            self.for_statement(node, None)
+        elif node_type == 'WhileNode':
+            self.while_statement(node, None)
+        elif node_type in ('ReturnNode', 'ContinueNode', 'BreakNode', 'FuncDefNode'):
+            self.expr(node)
+        else:
+            self.emit(self.expr(node))
+
+    ###################################
+
+    def expr_NumberNode(self, node):
+        return repr(node.tok.value)
+
+    def expr_StringNode(self, node):
+        return repr(node.tok.value)
+
+    def expr_ListNode(self, node):
+        return f'[{", ".join(f"to_value({value})" for value in self.sequence(node.element_nodes))}]'
+
+    def expr_VarAccessNode(self, node):
+        # Each read is told apart from the others on its line, so an undefined name points at the one that ran
+        self.reads.append((node.var_name_tok.value, node.pos_start, node.pos_end))
+        return f'\0{len(self.reads) - 1}\0'
+
+    def expr_VarAssignNode(self, node):
+        return f'(v_{node.var_name_tok.value} := {self.expr(node.value_node)})'
+
+    def expr_BinOpNode(self, node):
+        # A chain like a + b + c + ... is translated down its left operands in a loop, the way sequence would
+        # translate each operation's two operands
+        chain = []
+        while type(node).__name__ == 'BinOpNode':
+            helper = OPERATION_HELPERS.get(operation_name(node.op_tok))
+            if helper is None:
+                raise TranspileError(f'No translation for operator {node.op_tok}')
+            chain.append((node, helper))
+            node = node.left_node
+
+        left = self.expr(node)
+        for count, (node, helper) in enumerate(reversed(chain), 1):
+            mark = len(self.lines)
+            right = self.expr(node.right_node)
+            if len(self.lines) > mark and not self.is_literal(left):
+                left = self.spill(mark, left)
+
+            left = f'{helper}({left}, {right}, {self.span(node.left_node, node.right_node)})'
+            if count % MAX_NESTED_OPERATIONS == 0 and count < len(chain):
+                temp = self.temp()
+                self.emit(f'{temp} = {left}')
+                left = temp
+        return left
+
+    def expr_UnaryOpNode(self, node):
+        operand = self.expr(node.node)
+
+        if node.op_tok.type == TT_MINUS:
+            return f'op_mul({operand}, -1, {self.span(node.node)})'
+        if node.op_tok.type == TT_KEYWORD:
+            return f'op_not({operand}, {self.span(node.node)})'
+        return operand
+
+    def expr_IfNode(self, node):
+        # Branches that are plain expressions become a conditional expression
+        mark = len(self.lines)
+        if not any(should_return_null for _, _, should_return_null in node.cases) and \
+                not (node.else_case and node.else_case[1]):
+            parts = []
+            for condition, expr, _ in node.cases:
+                parts.append((self.condition(condition), self.expr(expr)))
+            else_value = self.expr(node.else_case[0]) if node.else_case else '0'
+
+            if len(self.lines) == mark:
+                text = else_value
+                for condition, value in reversed(parts):
+                    text = f'({value} if {condition} else {text})'
+                return text
+
+            self.truncate(mark)
+
+        result = self.temp()
+        self.if_statement(node, result)
+        return result
+
+    def if_statement(self, node, result):
+        cases = list(node.cases)
+
+        def emit_cases():
+            condition, expr, should_return_null = cases.pop(0)
+            self.emit(f'if {self.condition(condition)}:')
+            self.block(lambda: self.branch(expr, should_return_null, result))
+            if cases or node.else_case or result:
+                self.emit('else:')
+                self.block(emit_cases if cases else emit_else)
+
+        def emit_else():
+            if node.else_case:
+                self.branch(node.else_case[0], node.else_case[1], result)
+            elif result:
+                self.emit(f'{result} = 0')
+
+        emit_cases()
+
+    def branch(self, node, should_return_null, result):
+        if result is None:
+            self.stmt(node)
+        elif should_return_null:
+            self.stmt(node)
+            self.emit(f'{result} = 0')
+        else:
+            self.emit(f'{result} = {self.expr(node)}')
+
+    def expr_ForNode(self, node):
+        if node.should_return_null:
+            self.for_statement(node, None)
+            return '0'
+        result = self.temp()
+        self.for_statement(node, result)
+        return result
+
+    def for_statement(self, node, result):
+        for hoisted_node in node.hoisted_nodes:
+            self.stmt(hoisted_node)
+
+        nodes = [node.start_value_node, node.end_value_node]
+        if node.step_value_node: nodes.append(node.step_value_node)
+        values = self.sequence(nodes)
+        if len(values) == 2: values.append('1')
+
+        if result: self.emit(f'{result} = []')
+        self.emit(f'for v_{node.var_name_tok.value} in loop_range({", ".join(values)}):')
+        self.loop_body(node, result)
+
+    def expr_WhileNode(self, node):
+        if node.should_return_null:
+            self.while_statement(node, None)
+            return '0'
+        result = self.temp()
+        self.while_statement(node, result)
+        return result
+
+    def while_statement(self, node, result):
+        for hoisted_node in node.hoisted_nodes:
+            self.stmt(hoisted_node)
+
+        if result: self.emit(f'{result} = []')
+
+        self.emit('while True:')
+        mark = len(self.lines)
+        self.indent += 1
+        condition = self.condition(node.condition_node)
+        self.indent -= 1
+
+        if len(self.lines) == mark:
+            self.replace_line(mark - 1, f'while {condition}:')
+        else:
+            # The condition needs statements of its own, so evaluate it at the top of every iteration
+            self.indent += 1
+            self.emit(f'if not {condition}: break')
+            self.indent -= 1
+
+        self.loop_body(node, result)
+
+    def loop_body(self, node, result):
+        self.loop_depth += 1
+
+        def emit_body():
+            if result:
+                self.emit(f'{result}.append(to_value({self.expr(node.body_node)}))')
+            else:
+                self.stmt(node.body_node)
+
+        self.block(emit_body)
+        self.loop_depth -= 1
+
+    def expr_FuncDefNode(self, node):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        def_name = f'f_{len(self.function_names)}'
+        self.function_names[def_name] = func_name or '<anonymous>'
+        self.function_nodes[def_name] = node
+        arg_names = ', '.join('v_' + arg_name.value for arg_name in node.arg_name_toks)
+
+        outer_function, outer_loop_depth = self.function, self.loop_depth
+        self.function, self.loop_depth = node, 0
+        self.emit(f'def {def_name}({arg_names}):')
+
+        def emit_body():
+            if node.should_auto_return:
+                self.emit(f'return {self.expr(node.body_node)}')
+            else:
+                self.stmt(node.body_node)
+                self.emit('return 0')
+
+        self.block(emit_body)
+        self.function, self.loop_depth = outer_function, outer_loop_depth
+
+        self.emit(f'define({def_name}, {self.function_names[def_name]!r})')
+        if func_name:
+            self.emit(f'v_{func_name} = {def_name}')
+        return def_name
+
+    def expr_CallNode(self, node):
+        span = self.span(node)
+        callee_node = node.node_to_call
+
+        if type(callee_node).__name__ == 'VarAccessNode' and callee_node.depth == GLOBAL_DEPTH:
+            name = callee_node.var_name_tok.value
+            value = global_symbol_table.get(name)
+
+            # Builtins nobody reassigns are called directly, with the call span for their errors
+            if name not in self.assigned_globals and isinstance(value, BuiltInFunction) and \
+                    value.name in NATIVE_BUILTINS and NATIVE_BUILTINS[value.name].arg_count == len(node.arg_nodes):
+                args = self.sequence(node.arg_nodes)
+                return f'builtin_{value.name}({", ".join(args + [str(span)])})'
+
+        values = self.sequence([callee_node] + node.arg_nodes)
+        return f'call_value({", ".join([values[0], str(span)] + values[1:])})'
+
+    def expr_ReturnNode(self, node):
+        value = self.expr(node.node_to_return) if node.node_to_return else '0'
+        if self.function:
+            self.emit(f'return {value}')
+        else:
+            # The program stops with nothing to show, but the value is still worked out, errors and all
+            self.emit(value)
+            self.emit('raise Halt()')
+        return '0'
+
+    def expr_ContinueNode(self, node):
+        self.loop_control(node, 'continue')
+        return '0'
+
+    def expr_BreakNode(self, node):
+        self.loop_control(node, 'break')
+        return '0'
+
+    def loop_control(self, node, statement):
+        if self.loop_depth:
+            self.emit(statement)
+        elif self.function:
+            # The tree walker lets these escape into the caller's loop
+            raise TranspileError(f'{type(node).__name__} outside of a loop')
+        else:
+            self.emit('raise Halt()')
@@ -1,70 +1,45 @@
 import math
 import os
+import sys
 
 from Lexer import TT_PLUS, TT_MINUS, TT_MUL, TT_DIV, RTError, TT_POW, TT_GTE, TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, \
-    TT_KEYWORD, Lexer
-from Parser import Parser
+    TT_KEYWORD, Lexer, StreamLexer, TokenStream
+from Parser import Parser, ListNode, BinOpNode
+from Resolver import Resolver, GLOBAL_DEPTH, function_names
+from Cache import load_program, save_program
+
+
+# Runtime Signals
+#
+# Evaluation returns plain values; errors and control flow unwind as exceptions instead.
+# Note: nothing stops chaos_control and chaos_warp at a function boundary, so they continue and break
+# the caller's loop
+class RTErrorSignal(Exception):
+    def __init__(self, error):
+        super().__init__(error.details)
+        self.error = error
 
 
-# Runtime Result
-class RTResult:
-    def __init__(self):
-        self.reset()
-
-    def reset(self):
-        self.value = None
-        self.error = None
-        self.func_return_value = None
-        self.loop_should_continue = False
-        self.loop_should_break = False
-
-    def register(self, res):
-        self.error = res.error
-        self.func_return_value = res.func_return_value
-        self.loop_should_continue = res.loop_should_continue
-        self.loop_should_break = res.loop_should_break
-        return res.value
-
-    def success(self, value):
-        self.reset()
+class ReturnSignal(Exception):
+    def __init__(self, value):
+        super().__init__()
         self.value = value
-        return self
 
-    def success_return(self, value):
-        self.reset()
-        self.func_return_value = value
-        return self
 
-    def success_continue(self):
-        self.reset()
-        self.loop_should_continue = True
-        return self
+class BreakSignal(Exception):
+    pass
 
-    def success_break(self):
-        self.reset()
-        self.loop_should_break = True
-        return self
 
-    def failure(self, error):
-        self.reset()
-        self.error = error
-        return self
-
-    def should_return(self):
-        # Note: this will allow you to continue and break outside the current function
-        return (
-                self.error or
-                self.func_return_value or
-                self.loop_should_continue or
-                self.loop_should_break
-        )
+class ContinueSignal(Exception):
+    pass
 
 
 # Number and Value class
 class Value:
+    __slots__ = ('pos_start', 'pos_end', 'context')
+
     def __init__(self):
-        self.set_pos()
-        self.set_context()
+        self.pos_start = self.pos_end = self.context = None
 
     def set_pos(self, pos_start=None, pos_end=None):
         self.pos_start = pos_start
@@ -117,8 +92,8 @@ class Value:
     def notted(self, other):
         return None, self.illegal_operation(other)
 
-    def execute(self, args):
-        return RTResult().failure(self.illegal_operation())
+    def execute(self, args, context, pos_start, pos_end):
+        raise RTErrorSignal(RTError(pos_start, pos_end, 'Illegal operation', context))
 
     def copy(self):
         raise Exception('No copy method defined')
@@ -136,25 +111,27 @@ class Value:
 
 
 class Number(Value):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super().__init__()
         self.value = value
 
     def added_to(self, other):
         if isinstance(other, Number):
-            return Number(self.value + other.value).set_context(self.context), None
+            return make_number(self.value + other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def subbed_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value - other.value).set_context(self.context), None
+            return make_number(self.value - other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def multed_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value * other.value).set_context(self.context), None
+            return make_number(self.value * other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
@@ -167,66 +144,66 @@ class Number(Value):
                     self.context
                 )
 
-            return Number(self.value / other.value).set_context(self.context), None
+            return make_number(self.value / other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def powed_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value ** other.value).set_context(self.context), None
+            return make_number(self.value ** other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_eq(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value == other.value)).set_context(self.context), None
+            return make_number(int(self.value == other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_ne(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value != other.value)).set_context(self.context), None
+            return make_number(int(self.value != other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_lt(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value < other.value)).set_context(self.context), None
+            return make_number(int(self.value < other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_gt(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value > other.value)).set_context(self.context), None
+            return make_number(int(self.value > other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_lte(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value <= other.value)).set_context(self.context), None
+            return make_number(int(self.value <= other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_gte(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value >= other.value)).set_context(self.context), None
+            return make_number(int(self.value >= other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def anded_by(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value and other.value)).set_context(self.context), None
+            return make_number(int(self.value and other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def ored_by(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value or other.value)).set_context(self.context), None
+            return make_number(int(self.value or other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def notted(self):
-        return Number(1 if self.value == 0 else 0).set_context(self.context), None
+        return make_number(1 if self.value == 0 else 0), None
 
     def copy(self):
         copy = Number(self.value)
@@ -249,21 +226,35 @@ Number.false = Number(0)
 Number.true = Number(1)
 Number.math_PI = Number(math.pi)
 
+# Preallocated Numbers for small integers such as loop counters and comparison results. They are shared,
+# so nothing may call set_pos or set_context on them; positions go on a copy instead.
+SMALL_INT_MIN = -128
+SMALL_INT_MAX = 1024
+small_ints = [Number(i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+
+
+def make_number(value):
+    if type(value) is int and SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+        return small_ints[value - SMALL_INT_MIN]
+    return Number(value)
+
 
 class String(Value):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super().__init__()
         self.value = value
 
     def added_to(self, other):
         if isinstance(other, String):
-            return String(self.value + other.value).set_context(self.context), None
+            return String(self.value + other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def multed_by(self, other):
         if isinstance(other, Number):
-            return String(self.value * other.value).set_context(self.context), None
+            return String(self.value * other.value), None
         else:
             return None, Value.illegal_operation(self, other)
 
@@ -284,6 +275,8 @@ class String(Value):
 
 
 class List(Value):
+    __slots__ = ('elements',)
+
     def __init__(self, elements):
         super().__init__()
         self.elements = elements
@@ -343,72 +336,64 @@ class List(Value):
 
 
 class BaseFunction(Value):
+    __slots__ = ('name', 'layout')
+
     def __init__(self, name):
         super().__init__()
         self.name = name or "<anonymous>"
+        self.layout = None
 
-    def generate_new_context(self):
-        new_context = Context(self.name, self.context, self.pos_start)
-        new_context.symbol_table = SymbolTable(new_context.parent.symbol_table)
+    # Calls pass in the caller's context and the call's span, so a function value is never copied to carry them
+    def generate_new_context(self, context, pos_start):
+        new_context = Context(self.name, context, pos_start)
+        new_context.symbol_table = SymbolTable(context.symbol_table, self.layout)
         return new_context
 
-    def check_args(self, arg_names, args):
-        res = RTResult()
-
+    def check_args(self, arg_names, args, context, pos_start, pos_end):
         if len(args) > len(arg_names):
-            return res.failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 f"{len(args) - len(arg_names)} too many args passed into {self}",
-                self.context
+                context
             ))
 
         if len(args) < len(arg_names):
-            return res.failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 f"{len(arg_names) - len(args)} too few args passed into {self}",
-                self.context
+                context
             ))
 
-        return res.success(None)
-
     def populate_args(self, arg_names, args, exec_ctx):
         for i in range(len(args)):
-            arg_name = arg_names[i]
-            arg_value = args[i]
-            arg_value.set_context(exec_ctx)
-            exec_ctx.symbol_table.set(arg_name, arg_value)
-
-    def check_and_populate_args(self, arg_names, args, exec_ctx):
-        res = RTResult()
-        res.register(self.check_args(arg_names, args))
-        if res.should_return(): return res
-        self.populate_args(arg_names, args, exec_ctx)
-        return res.success(None)
+            exec_ctx.symbol_table.set(arg_names[i], args[i])
 
 
 class Function(BaseFunction):
-    def __init__(self, name, body_node, arg_names, should_auto_return):
+    __slots__ = ('body_node', 'arg_names', 'should_auto_return')
+
+    def __init__(self, name, body_node, arg_names, should_auto_return, layout=None):
         super().__init__(name)
         self.body_node = body_node
         self.arg_names = arg_names
         self.should_auto_return = should_auto_return
+        self.layout = layout
 
-    def execute(self, args):
-        res = RTResult()
+    def execute(self, args, context, pos_start, pos_end):
         interpreter = Interpreter()
-        exec_ctx = self.generate_new_context()
+        self.check_args(self.arg_names, args, context, pos_start, pos_end)
+        exec_ctx = self.generate_new_context(context, pos_start)
+        self.populate_args(self.arg_names, args, exec_ctx)
 
-        res.register(self.check_and_populate_args(self.arg_names, args, exec_ctx))
-        if res.should_return(): return res
-
-        value = res.register(interpreter.visit(self.body_node, exec_ctx))
-        if res.should_return() and res.func_return_value == None: return res
+        try:
+            value = interpreter.visit(self.body_node, exec_ctx)
+        except ReturnSignal as signal:
+            return signal.value
 
-        ret_value = (value if self.should_auto_return else None) or res.func_return_value or Number.null
-        return res.success(ret_value)
+        return (value if self.should_auto_return else None) or Number.null
 
     def copy(self):
-        copy = Function(self.name, self.body_node, self.arg_names, self.should_auto_return)
+        copy = Function(self.name, self.body_node, self.arg_names, self.should_auto_return, self.layout)
         copy.set_context(self.context)
         copy.set_pos(self.pos_start, self.pos_end)
         return copy
@@ -418,22 +403,19 @@ class Function(BaseFunction):
 
 
 class BuiltInFunction(BaseFunction):
+    __slots__ = ()
+
     def __init__(self, name):
         super().__init__(name)
 
-    def execute(self, args):
-        res = RTResult()
-        exec_ctx = self.generate_new_context()
-
+    def execute(self, args, context, pos_start, pos_end):
         method_name = f'execute_{self.name}'
         method = getattr(self, method_name, self.no_visit_method)
 
-        res.register(self.check_and_populate_args(method.arg_names, args, exec_ctx))
-        if res.should_return(): return res
-
-        return_value = res.register(method(exec_ctx))
-        if res.should_return(): return res
-        return res.success(return_value)
+        self.check_args(method.arg_names, args, context, pos_start, pos_end)
+        exec_ctx = self.generate_new_context(context, pos_start)
+        self.populate_args(method.arg_names, args, exec_ctx)
+        return method(exec_ctx, pos_start, pos_end)
 
     def no_visit_method(self, node, context):
         raise Exception(f'No execute_{self.name} method defined')
@@ -449,24 +431,24 @@ class BuiltInFunction(BaseFunction):
 
     #####################################
 
-    def execute_print(self, exec_ctx):
+    def execute_print(self, exec_ctx, pos_start, pos_end):
         print(str(exec_ctx.symbol_table.get('value')))
-        return RTResult().success(Number.null)
+        return Number.null
 
     execute_print.arg_names = ['value']
 
-    def execute_print_ret(self, exec_ctx):
-        return RTResult().success(String(str(exec_ctx.symbol_table.get('value'))))
+    def execute_print_ret(self, exec_ctx, pos_start, pos_end):
+        return String(str(exec_ctx.symbol_table.get('value')))
 
     execute_print_ret.arg_names = ['value']
 
-    def execute_input(self, exec_ctx):
+    def execute_input(self, exec_ctx, pos_start, pos_end):
         text = input()
-        return RTResult().success(String(text))
+        return String(text)
 
     execute_input.arg_names = []
 
-    def execute_input_int(self, exec_ctx):
+    def execute_input_int(self, exec_ctx, pos_start, pos_end):
         while True:
             text = input()
             try:
@@ -474,70 +456,70 @@ class BuiltInFunction(BaseFunction):
                 break
             except ValueError:
                 print(f"'{text}' must be an integer. Try again!")
-        return RTResult().success(Number(number))
+        return make_number(number)
 
     execute_input_int.arg_names = []
 
-    def execute_clear(self, exec_ctx):
+    def execute_clear(self, exec_ctx, pos_start, pos_end):
         os.system('cls' if os.name == 'nt' else 'cls')
-        return RTResult().success(Number.null)
+        return Number.null
 
     execute_clear.arg_names = []
 
-    def execute_is_number(self, exec_ctx):
+    def execute_is_number(self, exec_ctx, pos_start, pos_end):
         is_number = isinstance(exec_ctx.symbol_table.get("value"), Number)
-        return RTResult().success(Number.true if is_number else Number.false)
+        return Number.true if is_number else Number.false
 
     execute_is_number.arg_names = ["value"]
 
-    def execute_is_string(self, exec_ctx):
+    def execute_is_string(self, exec_ctx, pos_start, pos_end):
         is_number = isinstance(exec_ctx.symbol_table.get("value"), String)
-        return RTResult().success(Number.true if is_number else Number.false)
+        return Number.true if is_number else Number.false
 
     execute_is_string.arg_names = ["value"]
 
-    def execute_is_list(self, exec_ctx):
+    def execute_is_list(self, exec_ctx, pos_start, pos_end):
         is_number = isinstance(exec_ctx.symbol_table.get("value"), List)
-        return RTResult().success(Number.true if is_number else Number.false)
+        return Number.true if is_number else Number.false
 
     execute_is_list.arg_names = ["value"]
 
-    def execute_is_function(self, exec_ctx):
+    def execute_is_function(self, exec_ctx, pos_start, pos_end):
         is_number = isinstance(exec_ctx.symbol_table.get("value"), BaseFunction)
-        return RTResult().success(Number.true if is_number else Number.false)
+        return Number.true if is_number else Number.false
 
     execute_is_function.arg_names = ["value"]
 
-    def execute_append(self, exec_ctx):
+    def execute_append(self, exec_ctx, pos_start, pos_end):
         list_ = exec_ctx.symbol_table.get("list")
         value = exec_ctx.symbol_table.get("value")
 
         if not isinstance(list_, List):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "First argument must be list",
                 exec_ctx
             ))
 
         list_.elements.append(value)
-        return RTResult().success(Number.null)
+        return Number.null
 
     execute_append.arg_names = ["list", "value"]
 
-    def execute_pop(self, exec_ctx):
+    def execute_pop(self, exec_ctx, pos_start, pos_end):
         list_ = exec_ctx.symbol_table.get("list")
         index = exec_ctx.symbol_table.get("index")
 
         if not isinstance(list_, List):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "First argument must be list",
                 exec_ctx
             ))
 
         if not isinstance(index, Number):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "Second argument must be number",
                 exec_ctx
             ))
@@ -545,58 +527,68 @@ class BuiltInFunction(BaseFunction):
         try:
             element = list_.elements.pop(index.value)
         except:
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 'Element at this index could not be removed from list because index is out of bounds',
                 exec_ctx
             ))
-        return RTResult().success(element)
+        return element
 
     execute_pop.arg_names = ["list", "index"]
 
-    def execute_extend(self, exec_ctx):
+    def execute_extend(self, exec_ctx, pos_start, pos_end):
         listA = exec_ctx.symbol_table.get("listA")
         listB = exec_ctx.symbol_table.get("listB")
 
         if not isinstance(listA, List):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "First argument must be list",
                 exec_ctx
             ))
 
         if not isinstance(listB, List):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "Second argument must be list",
                 exec_ctx
             ))
 
         listA.elements.extend(listB.elements)
-        return RTResult().success(Number.null)
+        return Number.null
 
     execute_extend.arg_names = ["listA", "listB"]
 
-    def execute_len(self, exec_ctx):
+    def execute_len(self, exec_ctx, pos_start, pos_end):
         list_ = exec_ctx.symbol_table.get("list")
 
         if not isinstance(list_, List):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "Argument must be list",
                 exec_ctx
             ))
 
-        return RTResult().success(Number(len(list_.elements)))
+        return make_number(len(list_.elements))
 
     execute_len.arg_names = ["list"]
 
-    def execute_run(self, exec_ctx):
+    def execute_run(self, exec_ctx, pos_start, pos_end):
+        return self.run_module(exec_ctx, pos_start, pos_end, False)
+
+    execute_run.arg_names = ["fn"]
+
+    def execute_reload(self, exec_ctx, pos_start, pos_end):
+        return self.run_module(exec_ctx, pos_start, pos_end, True)
+
+    execute_reload.arg_names = ["fn"]
+
+    def run_module(self, exec_ctx, pos_start, pos_end, reload):
         fn = exec_ctx.symbol_table.get("fn")
 
         if not isinstance(fn, String):
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 "Second argument must be string",
                 exec_ctx
             ))
@@ -604,28 +596,26 @@ class BuiltInFunction(BaseFunction):
         fn = fn.value
 
         try:
-            with open(fn, "r") as f:
-                script = f.read()
+            node, error = load_module(fn, reload)
         except Exception as e:
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 f"Failed to load script \"{fn}\"\n" + str(e),
                 exec_ctx
             ))
 
-        _, error = run(fn, script)
+        if not error:
+            _, error = run_ast(node, 'tree')
 
         if error:
-            return RTResult().failure(RTError(
-                self.pos_start, self.pos_end,
+            raise RTErrorSignal(RTError(
+                pos_start, pos_end,
                 f"Failed to finish executing script \"{fn}\"\n" +
                 error.as_string(),
                 exec_ctx
             ))
 
-        return RTResult().success(Number.null)
-
-    execute_run.arg_names = ["fn"]
+        return Number.null
 
 
 BuiltInFunction.print = BuiltInFunction('print')
@@ -641,6 +631,7 @@ BuiltInFunction.append = BuiltInFunction('append')
 BuiltInFunction.pop = BuiltInFunction('pop')
 BuiltInFunction.extend = BuiltInFunction('extend')
 BuiltInFunction.run = BuiltInFunction('run')
+BuiltInFunction.reload = BuiltInFunction('reload')
 BuiltInFunction.len = BuiltInFunction('len')
 
 
@@ -653,21 +644,71 @@ class Context:
 
 
 class SymbolTable:
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, layout=None):
         self.symbols = {}
         self.parent = parent
+        # Function frames keep their resolved locals in a fixed-size list, indexed through layout
+        self.layout = layout
+        self.slots = [None] * len(layout) if layout else None
 
     def get(self, name):
-        value = self.symbols.get(name, None)
-        if value == None and self.parent:
-            return self.parent.get(name)
-        return value
+        # Up the parents in a loop, since a chain of calls can be deeper than Python's recursion limit
+        table = self
+        while table:
+            value = None
+            if table.layout and name in table.layout:
+                value = table.slots[table.layout[name]]
+            if value == None:
+                value = table.symbols.get(name, None)
+            if value != None:
+                return value
+            table = table.parent
+        return None
 
     def set(self, name, value):
-        self.symbols[name] = value
+        if self.layout and name in self.layout:
+            self.slots[self.layout[name]] = value
+        else:
+            self.symbols[name] = value
 
     def remove(self, name):
-        del self.symbols[name]
+        if self.layout and name in self.layout:
+            self.slots[self.layout[name]] = None
+        else:
+            del self.symbols[name]
+
+
+# Value method behind each binary operator, keyed by token type or by keyword
+BINARY_OPERATIONS = {
+    TT_PLUS: 'added_to',
+    TT_MINUS: 'subbed_by',
+    TT_MUL: 'multed_by',
+    TT_DIV: 'dived_by',
+    TT_POW: 'powed_by',
+    TT_EE: 'get_comparison_eq',
+    TT_NE: 'get_comparison_ne',
+    TT_LT: 'get_comparison_lt',
+    TT_GT: 'get_comparison_gt',
+    TT_LTE: 'get_comparison_lte',
+    TT_GTE: 'get_comparison_gte',
+    'AND': 'anded_by',
+    '&&': 'anded_by',
+    'OR': 'ored_by',
+    '||': 'ored_by'
+}
+
+
+def operation_name(op_tok):
+    return BINARY_OPERATIONS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)
+
+
+def operation_error(method_name, left, right, span, context):
+    # Values keep no positions while the program runs; rebuild the error from positioned copies of the operands
+    left_start, left_end, right_start, right_end = span
+    left = left.copy().set_pos(left_start, left_end).set_context(context)
+    right = right.copy().set_pos(right_start, right_end).set_context(context)
+    _, error = getattr(left, method_name)(right)
+    return error
 
 
 # Interpreter class
@@ -682,245 +723,254 @@ class Interpreter:
 
     ###################################
 
+    # Values carry no positions while the program runs; an error rebuilds them from the nodes involved
     def visit_NumberNode(self, node, context):
-        return RTResult().success(
-            Number(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        return make_number(node.tok.value)
 
     def visit_StringNode(self, node, context):
-        return RTResult().success(
-            String(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        return String(node.tok.value)
 
     def visit_ListNode(self, node, context):
-        res = RTResult()
         elements = []
 
         for element_node in node.element_nodes:
-            elements.append(res.register(self.visit(element_node, context)))
-            if res.should_return(): return res
+            elements.append(self.visit(element_node, context))
 
-        return res.success(
-            List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        return List(elements)
 
     def visit_VarAccessNode(self, node, context):
-        res = RTResult()
         var_name = node.var_name_tok.value
-        value = context.symbol_table.get(var_name)
+
+        if node.depth == 0:
+            value = context.symbol_table.slots[node.slot]
+            if value is None and context.symbol_table.parent:
+                value = context.symbol_table.parent.get(var_name)
+        elif node.depth == GLOBAL_DEPTH and var_name not in function_names:
+            value = global_symbol_table.symbols.get(var_name)
+        else:
+            value = context.symbol_table.get(var_name)
 
         if not value:
-            return res.failure(RTError(
+            raise RTErrorSignal(RTError(
                 node.pos_start, node.pos_end,
                 f"'{var_name}' is not defined",
                 context
             ))
 
-        value = value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
-        return res.success(value)
+        return value
 
     def visit_VarAssignNode(self, node, context):
-        res = RTResult()
         var_name = node.var_name_tok.value
-        value = res.register(self.visit(node.value_node, context))
-        if res.should_return(): return res
+        value = self.visit(node.value_node, context)
 
-        context.symbol_table.set(var_name, value)
-        return res.success(value)
+        if node.depth == 0:
+            context.symbol_table.slots[node.slot] = value
+        else:
+            context.symbol_table.set(var_name, value)
+        return value
 
+    # A chain like a + b + c + ... nests down its left operands. They are gone through in a loop, so a
+    # generated chain of any length runs without reaching Python's recursion limit
     def visit_BinOpNode(self, node, context):
-        res = RTResult()
-        left = res.register(self.visit(node.left_node, context))
-        if res.should_return(): return res
-        right = res.register(self.visit(node.right_node, context))
-        if res.should_return(): return res
-
-        if node.op_tok.type == TT_PLUS:
-            result, error = left.added_to(right)
-        elif node.op_tok.type == TT_MINUS:
-            result, error = left.subbed_by(right)
-        elif node.op_tok.type == TT_MUL:
-            result, error = left.multed_by(right)
-        elif node.op_tok.type == TT_DIV:
-            result, error = left.dived_by(right)
-        elif node.op_tok.type == TT_POW:
-            result, error = left.powed_by(right)
-        elif node.op_tok.type == TT_EE:
-            result, error = left.get_comparison_eq(right)
-        elif node.op_tok.type == TT_NE:
-            result, error = left.get_comparison_ne(right)
-        elif node.op_tok.type == TT_LT:
-            result, error = left.get_comparison_lt(right)
-        elif node.op_tok.type == TT_GT:
-            result, error = left.get_comparison_gt(right)
-        elif node.op_tok.type == TT_LTE:
-            result, error = left.get_comparison_lte(right)
-        elif node.op_tok.type == TT_GTE:
-            result, error = left.get_comparison_gte(right)
-        elif node.op_tok.matches(TT_KEYWORD, 'AND'):
-            result, error = left.anded_by(right)
-        elif node.op_tok.matches(TT_KEYWORD, 'OR'):
-            result, error = left.ored_by(right)
-
-        if error:
-            return res.failure(error)
-        else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+        chain = [node]
+        while type(node.left_node) is BinOpNode:
+            node = node.left_node
+            chain.append(node)
+
+        left = self.visit(node.left_node, context)
+        while chain:
+            node = chain.pop()
+            right = self.visit(node.right_node, context)
+
+            if node.op_tok.type == TT_PLUS:
+                result, error = left.added_to(right)
+            elif node.op_tok.type == TT_MINUS:
+                result, error = left.subbed_by(right)
+            elif node.op_tok.type == TT_MUL:
+                result, error = left.multed_by(right)
+            elif node.op_tok.type == TT_DIV:
+                result, error = left.dived_by(right)
+            elif node.op_tok.type == TT_POW:
+                result, error = left.powed_by(right)
+            elif node.op_tok.type == TT_EE:
+                result, error = left.get_comparison_eq(right)
+            elif node.op_tok.type == TT_NE:
+                result, error = left.get_comparison_ne(right)
+            elif node.op_tok.type == TT_LT:
+                result, error = left.get_comparison_lt(right)
+            elif node.op_tok.type == TT_GT:
+                result, error = left.get_comparison_gt(right)
+            elif node.op_tok.type == TT_LTE:
+                result, error = left.get_comparison_lte(right)
+            elif node.op_tok.type == TT_GTE:
+                result, error = left.get_comparison_gte(right)
+            elif node.op_tok.matches(TT_KEYWORD, 'AND'):
+                result, error = left.anded_by(right)
+            elif node.op_tok.matches(TT_KEYWORD, 'OR'):
+                result, error = left.ored_by(right)
+
+            if error:
+                span = (node.left_node.pos_start, node.left_node.pos_end,
+                        node.right_node.pos_start, node.right_node.pos_end)
+                raise RTErrorSignal(operation_error(operation_name(node.op_tok), left, right, span, context))
+            left = result
+        return left
 
     def visit_UnaryOpNode(self, node, context):
-        res = RTResult()
-        number = res.register(self.visit(node.node, context))
-        if res.should_return(): return res
+        number = self.visit(node.node, context)
 
         error = None
 
         if node.op_tok.type == TT_MINUS:
-            number, error = NUmber(-number.value)
+            number, error = number.multed_by(make_number(-1))
+            if error:
+                # Pointing at the operand, since values carry no positions while the program runs
+                raise RTErrorSignal(RTError(node.node.pos_start, node.node.pos_end, error.details, context))
         elif node.op_tok.matches(TT_KEYWORD, 'NOT'):
             number, error = number.notted()
 
         if error:
-            return res.failure(error)
-        else:
-            return res.success(number.set_pos(node.pos_start, node.pos_end))
+            raise RTErrorSignal(error)
+        return number
 
     def visit_IfNode(self, node, context):
-        res = RTResult()
-
         for condition, expr, should_return_null in node.cases:
-            condition_value = res.register(self.visit(condition, context))
-            if res.should_return(): return res
+            condition_value = self.visit(condition, context)
 
             if condition_value.is_true():
-                expr_value = res.register(self.visit(expr, context))
-                if res.should_return(): return res
-                return res.success(Number.null if should_return_null else expr_value)
+                expr_value = self.visit(expr, context)
+                return Number.null if should_return_null else expr_value
 
         if node.else_case:
             expr, should_return_null = node.else_case
-            expr_value = res.register(self.visit(expr, context))
-            if res.should_return(): return res
-            return res.success(Number.null if should_return_null else expr_value)
+            expr_value = self.visit(expr, context)
+            return Number.null if should_return_null else expr_value
 
-        return res.success(Number.null)
+        return Number.null
 
     def visit_ForNode(self, node, context):
-        res = RTResult()
-        elements = []
-
-        start_value = res.register(self.visit(node.start_value_node, context))
-        if res.should_return(): return res
+        for hoisted_node in node.hoisted_nodes:
+            self.visit(hoisted_node, context)
 
-        end_value = res.register(self.visit(node.end_value_node, context))
-        if res.should_return(): return res
+        start_value = self.visit(node.start_value_node, context)
+        end_value = self.visit(node.end_value_node, context)
 
         if node.step_value_node:
-            step_value = res.register(self.visit(node.step_value_node, context))
-            if res.should_return(): return res
+            step_value = self.visit(node.step_value_node, context)
         else:
-            step_value = Number(1)
+            step_value = make_number(1)
 
-        i = start_value.value
+        start, end, step = start_value.value, end_value.value, step_value.value
 
-        if step_value.value >= 0:
-            condition = lambda: i < end_value.value
+        # Integer bounds run as a native range; anything else is stepped by hand
+        if type(start) is int and type(end) is int and type(step) is int and step != 0:
+            counter = range(start, end, step)
         else:
-            condition = lambda: i > end_value.value
+            counter = self.count(start, end, step)
 
-        while condition():
-            context.symbol_table.set(node.var_name_tok.value, Number(i))
-            i += step_value.value
+        symbol_table = context.symbol_table
+        slots = symbol_table.slots if node.depth == 0 else None
+        slot, var_name = node.slot, node.var_name_tok.value
+        body_node = node.body_node
+        elements = None if node.should_return_null else []
 
-            value = res.register(self.visit(node.body_node, context))
-            if res.should_return() and res.loop_should_continue == False and res.loop_should_break == False: return res
+        for i in counter:
+            if slots is not None:
+                slots[slot] = make_number(i)
+            else:
+                symbol_table.set(var_name, make_number(i))
 
-            if res.loop_should_continue:
+            try:
+                if elements is None:
+                    self.visit_discarded(body_node, context)
+                else:
+                    elements.append(self.visit(body_node, context))
+            except ContinueSignal:
                 continue
-
-            if res.loop_should_break:
+            except BreakSignal:
                 break
 
-            elements.append(value)
+        return Number.null if elements is None else List(elements)
 
-        return res.success(
-            Number.null if node.should_return_null else
-            List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+    def count(self, i, end, step):
+        if step >= 0:
+            while i < end:
+                yield i
+                i += step
+        else:
+            while i > end:
+                yield i
+                i += step
+
+    def visit_discarded(self, node, context):
+        # Statement blocks whose value is thrown away never build their list
+        if type(node) is ListNode:
+            for element_node in node.element_nodes:
+                self.visit_discarded(element_node, context)
+        else:
+            self.visit(node, context)
 
     def visit_WhileNode(self, node, context):
-        res = RTResult()
-        elements = []
+        body_node = node.body_node
+        elements = None if node.should_return_null else []
+
+        for hoisted_node in node.hoisted_nodes:
+            self.visit(hoisted_node, context)
 
         while True:
-            condition = res.register(self.visit(node.condition_node, context))
-            if res.should_return(): return res
+            condition = self.visit(node.condition_node, context)
 
             if not condition.is_true():
                 break
 
-            value = res.register(self.visit(node.body_node, context))
-            if res.should_return() and res.loop_should_continue == False and res.loop_should_break == False: return res
-
-            if res.loop_should_continue:
+            try:
+                if elements is None:
+                    self.visit_discarded(body_node, context)
+                else:
+                    elements.append(self.visit(body_node, context))
+            except ContinueSignal:
                 continue
-
-            if res.loop_should_break:
+            except BreakSignal:
                 break
 
-            elements.append(value)
-
-        return res.success(
-            Number.null if node.should_return_null else
-            List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        return Number.null if elements is None else List(elements)
 
     def visit_FuncDefNode(self, node, context):
-        res = RTResult()
-
         func_name = node.var_name_tok.value if node.var_name_tok else None
         body_node = node.body_node
         arg_names = [arg_name.value for arg_name in node.arg_name_toks]
-        func_value = Function(func_name, body_node, arg_names, node.should_auto_return).set_context(context).set_pos(
-            node.pos_start, node.pos_end)
+        func_value = Function(func_name, body_node, arg_names, node.should_auto_return, node.layout)
 
-        if node.var_name_tok:
+        if node.depth == 0:
+            context.symbol_table.slots[node.slot] = func_value
+        elif node.var_name_tok:
             context.symbol_table.set(func_name, func_value)
 
-        return res.success(func_value)
+        return func_value
 
     def visit_CallNode(self, node, context):
-        res = RTResult()
         args = []
 
-        value_to_call = res.register(self.visit(node.node_to_call, context))
-        if res.should_return(): return res
-        value_to_call = value_to_call.copy().set_pos(node.pos_start, node.pos_end)
+        value_to_call = self.visit(node.node_to_call, context)
 
         for arg_node in node.arg_nodes:
-            args.append(res.register(self.visit(arg_node, context)))
-            if res.should_return(): return res
+            args.append(self.visit(arg_node, context))
 
-        return_value = res.register(value_to_call.execute(args))
-        if res.should_return(): return res
-        return_value = return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
-        return res.success(return_value)
+        return value_to_call.execute(args, context, node.pos_start, node.pos_end)
 
     def visit_ReturnNode(self, node, context):
-        res = RTResult()
-
         if node.node_to_return:
-            value = res.register(self.visit(node.node_to_return, context))
-            if res.should_return(): return res
+            value = self.visit(node.node_to_return, context)
         else:
             value = Number.null
 
-        return res.success_return(value)
+        raise ReturnSignal(value)
 
     def visit_ContinueNode(self, node, context):
-        return RTResult().success_continue()
+        raise ContinueSignal()
 
     def visit_BreakNode(self, node, context):
-        return RTResult().success_break()
+        raise BreakSignal()
 
 
 # Run method
@@ -943,10 +993,21 @@ global_symbol_table.set('add', BuiltInFunction.append)
 global_symbol_table.set('remove', BuiltInFunction.pop)
 global_symbol_table.set('expand', BuiltInFunction.extend)
 global_symbol_table.set('run', BuiltInFunction.run)
+global_symbol_table.set('reload', BuiltInFunction.reload)
 global_symbol_table.set('len', BuiltInFunction.len)
 
 
-def run(file_name, text):
+def run(file_name, text, engine='tree', cache=False):
+    node, error = parse_program(file_name, text, cache)
+    if error: return None, error
+    return run_ast(node, engine)
+
+
+def parse_program(file_name, text, cache=False):
+    # With cache, file_name is the path text was read from, and a parse of the same text is reused from disk
+    node = load_program(file_name, text) if cache else None
+    if node is not None: return node, None
+
     lexer = Lexer(file_name, text)
     tokens, error = lexer.make_tokens()
     if error:
@@ -955,17 +1016,140 @@ def run(file_name, text):
     parser = Parser(tokens)
     ast = parser.parse()
     if ast.error: return None, ast.error
+    if cache: save_program(file_name, text, ast.node)
+    return ast.node, None
+
+
+def check_program(file_name, text):
+    # Every syntax error in text, in one pass, without running anything. A lexer error still stops at the first
+    tokens, error = Lexer(file_name, text).make_tokens()
+    if error:
+        return [error]
+
+    parser = Parser(tokens)
+    parser.parse(recover=True)
+    return parser.errors
+
+
+# Programs loaded by the run builtin, by real path: ((mtime, size), node). A file that has not changed since
+# it was loaded is run again straight from its tree; reload always reads it again
+loaded_modules = {}
+
+
+def load_module(file_name, reload=False):
+    stat = os.stat(file_name)
+    path = os.path.realpath(file_name)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    module = loaded_modules.get(path)
+    if module and module[0] == key and not reload:
+        return module[1], None
+
+    with open(file_name, 'r') as f:
+        text = f.read()
+
+    node, error = parse_program(file_name, text, cache=True)
+    if error:
+        loaded_modules.pop(path, None)
+        return None, error
+
+    loaded_modules[path] = (key, node)
+    return node, None
+
+
+def run_stream(file_name, source, engine='tree'):
+    # Tokens are read from the file object as the parser asks for them, instead of lexing the whole text first
+    lexer = StreamLexer(file_name, source)
+    tokens = lexer.generate_tokens()
+    ast = Parser(TokenStream(tokens)).parse()
+
+    if ast.error:
+        # run() lexes everything before parsing, so a lexer error further on still wins over a syntax error
+        for _ in tokens: pass
+    if lexer.error: return None, lexer.error
+    if ast.error: return None, ast.error
+    return run_ast(ast.node, engine)
+
+
+def run_ast(node, engine):
+    # Imported here because the optimizer works out constants with the values defined in this module
+    from Optimizer import Optimizer
+
+    node = Optimizer().optimize_program(node)
+    Resolver().resolve(node)
 
-    interpreter = Interpreter()
     context = Context('<program.sdw>')
     context.symbol_table = global_symbol_table
-    result = interpreter.visit(ast.node, context)
 
-    return result.value, result.error
+    try:
+        return execute_program(node, context, engine), None
+    except RTErrorSignal as signal:
+        return None, signal.error
+    except (ReturnSignal, BreakSignal, ContinueSignal):
+        # Leaving the top level this way ends the program without a result
+        return None, None
+
+
+def execute_program(node, context, engine):
+    if engine == 'vm':
+        # Imported here because the compiler builds on the values defined in this module
+        from Compiler import Compiler, CompileError, VM
+
+        try:
+            chunk = Compiler().compile_program(node)
+        except CompileError:
+            chunk = None
+
+        if chunk:
+            return VM().run(chunk, context)
+
+    elif engine == 'closure':
+        from ClosureCompiler import ClosureCompiler
+
+        return ClosureCompiler().run(node, context)
+
+    elif engine == 'python':
+        from Transpiler import Transpiler, TranspileError
+
+        try:
+            program = Transpiler().transpile(node)
+        except TranspileError:
+            program = None
+
+        if program:
+            return program.run(context)
+
+    interpreter = Interpreter()
+    return interpreter.visit(node, context)
 
 
 # Driver Code
 if __name__ == '__main__':
+    # Let the execution engines import this module instead of loading a second copy of it
+    sys.modules.setdefault('interpreter', sys.modules[__name__])
+
+    # --check reports the syntax errors of every file given, without running them
+    if len(sys.argv) > 1 and sys.argv[1] == '--check':
+        error_count = 0
+        for path in sys.argv[2:]:
+            with open(path, 'r') as f:
+                errors = check_program(path, f.read())
+            for error in errors:
+                print(error.as_string())
+            error_count += len(errors)
+        sys.exit(1 if error_count else 0)
+
+    # A file name runs that program, reusing its cached parse; - streams a program from standard input
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+        if path == '-':
+            result, error = run_stream(path, sys.stdin)
+        else:
+            with open(path, 'r') as f:
+                result, error = run(path, f.read(), cache=True)
+        if error: print(error.as_string())
+        sys.exit(1 if error else 0)
+
     while True:
         text = input('Shadow > ')
         if text.strip() == '':
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import interpreter
+from Cache import CACHE_DIR, TreeEncoder, cache_path, load_program
+from interpreter import parse_program, run
+from test_engines import CORPUS, ENGINES, outcome, reset_globals, run_engine
+
+
+def encode(node):
+    return TreeEncoder().encode(node)
+
+
+class FileTestCase(unittest.TestCase):
+    # Each test writes its program into a directory of its own
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'program.sdw')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text, mtime_ns):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+
+class CacheTests(FileTestCase):
+    def test_cached_tree_matches_parse(self):
+        text = '\n'.join(text for text in CORPUS.values() if parse_program('<test>', text)[1] is None)
+        self.write(text, 10 ** 18)
+
+        node, error = parse_program(self.path, text, cache=True)
+        self.assertIsNone(error)
+        self.assertTrue(os.path.exists(cache_path(self.path)))
+
+        cached = load_program(self.path, text)
+        self.assertIsNotNone(cached)
+        self.assertEqual(encode(cached), encode(node))
+
+    def test_cached_programs_run_the_same(self):
+        for name, text in CORPUS.items():
+            with self.subTest(program=name):
+                self.write(text, 10 ** 18)
+                expected = run_engine('tree', text, self.path)
+
+                # A program that does not parse is never cached
+                _, error = parse_program(self.path, text, cache=True)
+                self.assertEqual(load_program(self.path, text) is None, error is not None)
+                for engine in ENGINES:
+                    reset_globals()
+                    result, error = run(self.path, text, engine=engine, cache=True)
+                    self.assertEqual(outcome(result, error, '')[:2], expected[:2])
+
+    def test_changed_file_is_parsed_again(self):
+        self.write('var a = 1\na', 10 ** 18)
+        reset_globals()
+        result, _ = run(self.path, 'var a = 1\na', cache=True)
+        self.assertEqual(repr(result), '[1, 1]')
+
+        # Same size, new text and a later modification time
+        self.write('var a = 2\na', 10 ** 18 + 1)
+        self.assertIsNone(load_program(self.path, 'var a = 2\na'))
+        reset_globals()
+        result, _ = run(self.path, 'var a = 2\na', cache=True)
+        self.assertEqual(repr(result), '[2, 2]')
+        self.assertIsNotNone(load_program(self.path, 'var a = 2\na'))
+
+        # Same modification time and size, but not the text the cache was made from
+        self.assertIsNone(load_program(self.path, 'var a = 3\na'))
+
+    def test_damaged_cache_is_ignored(self):
+        text = 'var a = [1, 2]\nlen(a)'
+        self.write(text, 10 ** 18)
+        parse_program(self.path, text, cache=True)
+        with open(cache_path(self.path), 'r+b') as f:
+            f.seek(-4, os.SEEK_END)
+            f.truncate()
+
+        self.assertIsNone(load_program(self.path, text))
+        reset_globals()
+        result, error = run(self.path, text, cache=True)
+        self.assertIsNone(error)
+        self.assertEqual(repr(result), '[[1, 2], 2]')
+
+    def test_cache_hit_skips_lexing(self):
+        text = 'var a = [1, 2]\nlen(a)'
+        self.write(text, 10 ** 18)
+        parse_program(self.path, text, cache=True)
+        self.assertEqual(os.path.dirname(cache_path(self.path)), os.path.join(self.directory, CACHE_DIR))
+
+        with mock.patch.object(interpreter, 'Lexer', side_effect=AssertionError('lexed a cached program')):
+            reset_globals()
+            result, error = run(self.path, text, cache=True)
+        self.assertIsNone(error)
+        self.assertEqual(repr(result), '[[1, 2], 2]')
+
+
+
+class ModuleCacheTests(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        interpreter.loaded_modules.clear()
+
+    def test_run_builtin_reloads_changed_module(self):
+        self.write('var from_module = 1', 10 ** 18)
+        text = f'run("{self.path}")\nfrom_module'
+        self.assertEqual(run_engine('tree', text)[1], '[0, 1]')
+
+        self.write('var from_module = 22', 10 ** 18 + 1)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(run_engine(engine, text)[1], '[0, 22]')
+
+    def test_unchanged_module_is_not_read_again(self):
+        self.write('var from_module = 1', 10 ** 18)
+        text = f'run("{self.path}")\nfrom_module'
+        self.assertEqual(run_engine('tree', text)[1], '[0, 1]')
+
+        # New text of the same size, with the modification time put back: still the tree loaded first
+        self.write('var from_module = 2', 10 ** 18)
+        self.assertEqual(run_engine('tree', text)[1], '[0, 1]')
+        self.assertEqual(run_engine('tree', f'reload("{self.path}")\nfrom_module')[1], '[0, 2]')
+
+    def test_modules_are_kept_by_real_path(self):
+        self.write('var from_module = 1', 10 ** 18)
+        os.mkdir(os.path.join(self.directory, 'sub'))
+        other_path = os.path.join(self.directory, 'sub', '..', 'program.sdw')
+        run_engine('tree', f'run("{self.path}")\nrun("{other_path}")')
+        self.assertEqual(list(interpreter.loaded_modules), [os.path.realpath(self.path)])
+
+    def test_broken_module_is_forgotten(self):
+        self.write('var from_module = 1', 10 ** 18)
+        run_engine('tree', f'run("{self.path}")')
+
+        self.write('var from_module = ', 10 ** 18 + 1)
+        kind, message, _ = run_engine('tree', f'run("{self.path}")')
+        self.assertEqual(kind, 'error')
+        self.assertIn(f'Failed to finish executing script "{self.path}"', message)
+        self.assertEqual(interpreter.loaded_modules, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import contextlib
+import io
+import unittest
+
+from interpreter import Interpreter, Context, RTErrorSignal, ReturnSignal, BreakSignal, ContinueSignal, \
+    global_symbol_table, parse_program, run
+
+ENGINES = ['tree', 'vm', 'closure', 'python']
+
+# The global symbol table as it is before any program has run
+BUILTINS = dict(global_symbol_table.symbols)
+
+# Programs every engine has to agree on, with the tree walker as it was before the optimizer and the resolver.
+# Each runs on fresh globals, so one program's variables never leak into the next
+CORPUS = {
+    'arithmetic': '1 + 2 * 3 - 4 / 8\n2 ^ 10\n(1 + 2) * -3\n--4\n7 / 2',
+    'comparisons': '1 < 2\n2 <= 1\n3 == 3\n3 != 3\n2 > 1.5\n1 >= 1',
+    'strings': 'var s = "ab" + "cd"\ns * 3\nshow(s)\nshow_ret([s, 1, [2]])',
+    'lists': 'var l = [1, 2]\nvar m = l + 3\nadd(l, 4)\nexpand(l, [5, 6])\nremove(l, 0)\n[l, m, l / 1, len(l)]',
+    'list sharing': 'create push(l) -> add(l, 1)\nvar l = []\npush(l)\npush(l)\nvar alias = l\nadd(alias, 2)\nl',
+    'if expressions': 'var a = 5\nif a < 3 then "small" elif a < 10 then "medium" else "large"\n'
+                      'if a > 10 then 1\nif a then\nvar b = a * 2\nb + 1\nelse\n0\nend',
+    'for loops': 'for i = 0 to 5 then i * i\nfor i = 10 to 0 step -3 then i\nvar t = 0\n'
+                 'for i = 0 to 10 then\nif i == 2 then chaos_warp\nif i == 6 then chaos_control\nvar t = t + i\nend\nt',
+    'while loops': 'var i = 0\nwhile i < 5 then var i = i + 1\nvar i = 0\nvar l = []\n'
+                   'while True == 0 then\nvar i = i + 1\nif i > 3 then chaos_control\nadd(l, i)\nend\nl',
+    'hoisted invariants': 'var k = 3\nvar n = -k\nfor i = 0 to 4 then i + k * 2 + -k + n\n'
+                          'create f(x) -> [for i = 0 to 3 then x * 2 + i]\nf(5)',
+    'functions': 'create add2(a, b) -> a + b\nadd2(1, 2)\nvar anon = create (x) -> x * 10\nanon(4)\n'
+                 'create fact(n)\nif n <= 1 then chaos_blast 1\nchaos_blast n * fact(n - 1)\nend\nfact(10)\n'
+                 'create nothing()\nvar x = 1\nend\nnothing()',
+    'dynamic scope': 'var g = 1\ncreate f(x) -> x + g\ncreate h(g) -> f(1)\n[f(1), h(10)]\n'
+                     'create outer()\nvar inner_name = 7\nchaos_blast reader()\nend\n'
+                     'create reader() -> inner_name\nouter()',
+    'function values': 'create twice(f, x) -> f(f(x))\ncreate inc(x) -> x + 1\ntwice(inc, 1)\n'
+                       'var fs = [inc, twice]\n(fs / 1)(fs / 0, 3)\nis_function(fs / 0)\nis_function(show)\n'
+                       'is_number(1)\nis_string("s")\nis_list([])\nshow_ret(fs)',
+    'tail calls': 'create count(n) -> if n == 0 then done else count(n - 1)\n'
+                  'create start(done) -> count(50)\nstart("finished")',
+    'unary minus': 'var n = 4\n-n\n-(n - 10)\n-2.5\ncreate neg(x) -> -x\nneg(3)\nneg(-3)',
+    'unary minus on a string': 'var s = "xy"\n[-s, s * -1]',
+    'unary minus on a function': 'create f() -> 1\n1 + -f',
+    'unary minus on a list': 'var l = [1]\n1 + -l',
+    'division by zero': '1 / 0',
+    'error in a function': 'create bad(x) -> x / 0\ncreate twice(f, x) -> f(f(x))\ntwice(bad, 1)',
+    'undefined name': 'var a = 1\na + missing',
+    'undefined name read twice': 'var a = 0\ncreate f() -> if a then zz else [a, zz]\nf()',
+    'undefined name in a loop': 'var i = 0\nwhile i < 3 then var i = i + k',
+    'wrong argument count': 'create f(x) -> x\nf(1, 2)',
+    'calling a number': 'var n = 3\nn(1)',
+    'if expression operand': 'var b = 4\nvar n = 1\nb / if [] + n then b != 10 else is_function(b)',
+    'assignment operand': 'var a = 1\n"x" - (var c = a)',
+    'illegal operation': '"a" - 1',
+    'list index out of range': 'var l = [1, 2]\nl / 5',
+    'remove out of range': 'var l = [1, 2]\nremove(l, 5)',
+    'builtin misuse': 'len(1)',
+    'top level return': 'var a = 1\nchaos_blast a\n2',
+    'top level return of a call': 'chaos_blast show(5)\nshow(6)',
+    'top level return of an error': 'var a = 0\nchaos_blast 1 / a',
+    'loop control from a function': 'create stop()\nchaos_control\nend\nvar l = []\nfor i = 0 to 5 then\n'
+                                    'if i == 3 then stop()\nadd(l, i)\nend\nl',
+    'syntax error': 'var a = 1\na +',
+    'illegal character': 'var a = 1 $ 2',
+}
+
+
+def reset_globals():
+    global_symbol_table.symbols.clear()
+    global_symbol_table.symbols.update(BUILTINS)
+
+
+def outcome(result, error, output):
+    # What a program did, in a form the engines can be compared on
+    if error:
+        return 'error', error.as_string(), output
+    return 'result', repr(result), output
+
+
+def run_engine(engine, text, file_name='<test>'):
+    reset_globals()
+    output = io.StringIO()
+
+    with contextlib.redirect_stdout(output):
+        if engine == 'baseline':
+            # The tree walked straight after parsing, without the optimizer or the resolver
+            node, error = parse_program(file_name, text)
+            result = None
+            if not error:
+                context = Context('<program.sdw>')
+                context.symbol_table = global_symbol_table
+                try:
+                    result = Interpreter().visit(node, context)
+                except RTErrorSignal as signal:
+                    error = signal.error
+                except (ReturnSignal, BreakSignal, ContinueSignal):
+                    result = None
+        else:
+            result, error = run(file_name, text, engine=engine)
+
+    return outcome(result, error, output.getvalue())
+
+
+class EngineTests(unittest.TestCase):
+    def assert_engines_agree(self, text):
+        expected = run_engine('baseline', text)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(run_engine(engine, text), expected)
+        return expected
+
+    def test_corpus(self):
+        for name, text in CORPUS.items():
+            with self.subTest(program=name):
+                self.assert_engines_agree(text)
+
+    def test_corpus_errors(self):
+        # The corpus is no use if the error cases do not fail
+        for name in ('unary minus on a function', 'division by zero', 'undefined name read twice'):
+            with self.subTest(program=name):
+                self.assertEqual(run_engine('baseline', CORPUS[name])[0], 'error')
+
+    def test_undefined_name_points_at_second_read(self):
+        kind, message, _ = self.assert_engines_agree(CORPUS['undefined name read twice'])
+        self.assertEqual(kind, 'error')
+        self.assertTrue(message.endswith('create f() -> if a then zz else [a, zz]\n                                    ^^'),
+                        message)
+
+    def test_programs_run_in_turn(self):
+        # Functions and lists made by one engine are used by the next, through the globals they share
+        steps = [
+            'create push(l) -> add(l, 1)\ncreate getg() -> g',
+            'var g = 5\nvar l = []\npush(l)\npush(l)\nadd(l, getg)',
+            'var g = 7\n(l / 2)()',
+            'create bad(x) -> x / 0\ncreate twice(f, x) -> f(f(x))',
+            'twice(bad, 1)',
+            'l',
+        ]
+        expected = None
+        for define_engine in ENGINES:
+            for use_engine in ENGINES:
+                with self.subTest(define=define_engine, use=use_engine):
+                    reset_globals()
+                    outcomes = []
+                    for i, text in enumerate(steps):
+                        result, error = run(f'<step {i}>', text, engine=(define_engine, use_engine)[i % 2])
+                        outcomes.append(outcome(result, error, ''))
+                    if expected is None:
+                        expected = outcomes
+                    self.assertEqual(outcomes, expected)
+
+        self.assertEqual(expected[2][1], '[7, 7]')
+        self.assertEqual(expected[5][1], '[[1, 1, <function getg>]]')
+
+    def test_deep_tail_recursion(self):
+        # Deeper than Python's recursion limit, through a name the recursion reads from its caller
+        reset_globals()
+        text = 'create count(n) -> if n == 0 then done else count(n - 1)\n' \
+               'create start(done) -> count(100000)\nstart("finished")'
+        result, error = run('<test>', text, engine='vm')
+        self.assertIsNone(error)
+        self.assertEqual(repr(result.elements[-1]), '"finished"')
+
+    def test_deep_recursion_error(self):
+        # A tail call that fails deep down still reports the error, not a Python RecursionError
+        reset_globals()
+        text = 'create count(n) -> if n == 0 then missing else count(n - 1)\ncount(100000)'
+        result, error = run('<test>', text, engine='vm')
+        self.assertIsNotNone(error)
+        self.assertIn("'missing' is not defined", error.as_string())
+
+
+if __name__ == '__main__':
+    unittest.main()
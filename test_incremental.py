@@ -0,0 +1,99 @@
+import unittest
+
+from Cache import TreeEncoder
+from Incremental import Document
+from Lexer import Lexer
+from Parser import Parser
+from interpreter import run_ast
+from test_engines import CORPUS, ENGINES, outcome, reset_globals
+
+
+def encode(node):
+    return TreeEncoder().encode(node)
+
+
+class IncrementalTests(unittest.TestCase):
+    def parse(self, text):
+        tokens, error = Lexer('<doc>', text).make_tokens()
+        self.assertIsNone(error)
+        return Parser(tokens).parse()
+
+    def assert_matches_parse(self, document):
+        expected = self.parse(document.text)
+        self.assertEqual(document.result.error is None, expected.error is None)
+        if expected.error:
+            self.assertEqual(document.result.error.as_string(), expected.error.as_string())
+            return
+
+        self.assertEqual(encode(document.result.node), encode(expected.node))
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                reset_globals()
+                edited = run_ast(document.result.node, engine)
+                reset_globals()
+                fresh = run_ast(expected.node, engine)
+                self.assertEqual(outcome(*edited, ''), outcome(*fresh, ''))
+
+    def test_edits(self):
+        document = Document('<doc>', CORPUS['functions'])
+        self.assert_matches_parse(document)
+
+        edits = [
+            # A statement in the middle, text on a line of its own, a whole function body, and the very end
+            ('fact(10)', 'fact(5) + 1'),
+            ('anon(4)', 'anon(4)\nvar extra = [1, 2]\nextra'),
+            ('chaos_blast n * fact(n - 1)', 'chaos_blast n + fact(n - 1)'),
+            ('nothing()', 'nothing()\nadd2(3, 4)'),
+            # Breaking and then mending the syntax
+            ('add2(1, 2)', 'add2(1, 2'),
+            ('add2(1, 2', 'add2(1, 2)'),
+            ('create nothing()', 'create nothing('),
+            ('create nothing(', 'create nothing()'),
+        ]
+        for old, new in edits:
+            with self.subTest(edit=(old, new)):
+                start = document.text.index(old)
+                document.edit(start, start + len(old), new)
+                self.assert_matches_parse(document)
+
+    def test_edit_changes_result(self):
+        document = Document('<doc>', 'var a = 1\nvar b = a + 1\nb')
+        start = document.text.index('1')
+        document.edit(start, start + 1, '41')
+        self.assert_matches_parse(document)
+        reset_globals()
+        result, error = run_ast(document.result.node, 'tree')
+        self.assertEqual(repr(result), '[41, 42, 42]')
+
+    def test_statements_after_an_edit_are_kept(self):
+        document = Document('<doc>', 'var a = 1\nvar b = 2\nvar c = 3')
+        before = list(document.result.node.element_nodes)
+        start = document.text.index('2')
+        document.edit(start, start + 1, '22')
+        self.assert_matches_parse(document)
+        self.assertEqual([node is old for node, old in zip(document.result.node.element_nodes, before)],
+                         [True, False, True])
+
+    def test_run_then_edit(self):
+        # Running a document must leave the statements it keeps as they were parsed, on every engine
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                document = Document('<doc>', CORPUS['hoisted invariants'])
+                reset_globals()
+                run_ast(document.result.node, engine)
+
+                start = document.text.index('f(5)')
+                document.edit(start, start + 4, 'f(6)')
+                self.assert_matches_parse(document)
+
+    def test_errors_point_at_moved_statements(self):
+        document = Document('<doc>', 'var a = 1\nvar l = [1]\nl / 5')
+        document.edit(0, 0, '\n\nvar z = 0\n')
+        self.assert_matches_parse(document)
+        reset_globals()
+        _, error = run_ast(document.result.node, 'tree')
+        self.assertIn('File <doc>, line 6', error.as_string())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import contextlib
+import io
+import os
+import unittest
+
+from Lexer import Lexer, StreamLexer, TokenBuffer, TokenStream, TOKEN_TYPES
+from interpreter import run_stream
+from test_engines import CORPUS, outcome, reset_globals, run_engine
+
+# Tokens as (type, value, start, end), as the lexer read them one character at a time before it scanned with
+# a single pattern
+TOKENS = {
+    'var a1 = 12 + 3.5 * 2. -> x ^ (y)': [
+        ('KEYWORD', 'var', 0, 3), ('IDENTIFIER', 'a1', 4, 6), ('EQ', None, 7, 8), ('INT', 12, 9, 11),
+        ('PLUS', None, 12, 13), ('FLOAT', 3.5, 14, 17), ('MUL', None, 18, 19), ('FLOAT', 2.0, 20, 22),
+        ('ARROW', None, 23, 25), ('IDENTIFIER', 'x', 26, 27), ('POW', None, 28, 29), ('LPAREN', None, 30, 31),
+        ('IDENTIFIER', 'y', 31, 32), ('RPAREN', None, 32, 33), ('EOF', None, 33, 34),
+    ],
+    # The newline ending a comment is part of it, and a string left open runs to the end of the text
+    '[1, 2]; a == b != c <= d >= e < f > g # note\n"s" - "open': [
+        ('LSQUARE', None, 0, 1), ('INT', 1, 1, 2), ('COMMA', None, 2, 3), ('INT', 2, 4, 5), ('RSQUARE', None, 5, 6),
+        ('NEWLINE', None, 6, 7), ('IDENTIFIER', 'a', 8, 9), ('EE', None, 10, 12), ('IDENTIFIER', 'b', 13, 14),
+        ('NE', None, 15, 17), ('IDENTIFIER', 'c', 18, 19), ('LTE', None, 20, 22), ('IDENTIFIER', 'd', 23, 24),
+        ('GTE', None, 25, 27), ('IDENTIFIER', 'e', 28, 29), ('LT', None, 30, 31), ('IDENTIFIER', 'f', 32, 33),
+        ('GT', None, 34, 35), ('IDENTIFIER', 'g', 36, 37), ('STRING', 's', 45, 48), ('MINUS', None, 49, 50),
+        ('STRING', 'open', 51, 57), ('EOF', None, 57, 58),
+    ],
+    # A comment running to the end of the text
+    'x # last': [('IDENTIFIER', 'x', 0, 1), ('EOF', None, 8, 9)],
+}
+
+ERRORS = {
+    'var a = 1 $ 2': "Illegal Character: '$'\nFile <test>, line 1\n\nvar a = 1 $ 2\n          ^",
+    'a\n !b': "Expected Character: '=' (after '!')\nFile <test>, line 2\n\n\n !b\n ^^",
+}
+
+
+def lex(text):
+    tokens, error = Lexer('<test>', text).make_tokens()
+    assert error is None, error.as_string()
+    return [tokens[i] for i in range(len(tokens))]
+
+
+class LexerTests(unittest.TestCase):
+    def test_tokens(self):
+        for text, expected in TOKENS.items():
+            with self.subTest(text=text):
+                tokens = [(tok.type, tok.value, tok.pos_start.idx, tok.pos_end.idx) for tok in lex(text)]
+                self.assertEqual(tokens, expected)
+
+    def test_lines_and_columns(self):
+        tokens = lex('if a then\n  "two\nlines" + b\nend')
+        self.assertEqual([(tok.pos_start.ln, tok.pos_start.col, tok.pos_end.ln, tok.pos_end.col) for tok in tokens], [
+            (0, 0, 0, 2), (0, 3, 0, 4), (0, 5, 0, 9), (0, 9, 0, 10), (1, 2, 2, 6), (2, 7, 2, 8), (2, 9, 2, 10),
+            (2, 10, 2, 11), (3, 0, 3, 3), (3, 3, 3, 4),
+        ])
+
+    def test_errors(self):
+        for text, message in ERRORS.items():
+            with self.subTest(text=text):
+                tokens, error = Lexer('<test>', text).make_tokens()
+                self.assertEqual(tokens, [])
+                self.assertEqual(error.as_string(), message)
+
+
+
+class TokenBufferTests(unittest.TestCase):
+    def test_columns(self):
+        tokens, _ = Lexer('<test>', 'a + a\n1 + 1.0 + 1').make_tokens()
+        self.assertIsInstance(tokens, TokenBuffer)
+        self.assertEqual([TOKEN_TYPES[type_id] for type_id in tokens.type_ids], [
+            'IDENTIFIER', 'PLUS', 'IDENTIFIER', 'NEWLINE', 'INT', 'PLUS', 'FLOAT', 'PLUS', 'INT', 'EOF'
+        ])
+        self.assertEqual((list(tokens.starts), list(tokens.ends)), (
+            [0, 2, 4, 5, 6, 8, 10, 14, 16, 17], [1, 3, 5, 6, 7, 9, 13, 15, 17, 18]
+        ))
+        # Each distinct value is kept once, and 1 and 1.0 are different values
+        self.assertEqual(tokens.values, [None, 'a', 1, 1.0])
+        self.assertEqual(list(tokens.value_ids), [1, 0, 1, 0, 2, 0, 3, 0, 2, 0])
+
+    def test_positions_are_worked_out_when_asked(self):
+        tokens, _ = Lexer('<test>', 'a + a\n1 + 1.0 + 1').make_tokens()
+        token = tokens[6]
+        self.assertEqual((token.type, token.value), ('FLOAT', 1.0))
+        self.assertIsNone(token.pos_start._ln)
+        self.assertEqual((token.pos_start.ln, token.pos_start.col, token.pos_end.ln, token.pos_end.col), (1, 4, 1, 7))
+
+        # A newline ends on its own line
+        token = tokens[3]
+        self.assertEqual((token.pos_start.ln, token.pos_start.col, token.pos_end.ln, token.pos_end.col), (0, 5, 0, 6))
+
+    def test_tokens_are_made_again_each_time(self):
+        # Made from the columns whenever one is asked for, so changing one never reaches the buffer
+        tokens, _ = Lexer('<test>', 'var a = 1').make_tokens()
+        tokens[1].value = 'b'
+        self.assertEqual(tokens[1].value, 'a')
+        self.assertIsNot(tokens[1], tokens[1])
+
+
+
+class StreamLexerTests(unittest.TestCase):
+    # Chunks down to a single character, so lexemes, lines and UTF-8 characters are split at every point
+    CHUNK_SIZES = (1, 2, 5, 64)
+
+    def located(self, tokens):
+        # A streamed token's offsets are into the lines read around it, but its lines and columns are the same
+        return [(tok.type, tok.value, tok.pos_start.ln, tok.pos_start.col, tok.pos_end.ln, tok.pos_end.col)
+                for tok in tokens]
+
+    def test_same_tokens_as_make_tokens(self):
+        with open(os.path.join(os.path.dirname(__file__), 'program.sdw')) as f:
+            text = f.read() + '\nshow("héllo wörld")\n"two\nlines" + 1\n# done'
+        expected = self.located(lex(text))
+        for chunk_size in self.CHUNK_SIZES:
+            for source in (io.StringIO(text), io.BytesIO(text.encode())):
+                with self.subTest(chunk_size=chunk_size, source=type(source).__name__):
+                    lexer = StreamLexer('<test>', source, chunk_size)
+                    self.assertEqual(self.located(lexer.generate_tokens()), expected)
+                    self.assertIsNone(lexer.error)
+
+    def test_errors(self):
+        for text in list(ERRORS) + ['x\n' * 50 + 'y ! z']:
+            _, expected = Lexer('<test>', text).make_tokens()
+            for chunk_size in self.CHUNK_SIZES:
+                with self.subTest(text=text[:10], chunk_size=chunk_size):
+                    lexer = StreamLexer('<test>', io.StringIO(text), chunk_size)
+                    tokens = list(lexer.generate_tokens())
+                    self.assertEqual(tokens[-1].type, 'EOF')
+                    self.assertEqual(lexer.error.as_string(), expected.as_string())
+
+    def test_only_recent_tokens_are_kept(self):
+        stream = TokenStream(StreamLexer('<test>', io.StringIO('a + ' * 20 + 'a')).generate_tokens(), lookbehind=4)
+        self.assertEqual(stream[31].type, 'PLUS')
+        # One more is always to come until EOF has been read
+        self.assertEqual(len(stream), 33)
+        self.assertRaises(Exception, stream.__getitem__, 0)
+
+    def test_run_stream_matches_run(self):
+        # A lexer error after a syntax error is still the one reported, as it is when everything is lexed first
+        programs = dict(CORPUS, **{'lexer error after a syntax error': 'var a = \n$'})
+        for name, text in programs.items():
+            with self.subTest(program=name):
+                reset_globals()
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    result, error = run_stream('<test>', io.StringIO(text))
+                self.assertEqual(outcome(result, error, output.getvalue()), run_engine('tree', text))
+
+
+if __name__ == '__main__':
+    unittest.main()
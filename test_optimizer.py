@@ -0,0 +1,183 @@
+import unittest
+
+from Cache import TreeEncoder
+from Incremental import Document
+from Lexer import Lexer
+from Optimizer import Optimizer, HOISTED_PREFIX
+from Parser import Parser, NumberNode, StringNode, VarAccessNode, VarAssignNode, BinOpNode, IfNode, ForNode, WhileNode
+from interpreter import global_symbol_table, run_ast
+
+ENGINES = ['tree', 'vm', 'closure', 'python']
+
+# The global symbol table as it is before any program has run
+BUILTINS = dict(global_symbol_table.symbols)
+
+
+def reset_globals():
+    global_symbol_table.symbols.clear()
+    global_symbol_table.symbols.update(BUILTINS)
+
+
+def parse(text):
+    tokens, error = Lexer('<test>', text).make_tokens()
+    assert error is None, error.as_string()
+    res = Parser(tokens).parse()
+    assert res.error is None, res.error.as_string()
+    return res.node
+
+
+def encode(node):
+    return TreeEncoder().encode(node)
+
+
+def optimize(text):
+    # The optimized first statement of text
+    return Optimizer().optimize_program(parse(text)).element_nodes[0]
+
+
+def outcome(result, error):
+    return ('error', error.as_string()) if error else ('result', repr(result))
+
+
+class FoldingTests(unittest.TestCase):
+    def assert_literal(self, node, value, start, end):
+        self.assertIsInstance(node, NumberNode if isinstance(value, (int, float)) else StringNode)
+        self.assertEqual(node.tok.value, value)
+        self.assertEqual((node.pos_start.idx, node.pos_end.idx), (start, end))
+
+    def test_operations_on_literals(self):
+        self.assert_literal(optimize('1 + 2 * 3 - 4'), 3, 0, 13)
+        self.assert_literal(optimize('2 ^ 10'), 1024, 0, 6)
+        self.assert_literal(optimize('"ab" + "cd"'), 'abcd', 0, 11)
+        self.assert_literal(optimize('"ab" * 3'), 'ababab', 0, 8)
+        self.assert_literal(optimize('-(3 - 5) + 1'), 3, 0, 12)
+        self.assert_literal(optimize('1 < 2'), 1, 0, 5)
+
+    def test_failing_operations_are_kept(self):
+        for text in ('1 / 0', '"a" - 1', '2 ^ 100000', '"ab" * 100000'):
+            with self.subTest(text=text):
+                self.assertIsInstance(optimize(text), BinOpNode)
+
+    def test_dead_branches(self):
+        text = 'if 0 then 1 elif x then 2 elif 1 then 3 elif y then 4 else 5'
+        node = optimize(text)
+        self.assertIsInstance(node, IfNode)
+        self.assertEqual([case[1].tok.value for case in node.cases], [2, 3])
+        self.assertIsNone(node.else_case)
+        # Still spanning the whole if-expression
+        self.assertEqual((node.pos_start.idx, node.pos_end.idx), (3, len(text)))
+
+        node = optimize('if 0 then 1 else 5')
+        self.assertEqual(len(node.cases), 1)
+        self.assertEqual(node.else_case[0].tok.value, 5)
+
+    def test_identities(self):
+        text = '(n < 1) * 1\nvar a = (n < 1) - 0\n[n] * 1\n(n < 1) * 1 + n'
+        nodes = Optimizer().optimize_program(parse(text)).element_nodes
+        self.assertEqual(nodes[0].op_tok.type, 'LT')
+        self.assertEqual(nodes[1].value_node.op_tok.type, 'LT')
+        # Only numbers: a list times one is an error
+        self.assertEqual(nodes[2].op_tok.type, 'MUL')
+        # Not as an operand, where a failure would show the whole expression
+        self.assertEqual(nodes[3].left_node.op_tok.type, 'MUL')
+
+    def test_names_are_not_folded(self):
+        self.assertIsInstance(optimize('pi * 2'), BinOpNode)
+        self.assertIsInstance(optimize('pi * 2').left_node, VarAccessNode)
+
+    def test_parsed_tree_is_left_alone(self):
+        node = parse('var a = 2 * 3\nfor i = 0 to 3 then a * 2 + i\nif 0 then 1 else a * 1\ncreate f(x) -> x * 1\nf(a)')
+        before = encode(node)
+        optimized = Optimizer().optimize_program(node)
+        self.assertEqual(encode(node), before)
+        self.assertNotEqual(encode(optimized), before)
+
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                reset_globals()
+                self.assertEqual(outcome(*run_ast(node, engine)), ('result', '[6, [12, 13, 14], 6, <function f>, 6]'))
+                self.assertEqual(encode(node), before)
+
+    def test_run_then_edit(self):
+        # A document keeps the nodes of statements an edit does not touch, so running it must not change them
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                document = Document('<doc>', 'var a = 2 * 3\nvar b = if 0 then 1 else a\nb')
+                reset_globals()
+                self.assertEqual(outcome(*run_ast(document.result.node, engine)), ('result', '[6, 6, 6]'))
+
+                document.edit(len(document.text) - 1, len(document.text), 'b + 1')
+                self.assertEqual(encode(document.result.node), encode(parse(document.text)))
+                reset_globals()
+                self.assertEqual(outcome(*run_ast(document.result.node, engine)), ('result', '[6, 6, 7]'))
+
+
+class HoistingTests(unittest.TestCase):
+    def loops(self, text):
+        nodes = Optimizer().optimize_program(parse(text)).element_nodes
+        return [node for node in nodes if isinstance(node, (ForNode, WhileNode))]
+
+    def hoisted(self, loop):
+        return [(node.var_name_tok.value, type(node.value_node).__name__) for node in loop.hoisted_nodes]
+
+    def test_invariant_calculations_are_hoisted(self):
+        loop, = self.loops('var k = 3\nfor i = 0 to 3 then i + k * 2 - k * 2')
+        # The same calculation twice shares one hidden variable
+        self.assertEqual(self.hoisted(loop), [(HOISTED_PREFIX + '0', 'BinOpNode')])
+        self.assertEqual(loop.body_node.right_node.var_name_tok.value, HOISTED_PREFIX + '0')
+
+        loop, = self.loops('var k = 3\nvar i = 0\nwhile i < k + 1 then var i = i + is_number(k)')
+        self.assertEqual(self.hoisted(loop), [(HOISTED_PREFIX + '0', 'BinOpNode'), (HOISTED_PREFIX + '1', 'CallNode')])
+
+    def test_nothing_that_can_fail_or_change_is_hoisted(self):
+        programs = [
+            # Division can fail, and so can anything on a name that might not hold a number
+            'var k = 3\nfor i = 0 to 3 then i + k / 2',
+            'var k = "s"\nfor i = 0 to 3 then i + k * 2',
+            'for i = 0 to 3 then i + k * 2',
+            # k changes inside the loop
+            'var k = 3\nfor i = 0 to 3 then var k = k * 2',
+            # len is not pure, and a user function could run a script that rebinds k
+            'var l = [1]\nfor i = 0 to 3 then len(l) + 1',
+            'var k = 3\ncreate f() -> 0\nfor i = 0 to 3 then [f(), k * 2]',
+        ]
+        for text in programs:
+            with self.subTest(text=text):
+                loop, = self.loops(text)
+                self.assertEqual(loop.hoisted_nodes, [])
+
+    def test_function_arguments_are_not_numbers(self):
+        function = Optimizer().optimize_program(parse('create f(k) -> [for i = 0 to 3 then k * 2]')).element_nodes[0]
+        self.assertEqual(function.body_node.element_nodes[0].hoisted_nodes, [])
+
+        function = Optimizer().optimize_program(parse('create f(x)\nvar k = 2\nchaos_blast [for i = 0 to 3 then k * 2]\nend'))
+        loop = function.element_nodes[0].body_node.element_nodes[1].node_to_return.element_nodes[0]
+        self.assertEqual(len(loop.hoisted_nodes), 1)
+
+    def test_hoisted_loops_run_the_same(self):
+        text = 'var k = 3\nvar s = 0\nfor i = 0 to 5 then var s = s + k * 2 + (k < i)\n' \
+               'var j = 0\nwhile j < k + 1 then var j = j + 1\n[s, j]'
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                reset_globals()
+                result, error = run_ast(parse(text), engine)
+                self.assertIsNone(error)
+                self.assertEqual(repr(result.elements[-1]), '[31, 4]')
+
+    def test_reused_loop_is_checked_again(self):
+        # A loop kept by a document after an edit before it: a is no longer a number, so a - 1 must stay in the
+        # body, which never runs
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                document = Document('<doc>', 'var a = 1\nfor i = 0 to 0 then a - 1\n0')
+                reset_globals()
+                self.assertEqual(outcome(*run_ast(document.result.node, engine)), ('result', '[1, [], 0]'))
+
+                document.edit(8, 9, '"s"')
+                self.assertEqual(encode(document.result.node), encode(parse(document.text)))
+                reset_globals()
+                self.assertEqual(outcome(*run_ast(document.result.node, engine)), ('result', '["s", [], 0]'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,340 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from Cache import TreeEncoder
+from Lexer import Lexer, Token
+from Optimizer import Optimizer
+from Parser import Parser, NumberNode, StringNode, ListNode, VarAccessNode, VarAssignNode, BinOpNode, UnaryOpNode, \
+    IfNode, ForNode, WhileNode, FuncDefNode, CallNode, ReturnNode
+from interpreter import check_program, global_symbol_table, parse_program, run
+from test_engines import CORPUS
+
+OPERATORS = {'PLUS': '+', 'MINUS': '-', 'MUL': '*', 'DIV': '/', 'POW': '^', 'EE': '==', 'NE': '!=', 'LT': '<',
+             'GT': '>', 'LTE': '<=', 'GTE': '>='}
+
+# Expressions with the trees, spans and errors the parser gave before it parsed them with a single
+# precedence-climbing loop
+TREES = {
+    '1 + 2 * 3 - 4 / 5': ('((1 + (2 * 3)) - (4 / 5))', 0, 17),
+    '1 - 2 - 3': ('((1 - 2) - 3)', 0, 9),
+    '2 ^ 3 ^ 2': ('(2 ^ (3 ^ 2))', 0, 9),
+    '-a ^ b': ('-(a ^ b)', 0, 6),
+    '-a * b': ('(-a * b)', 0, 6),
+    'a ^ -b ^ c': ('(a ^ -(b ^ c))', 0, 10),
+    '- -3 + +4': ('(--3 + +4)', 0, 9),
+    'a < b + 1 == c >= d': ('(((a < (b + 1)) == c) >= d)', 0, 19),
+    'a <= b != c > d': ('(((a <= b) != c) > d)', 0, 15),
+    '(a + b) * c': ('((a + b) * c)', 1, 11),
+    '[1, 2] * 3 + [a]': ('(([1, 2] * 3) + [a])', 0, 17),
+    'a * if b then 1 else 2': ('(a * if b then 1 else 2)', 0, 22),
+    'f(x, 2) ^ -g()': ('(f(x, 2) ^ -g())', 0, 12),
+}
+
+SYNTAX_ERRORS = {
+    '1 +': ("Expected int, float, identifier, '+', '-', '(', '[', 'if', 'for', 'while', 'create'", 3),
+    '-': ("Expected int, float, identifier, '+', '-', '(', '[', 'if', 'for', 'while', 'create'", 1),
+    '1 + (2 * 3': ("Expected ')'", 10),
+    '[1 2]': ("Expected ',' or ']'", 3),
+    'f(1)(2)': ('Token cannot appear after previous tokens', 4),
+    'a = 1': ('Token cannot appear after previous tokens', 2),
+}
+
+# Each syntax error at the token it is found at, rather than at the start of the statement it is in
+STATEMENT_ERRORS = {
+    'var a = 1\n\nvar': ('Expected identifier', 14),
+    'chaos_blast +': ("Expected int, float, identifier, '+', '-', '(', '[', 'if', 'for', 'while', 'create'", 13),
+    'for i = 0 to 1 then\n1\n\nx y\nend': ("Expected 'end'", 25),
+    'create f()\nchaos_blast\n': ("Expected 'end'", 23),
+    'a;;\n;b c': ('Token cannot appear after previous tokens', 7),
+}
+
+# The global symbol table as it is before any program has run
+BUILTINS = dict(global_symbol_table.symbols)
+
+
+def reset_globals():
+    global_symbol_table.symbols.clear()
+    global_symbol_table.symbols.update(BUILTINS)
+
+
+def parse(text):
+    tokens, error = Lexer('<test>', text).make_tokens()
+    assert error is None, error.as_string()
+    res = Parser(tokens).parse()
+    assert res.error is None, res.error.as_string()
+    return res.node
+
+
+def operator(tok):
+    # Logic operators are keywords, written as they are
+    return OPERATORS.get(tok.type, tok.value)
+
+
+def shape(node):
+    # The tree under node written out with its grouping in brackets
+    if isinstance(node, NumberNode):
+        return repr(node.tok.value)
+    if isinstance(node, StringNode):
+        return f'"{node.tok.value}"'
+    if isinstance(node, VarAccessNode):
+        return node.var_name_tok.value
+    if isinstance(node, BinOpNode):
+        return f'({shape(node.left_node)} {operator(node.op_tok)} {shape(node.right_node)})'
+    if isinstance(node, UnaryOpNode):
+        return operator(node.op_tok) + shape(node.node)
+    if isinstance(node, ListNode):
+        return '[' + ', '.join(shape(element_node) for element_node in node.element_nodes) + ']'
+    if isinstance(node, CallNode):
+        return shape(node.node_to_call) + '(' + ', '.join(shape(arg_node) for arg_node in node.arg_nodes) + ')'
+    if isinstance(node, IfNode):
+        cases = ' elif '.join(f'{shape(condition)} then {shape(expr)}' for condition, expr, _ in node.cases)
+        return f'if {cases}' + (f' else {shape(node.else_case[0])}' if node.else_case else '')
+    return type(node).__name__
+
+
+def depth(node, node_type, inner):
+    # How many node_type nodes are nested in each other from node down, and the node under the last of them.
+    # Counted in a loop, since the nesting goes far past Python's recursion limit
+    count = 0
+    while isinstance(node, node_type):
+        node = inner(node)
+        count += 1
+    return count, node
+
+
+def run_vm(text):
+    # The vm engine is the one that runs programs of any depth
+    reset_globals()
+    result, error = run('<test>', text, engine='vm')
+    assert error is None, error.as_string()
+    return result.elements
+
+
+class ExpressionTests(unittest.TestCase):
+    def test_trees(self):
+        for text, (expected, start, end) in TREES.items():
+            with self.subTest(text=text):
+                node = parse(text).element_nodes[0]
+                self.assertEqual((shape(node), node.pos_start.idx, node.pos_end.idx), (expected, start, end))
+
+    def test_logic(self):
+        # The lexer cannot read &&, || or ! yet, so their keyword tokens stand in for AND, OR and NOT
+        keywords = {'AND': '&&', 'OR': '||', 'NOT': '!'}
+        trees = {
+            'a AND b OR c': '((a && b) || c)',
+            'a OR b AND c': '((a || b) && c)',
+            'NOT a AND b': '(!a && b)',
+            'NOT a < b + 1': '!(a < (b + 1))',
+            'a == b AND NOT c OR d': '(((a == b) && !c) || d)',
+            'NOT NOT a': '!!a',
+        }
+        for text, expected in trees.items():
+            with self.subTest(text=text):
+                tokens, _ = Lexer('<test>', text).make_tokens()
+                tokens = [tokens[i] for i in range(len(tokens))]
+                tokens = [Token('KEYWORD', keywords[tok.value], tok.pos_start, tok.pos_end)
+                          if tok.value in keywords else tok for tok in tokens]
+                res = Parser(tokens).parse()
+                self.assertIsNone(res.error)
+                self.assertEqual(shape(res.node.element_nodes[0]), expected)
+
+    def test_syntax_errors(self):
+        for text, (message, idx) in SYNTAX_ERRORS.items():
+            with self.subTest(text=text):
+                _, error = parse_program('<test>', text)
+                self.assertEqual(error.as_string().splitlines()[0], 'Invalid Syntax: ' + message)
+                self.assertEqual(error.pos_start.idx, idx)
+
+
+class ReadCountingList(list):
+    # Tokens, remembering the index of every one the parser reads
+    def __init__(self, tokens):
+        super().__init__(tokens[i] for i in range(len(tokens)))
+        self.read = []
+
+    def __getitem__(self, i):
+        self.read.append(i)
+        return super().__getitem__(i)
+
+
+class StatementTests(unittest.TestCase):
+    PROGRAMS = [
+        'var a = 1\n\n\nvar b = 2;;a + b',
+        'create f()\nvar x = 1\nchaos_blast\nend\nf()',
+        'for i = 0 to 3 then\nif i == 1 then chaos_warp\nchaos_blast\nend\n\n',
+        'if a then\n1\nelif b then\n2\nelse\n3\nend\nwhile 0 then\nchaos_control\nend',
+        'create g() -> 1\n\ng()\n',
+    ]
+
+    def test_each_token_is_read_once(self):
+        for text in self.PROGRAMS:
+            with self.subTest(text=text):
+                tokens, _ = Lexer('<test>', text).make_tokens()
+                tokens = ReadCountingList(tokens)
+                self.assertIsNone(Parser(tokens).parse().error)
+                self.assertEqual(tokens.read, list(range(len(tokens))))
+
+    def test_return_without_a_value(self):
+        # chaos_blast takes a value only when the token after it can start one
+        program = parse(self.PROGRAMS[1])
+        self.assertEqual([type(node) for node in program.element_nodes], [FuncDefNode, CallNode])
+        body = program.element_nodes[0].body_node.element_nodes
+        self.assertEqual([type(node) for node in body], [VarAssignNode, ReturnNode])
+        self.assertIsNone(body[1].node_to_return)
+
+        self.assertIsNone(parse('chaos_blast').element_nodes[0].node_to_return)
+        self.assertEqual(shape(parse('chaos_blast -1').element_nodes[0].node_to_return), '-1')
+
+    def test_syntax_errors(self):
+        for text, (message, idx) in STATEMENT_ERRORS.items():
+            with self.subTest(text=text):
+                _, error = parse_program('<test>', text)
+                self.assertEqual(error.as_string().splitlines()[0], 'Invalid Syntax: ' + message)
+                self.assertEqual(error.pos_start.idx, idx)
+
+
+class RecoveryTests(unittest.TestCase):
+    def located(self, errors):
+        return [(error.pos_start.ln, error.pos_start.col) for error in errors]
+
+    def test_every_error_is_collected(self):
+        text = 'var a = \nvar b = 1\nb +\n1 2\nb'
+        errors = check_program('<test>', text)
+        self.assertEqual(self.located(errors), [(0, 8), (2, 3), (3, 2)])
+        # The first is the one a normal parse stops at
+        self.assertEqual(errors[0].as_string(), parse_program('<test>', text)[1].as_string())
+
+    def test_blocks_are_checked(self):
+        # Inside a block, and inside one whose header is broken, up to its end
+        self.assertEqual(self.located(check_program('<test>', 'if a then\n1 +\nelse\n2 *\nend\nok')), [(1, 3), (3, 3)])
+        self.assertEqual(self.located(check_program('<test>', 'while then\nvar = 1\nend\n2 *')),
+                         [(0, 6), (1, 4), (3, 3)])
+
+    def test_lexer_error_ends_the_check(self):
+        errors = check_program('<test>', 'x +\nvar y = $')
+        self.assertEqual([error.error_name for error in errors], ['Illegal Character'])
+
+    def test_valid_programs_parse_the_same(self):
+        for name, text in CORPUS.items():
+            tokens, error = Lexer('<test>', text).make_tokens()
+            if error or Parser(tokens).parse().error: continue
+            with self.subTest(program=name):
+                parser = Parser(tokens)
+                res = parser.parse(recover=True)
+                self.assertEqual((res.error, parser.errors), (None, []))
+                self.assertEqual(TreeEncoder().encode(res.node), TreeEncoder().encode(parse(text)))
+
+    def test_check_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        good, bad = os.path.join(directory, 'good.sdw'), os.path.join(directory, 'bad.sdw')
+        with open(good, 'w') as f:
+            f.write('var a = 1\na')
+        with open(bad, 'w') as f:
+            f.write('var a = \na +')
+
+        def check(*paths):
+            interpreter = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interpreter.py')
+            return subprocess.run([sys.executable, interpreter, '--check', *paths], capture_output=True, text=True)
+
+        checked = check(good)
+        self.assertEqual((checked.returncode, checked.stdout), (0, ''))
+
+        checked = check(good, bad)
+        self.assertEqual(checked.returncode, 1)
+        self.assertEqual(checked.stdout.count('Invalid Syntax'), 2)
+        self.assertIn(f'File {bad}, line 2', checked.stdout)
+
+class DeepNestingTests(unittest.TestCase):
+    # Nesting a code generator could produce, each far deeper than Python's recursion limit
+
+    def test_nested_calls(self):
+        text = 'create f(x) -> x\n' + 'f(' * 400 + '1' + ')' * 400
+        count, leaf = depth(parse(text).element_nodes[1], CallNode, lambda node: node.arg_nodes[0])
+        self.assertEqual((count, leaf.tok.value), (400, 1))
+        self.assertEqual(repr(run_vm(text)[1]), '1')
+
+    def test_nested_lists(self):
+        text = '[' * 1000 + ']' * 1000
+        count, leaf = depth(parse(text).element_nodes[0], ListNode,
+                            lambda node: node.element_nodes[0] if node.element_nodes else None)
+        self.assertEqual((count, leaf), (1000, None))
+
+        value, count = run_vm(text)[0], 0
+        while value.elements:
+            value, count = value.elements[0], count + 1
+        self.assertEqual(count, 999)
+
+    def test_nested_ifs(self):
+        text = 'if 1 then ' * 1500 + '7'
+        count, leaf = depth(parse(text).element_nodes[0], IfNode, lambda node: node.cases[0][1])
+        self.assertEqual((count, leaf.tok.value), (1500, 7))
+        self.assertEqual(repr(run_vm(text)[0]), '7')
+
+    def test_nested_assignments(self):
+        text = 'var a = ' * 3000 + '5'
+        count, leaf = depth(parse(text).element_nodes[0], VarAssignNode, lambda node: node.value_node)
+        self.assertEqual((count, leaf.tok.value), (3000, 5))
+        self.assertEqual(repr(run_vm(text)[0]), '5')
+
+    def test_nested_signs(self):
+        text = '-(' * 2000 + '3' + ')' * 2000
+        parsed = parse(text).element_nodes[0]
+        count, leaf = depth(parsed, UnaryOpNode, lambda node: node.node)
+        self.assertEqual((count, leaf.tok.value), (2000, 3))
+
+        # Folded to the number it gives, spanning the same code
+        node = Optimizer().optimize_program(parse(text)).element_nodes[0]
+        self.assertIsInstance(node, NumberNode)
+        self.assertEqual((node.tok.value, node.pos_start.idx, node.pos_end.idx), (3, 0, parsed.pos_end.idx))
+
+        # And on a name, which is left for the program to work out
+        self.assertEqual(repr(run_vm('var x = 3\n' + '-(' * 2000 + 'x' + ')' * 2000)[1]), '3')
+
+    def test_operators_grouping_to_the_right(self):
+        text = 'var x = 1\n' + 'x ^ ' * 2000 + '1'
+        count, leaf = depth(parse(text).element_nodes[1], BinOpNode, lambda node: node.right_node)
+        self.assertEqual((count, leaf.tok.value), (2000, 1))
+        self.assertEqual(repr(run_vm(text)[1]), '1')
+
+    def test_nested_loops_and_functions(self):
+        text = 'for i = 0 to 1 then ' * 300 + 'i'
+        count, _ = depth(parse(text).element_nodes[0], ForNode, lambda node: node.body_node)
+        self.assertEqual(count, 300)
+        value, count = run_vm(text)[0], 0
+        while hasattr(value, 'elements'):
+            value, count = value.elements[0], count + 1
+        self.assertEqual((count, repr(value)), (300, '0'))
+
+        text = 'var k = 0\n' + 'while k < 1 then ' * 300 + 'var k = 1'
+        count, _ = depth(parse(text).element_nodes[1], WhileNode, lambda node: node.body_node)
+        self.assertEqual(count, 300)
+        self.assertEqual(repr(run_vm(text + '\nk')[-1]), '1')
+
+        text = 'create () -> ' * 800 + '1'
+        count, leaf = depth(parse(text).element_nodes[0], FuncDefNode, lambda node: node.body_node)
+        self.assertEqual((count, leaf.tok.value), (800, 1))
+        self.assertEqual(repr(run_vm(text)[0]), '<function <anonymous>>')
+
+    def test_unclosed_input_fails_at_its_end(self):
+        texts = {
+            '(' * 3000 + '1': "Expected ')'",
+            '[' * 3000: "Expected ']'",
+            'f(' * 3000 + '1': "Expected ',' or ')'",
+            'if 1 then ' * 1500: "Expected 'var'",
+            'var a = ' * 3000: "Expected 'var'",
+        }
+        for text, message in texts.items():
+            with self.subTest(text=text[:20]):
+                _, error = parse_program('<test>', text)
+                self.assertIsNotNone(error)
+                self.assertEqual(error.pos_start.idx, len(text))
+                self.assertIn(message, error.as_string())
+
+
+if __name__ == '__main__':
+    unittest.main()
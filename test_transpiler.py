@@ -0,0 +1,75 @@
+import unittest
+
+from Optimizer import Optimizer
+from Resolver import Resolver
+from Transpiler import Transpiler, TranspileError
+from interpreter import parse_program
+from test_engines import run_engine
+
+# Errors from every kind of place a translated program can fail, which have to be reported at the same spot as
+# the tree walker reports them, with the same traceback
+ERRORS = [
+    'create f(x) -> x / 0\n[1, f(2)]',
+    'create f(x) -> missing + x\nfor i = 0 to 3 then f(i)',
+    'var l = [1, 2]\n[l / 0, l / 1, l / 2]',
+    'var s = "a"\nif s - 1 then 1 else 2',
+    'create f(a, b) -> a\nvar g = f\ng(1)',
+    'var n = 2\nfor i = 0 to 3 step n(1) then i',
+    'var i = 0\nwhile i < "x" then var i = i + 1',
+    'create down(n) -> if n == 0 then 1 / n else 1 + down(n - 1)\ndown(5)',
+    'create f(x)\nvar y = x * 2\nchaos_blast y - "s"\nend\nf(1)',
+    'create f(l) -> remove(l, 3)\nf([1])',
+    'var k = "s"\nfor i = 0 to 3 then i + k * 2',
+    'chaos_blast 1 / 0',
+]
+
+# chaos_control and chaos_warp in a function leave the loop of whoever called it
+LOOP_CONTROL = [
+    ('create stop()\nchaos_control\nend\nvar l = []\nfor i = 0 to 5 then\nif i == 3 then stop()\nadd(l, i)\nend\nl',
+     '[0, 1, 2]'),
+    ('create skip()\nchaos_warp\nend\nvar l = []\nfor i = 0 to 5 then\nif i == 1 then skip()\nadd(l, i)\nend\nl',
+     '[0, 2, 3, 4]'),
+    ('create stop()\nchaos_control\nend\ncreate outer() -> stop()\nvar i = 0\n'
+     'while i < 5 then\nvar i = i + 1\nif i == 2 then outer()\nend\ni', '2'),
+    ('create stop()\nchaos_control\nend\ncreate f()\nvar l = []\nfor j = 0 to 4 then\nif j == 2 then stop()\n'
+     'add(l, j)\nend\nchaos_blast l\nend\n[for i = 0 to 2 then f()]', '[[[0, 1], [0, 1]]]'),
+]
+
+
+def transpile(text):
+    # Translated as run() would translate it
+    node, error = parse_program('<test>', text)
+    assert error is None, error.as_string()
+    node = Optimizer().optimize_program(node)
+    Resolver().resolve(node)
+    return Transpiler().transpile(node)
+
+
+class TranspilerTests(unittest.TestCase):
+    def test_error_positions(self):
+        for text in ERRORS:
+            with self.subTest(text=text):
+                # Run translated, not by the tree walker run() falls back on
+                transpile(text)
+                expected = run_engine('baseline', text)
+                self.assertEqual(expected[0], 'error')
+                self.assertEqual(run_engine('python', text), expected)
+
+    def test_loop_control_escapes_function(self):
+        for text, value in LOOP_CONTROL:
+            with self.subTest(text=text):
+                # Left to the tree walker
+                with self.assertRaises(TranspileError):
+                    transpile(text)
+                expected = run_engine('baseline', text)
+                self.assertTrue(expected[1].endswith(f', {value}]'), expected[1])
+                self.assertEqual(run_engine('python', text), expected)
+
+    def test_top_level_return(self):
+        # The program stops there, but the value is still worked out
+        self.assertEqual(run_engine('python', 'chaos_blast show(5)\nshow(6)'), ('result', 'None', '5\n'))
+        self.assertEqual(run_engine('python', 'for i = 0 to 3 then chaos_blast show(i)'), ('result', 'None', '0\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()